@@ -1,73 +1,168 @@
+import mlflow
 import mlflow.sklearn
-import joblib
-import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
+from matplotlib.figure import Figure
+from mlflow.tracking import MlflowClient
 from sklearn.metrics import (accuracy_score, precision_score, recall_score, f1_score,roc_auc_score, confusion_matrix)
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import argparse
+import hashlib
 import tempfile
+import time
 import os
 import warnings
 import logging
-warnings.filterwarnings("ignore")
-logging.getLogger("mlflow").setLevel(logging.ERROR)
 
+from churn import data
+from churn.inference import predict_with_proba
+from churn.registry import ModelRegistry, file_fingerprint
 
-X_test = pd.read_csv("data/processed/X_test_scaled.csv")
-y_test = pd.read_csv("data/processed/y_test.csv")
+warnings.filterwarnings("ignore")
+logging.getLogger("mlflow").setLevel(logging.ERROR)
 
-models = {
-    "best_model": "models/best.joblib",
-    "XGBoost": "models/XGBoost.joblib",
-    "Decision Tree": "models/Decision Tree.joblib",
-    "SVC": "models/SVC.joblib",
-    "KNN": "models/KNN.joblib",
-    "GaussianNB": "models/GaussianNB.joblib",
-    "Logistic Regression": "models/Logistic Regression.joblib"
+X_TEST_PATH = "data/processed/X_test_scaled.csv"
+Y_TEST_PATH = "data/processed/y_test.csv"
+
+MODELS = {
+    "best_model": "best",
+    "XGBoost": "XGBoost",
+    "Decision Tree": "Decision Tree",
+    "SVC": "SVC",
+    "KNN": "KNN",
+    "GaussianNB": "GaussianNB",
+    "Logistic Regression": "Logistic Regression"
 }
 
-mlflow.set_tracking_uri("mlruns")
-mlflow.set_experiment("Customer Churn Prediction")
-
-for model_name, model_path in models.items():
-    print(f"🚀 Running experiment for {model_name}...")
-
-    if not os.path.exists(model_path):
-        print(f"❌ Model file not found: {model_path}")
-        continue
-
-
-    with mlflow.start_run(run_name=model_name):
-
-        model = joblib.load(model_path)
-        y_pred = model.predict(X_test)
-
-        acc = accuracy_score(y_test, y_pred)
-        prec = precision_score(y_test, y_pred)
-        rec = recall_score(y_test, y_pred)
-        f1 = f1_score(y_test, y_pred)
-        auc = roc_auc_score(y_test, y_pred)
-        cm = confusion_matrix(y_test, y_pred)
-
-        mlflow.log_metric("accuracy", acc)
-        mlflow.log_metric("precision", prec)
-        mlflow.log_metric("recall", rec)
-        mlflow.log_metric("f1_score", f1)
-        mlflow.log_metric("auc", auc)
-
-        plt.figure(figsize=(5, 4))
-        sns.heatmap(cm, annot=True, fmt="d", cmap="Blues")
-        plt.title(f"Confusion Matrix - {model_name}")
-        plt.xlabel("Predicted")
-        plt.ylabel("Actual")
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            cm_path = os.path.join(tmpdir, f"{model_name}_cm.png")
-            plt.savefig(cm_path)
-            mlflow.log_artifact(cm_path)
-
-        plt.close()
-        mlflow.sklearn.log_model(model, model_name)
-
-        print(f"✅ {model_name} experiment logged successfully!\n")
-
-print("🎯 All experiments completed successfully.")
\ No newline at end of file
+_registry = None
+_X_test = None
+_y_test = None
+
+
+def _init_worker(models_dir, X_test, y_test):
+    global _registry, _X_test, _y_test
+    warnings.filterwarnings("ignore")
+    _registry = ModelRegistry(models_dir)
+    _X_test, _y_test = X_test, y_test
+
+
+def evaluate_model(model_name, artifact):
+    """Score one artifact on the test set; predictions and scores are computed once."""
+    start = time.perf_counter()
+    model = _registry.scorer(artifact)
+    y_pred, y_score = predict_with_proba(model, _X_test)
+    if y_score.dtype == object:
+        # No predict_proba (e.g. SVC without probability=True): rank by the decision function
+        y_score = model.decision_function(_X_test)
+
+    metrics = {
+        "accuracy": accuracy_score(_y_test, y_pred),
+        "precision": precision_score(_y_test, y_pred),
+        "recall": recall_score(_y_test, y_pred),
+        "f1_score": f1_score(_y_test, y_pred),
+        "auc": roc_auc_score(_y_test, y_score),
+    }
+    cm = confusion_matrix(_y_test, y_pred)
+    return model_name, artifact, metrics, cm, time.perf_counter() - start
+
+
+def evaluate_models(models, models_dir="models", workers=None, X_test=None, y_test=None):
+    """Evaluate ``{run_name: artifact}`` on a process pool, yielding results as they finish."""
+    X_test = data.load(X_TEST_PATH) if X_test is None else X_test
+    y_test = data.load(Y_TEST_PATH).squeeze("columns") if y_test is None else y_test
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(models_dir, X_test, y_test)) as pool:
+        futures = [pool.submit(evaluate_model, name, artifact) for name, artifact in models.items()]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def test_set_hash():
+    digest = hashlib.sha256()
+    for path in (X_TEST_PATH, Y_TEST_PATH):
+        digest.update(file_fingerprint(path).encode())
+    return digest.hexdigest()
+
+
+def plot_confusion_matrix(client, run_id, model_name, cm):
+    # Object-oriented matplotlib API: safe to run off the main thread
+    fig = Figure(figsize=(5, 4))
+    ax = fig.subplots()
+    sns.heatmap(cm, annot=True, fmt="d", cmap="Blues", ax=ax)
+    ax.set_title(f"Confusion Matrix - {model_name}")
+    ax.set_xlabel("Predicted")
+    ax.set_ylabel("Actual")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cm_path = os.path.join(tmpdir, f"{model_name}_cm.png")
+        fig.savefig(cm_path)
+        client.log_artifact(run_id, cm_path)
+
+
+def logged_runs(experiment_id):
+    """Map (run name, artifact hash, test-set hash) -> run id for runs already logged."""
+    runs = mlflow.search_runs([experiment_id], output_format="pandas")
+    seen, model_runs = {}, {}
+    for _, run in runs.iterrows():
+        artifact_hash = run.get("tags.artifact_hash")
+        if not isinstance(artifact_hash, str):
+            continue
+        seen[(run.get("tags.mlflow.runName"), artifact_hash, run.get("tags.test_set_hash"))] = run["run_id"]
+        if run.get("tags.model_logged") == "true":
+            model_runs[artifact_hash] = run["run_id"]
+    return seen, model_runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the models in models/ and log them to MLflow.")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-run models that already have a logged run")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry = ModelRegistry("models")
+
+    mlflow.set_tracking_uri("mlruns")
+    experiment = mlflow.set_experiment("Customer Churn Prediction")
+    client = MlflowClient()
+    test_hash = test_set_hash()
+    seen, model_runs = logged_runs(experiment.experiment_id)
+
+    pending = {}
+    for model_name, artifact in MODELS.items():
+        if not os.path.exists(registry.path(artifact)):
+            print(f"❌ Model file not found: {registry.path(artifact)}")
+            continue
+        artifact_hash = file_fingerprint(registry.path(artifact))
+        if not args.force and (model_name, artifact_hash, test_hash) in seen:
+            print(f"⏭️  {model_name} unchanged since run {seen[(model_name, artifact_hash, test_hash)]}, skipping")
+            continue
+        pending[model_name] = (artifact, artifact_hash)
+
+    with ThreadPoolExecutor(max_workers=1) as plotter:
+        plots = []
+        for model_name, artifact, metrics, cm, elapsed in evaluate_models(
+                {name: artifact for name, (artifact, _) in pending.items()}, workers=args.workers):
+            artifact_hash = pending[model_name][1]
+            print(f"🚀 Logging experiment for {model_name} (evaluated in {elapsed:.2f}s)...")
+            tags = {"artifact_hash": artifact_hash, "test_set_hash": test_hash}
+
+            with mlflow.start_run(run_name=model_name, tags=tags) as run:
+                mlflow.log_metrics(metrics)
+                if artifact_hash in model_runs:
+                    # Same artifact already stored: point at it instead of logging it again
+                    mlflow.set_tag("model_run_id", model_runs[artifact_hash])
+                else:
+                    mlflow.sklearn.log_model(registry.get(artifact), model_name)
+                    mlflow.set_tag("model_logged", "true")
+                    model_runs[artifact_hash] = run.info.run_id
+                plots.append(plotter.submit(plot_confusion_matrix, client, run.info.run_id, model_name, cm))
+
+            print(f"✅ {model_name} experiment logged successfully!\n")
+        for plot in plots:
+            plot.result()
+
+    print(f"🎯 All experiments completed successfully in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,87 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
-import pandas as pd
-import joblib
 
-model = joblib.load(r"models/best.joblib")
-preprocessor = joblib.load(r"models/preprocessor.joblib")
+from churn.batching import MicroBatcher
+from churn import data
+from churn.cache import PredictionCache
+from churn.campaign import ChunkFile, optimize, scored_chunks
+from churn.columnar import (MEDIA_TYPES, ColumnarError, media_format, prediction_table, read_table, validate_table,
+                            write_table)
+from churn.drift import DriftMonitor
+from churn.explain import TreeExplainer
+from churn.features import FIELD_COLUMNS, records_to_columns
+from churn.inference import InferenceEngine
+from churn.metrics import NULL_CLOCK, MetricsRegistry, RequestMetrics, StageClock, request_start
+from churn.profiling import SlowRequestProfiler
+from churn.registry import ModelRegistry
+from churn.risk_index import SavedRiskIndex
+from churn.sweep import sweep
+from churn.shadow import ShadowLog, ShadowScorer
+
+# Per-stage timing, request counts and model versions at /metrics; CHURN_METRICS=0 turns them off
+metrics_enabled = os.environ.get("CHURN_METRICS", "1") != "0"
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "churn_stage_seconds",
+    "Time per prediction stage; engine stages (features, transform, model) cover a whole micro-batch.",
+)
+
+
+_stage_histograms = {}
+
+
+def observe_stage(stage, seconds):
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = _stage_histograms[stage] = stage_seconds.labels(stage=stage)
+    histogram.observe(seconds)
+
+
+def stage_clock():
+    return StageClock(observe_stage) if metrics_enabled else NULL_CLOCK
+
+
+# Every scored model input row is binned against the training distribution
+# (models/drift_baseline.json) off the request path; CHURN_DRIFT=0 turns it off
+drift = None
+if os.environ.get("CHURN_DRIFT", "1") != "0":
+    drift = DriftMonitor(
+        bucket_seconds=float(os.environ.get("CHURN_DRIFT_BUCKET_S", 300)),
+        buckets=int(os.environ.get("CHURN_DRIFT_BUCKETS", 12)),
+        interval=float(os.environ.get("CHURN_DRIFT_INTERVAL_S", 10)),
+    )
+
+# Artifacts are loaded lazily and reloaded when models/best.joblib is replaced
+registry = ModelRegistry("models")
+# Compiled array-backed evaluator for XGBoost; set CHURN_COMPILED_MODEL=0 to use sklearn
+compiled = os.environ.get("CHURN_COMPILED_MODEL", "1") != "0"
+get_engine = registry.watch(
+    lambda model, preprocessor: InferenceEngine(
+        model, preprocessor, compiled=compiled, observe=observe_stage if metrics_enabled else None,
+        on_matrix=drift.observe if drift is not None else None,
+    ),
+    "best",
+    "preprocessor",
+)
+
+# CHURN_SHADOW=1 also scores every batch with the other models/ artifacts and
+# logs their predictions to CHURN_SHADOW_LOG; responses still come from best.joblib
+shadow = None
+if os.environ.get("CHURN_SHADOW", "0") != "0":
+    shadow = ShadowScorer(
+        get_engine,
+        registry,
+        log=ShadowLog(os.environ.get("CHURN_SHADOW_LOG", "results/shadow/predictions.jsonl")),
+        max_pending=int(os.environ.get("CHURN_SHADOW_MAX_PENDING", 8)),
+        sample=float(os.environ.get("CHURN_SHADOW_SAMPLE", 1.0)),
+    )
 
-app = FastAPI(title="Customer Churn Predictor API")
 
 # Define input schema
 class CustomerData(BaseModel):
@@ -30,86 +105,42 @@ class CustomerData(BaseModel):
     customer_service_calls: int
 
 
-@app.post("/predict")
-def predict_churn(data: CustomerData):
-    # Derived features
-    total_national_minutes = (
-        data.total_day_minutes + data.total_eve_minutes + data.total_night_minutes
-    )
-    total_national_calls = (
-        data.total_day_calls + data.total_eve_calls + data.total_night_calls
-    )
-    total_national_charge = (
-        data.total_day_charge + data.total_eve_charge + data.total_night_charge
-    )
+class CustomerBatch(BaseModel):
+    customers: list[CustomerData]
 
-    avg_minutes_per_call = (
-        total_national_minutes / total_national_calls
-        if total_national_calls > 0
-        else 0
-    )
-    avg_int_minutes_per_call = (
-        data.total_intl_minutes / data.total_intl_calls
-        if data.total_intl_calls > 0
-        else 0
-    )
-    cost_per_minute = (
-        total_national_charge / total_national_minutes
-        if total_national_minutes > 0
-        else 0
-    )
-    cost_per_minute_intl = (
-        data.total_intl_charge / data.total_intl_minutes
-        if data.total_intl_minutes > 0
-        else 0
-    )
 
-    high_service_calls = 1 if data.customer_service_calls > 3 else 0
-    tenure_category = (
-        "Low"
-        if data.account_length <= 74
-        else "Medium"
-        if data.account_length <= 127
-        else "High"
-    )
-    has_all_plans = 1 if (data.international_plan == 1 and data.voice_mail_plan == 1) else 0
-    zero_vmail_messages = 1 if data.number_vmail_messages == 0 else 0
-
-    df = pd.DataFrame(
-        [
-            {
-                "State": data.State,
-                "Tenure category": tenure_category,
-                "International plan": data.international_plan,
-                "Voice mail plan": data.voice_mail_plan,
-                "Total day minutes": data.total_day_minutes,
-                "Total day charge": data.total_day_charge,
-                "Total eve minutes": data.total_eve_minutes,
-                "Total eve charge": data.total_eve_charge,
-                "Total night minutes": data.total_night_minutes,
-                "Total night charge": data.total_night_charge,
-                "Total intl minutes": data.total_intl_minutes,
-                "Total intl calls": data.total_intl_calls,
-                "Total intl charge": data.total_intl_charge,
-                "Customer service calls": data.customer_service_calls,
-                "Total national minutes": total_national_minutes,
-                "Total national calls": total_national_calls,
-                "Total national charge": total_national_charge,
-                "Avg minutes per call": avg_minutes_per_call,
-                "Avg int minutes per call": avg_int_minutes_per_call,
-                "Cost per minute": cost_per_minute,
-                "Cost per minute intl": cost_per_minute_intl,
-                "High service calls": high_service_calls,
-                "Has All Plans": has_all_plans,
-                "zero_vmail_messages": zero_vmail_messages,
-            }
-        ]
-    )
+class SweepAxis(BaseModel):
+    # CustomerData field name or raw column name, e.g. "customer_service_calls"
+    feature: str
+    values: list[float] | list[str]
+
+
+class SweepRequest(BaseModel):
+    customer: CustomerData
+    axes: list[SweepAxis]
+    # Scale a swept minutes column's charge with it, keeping the per-minute rate
+    link_charges: bool = True
+
 
-    X = preprocessor.transform(df)
-    pred = model.predict(X)[0]
-    churn_prob = model.predict_proba(X)[0][1] if hasattr(model, "predict_proba") else None
+class CampaignRequest(BaseModel):
+    budget: float
+    offer_cost: float = 10.0
+    # Extra offer cost as a fraction of the customer's revenue
+    discount: float = 0.0
+    # Fraction of would-be churners an offer retains
+    uplift: float = 0.2
+    cost_unit: float = 0.01
+    # Selected customers returned, highest expected retained revenue first
+    limit: int = 100
 
+
+class RiskCustomers(BaseModel):
+    customers: list[CustomerData]
+    # Omitted: the customers are added with new ids
+    customer_ids: list[int] | None = None
+
+
+def format_prediction(pred, churn_prob):
     return {
         "prediction": int(pred),
         "prediction_text": "Likely to Churn" if pred == 1 else "Not Likely to Churn",
@@ -117,6 +148,364 @@ def predict_churn(data: CustomerData):
     }
 
 
+def score_columns(columns):
+    return shadow.score(columns) if shadow is not None else get_engine().predict(columns)
+
+
+def score_customers(customers):
+    clock = stage_clock()
+    columns = records_to_columns(customers)
+    clock.lap("records")
+    preds, churn_probs = score_columns(columns)
+    clock.reset()  # the engine times its own stages
+    results = [format_prediction(pred, churn_prob) for pred, churn_prob in zip(preds, churn_probs)]
+    clock.lap("format")
+    return results
+
+
+def request_clock():
+    """Stage clock for a handler; the time since the request arrived is the parse/validate stage."""
+    if not metrics_enabled:
+        return NULL_CLOCK
+    if profiler is not None:
+        profiler.attach()  # sync handlers run on a worker thread, not the one the request started on
+    start = request_start.get()
+    clock = StageClock(observe_stage, start)
+    if start is not None:
+        clock.lap("validate")
+    return clock
+
+
+cache = PredictionCache(
+    "models/best.joblib",
+    max_size=int(os.environ.get("CHURN_CACHE_SIZE", 100_000)),
+    ttl=float(os.environ.get("CHURN_CACHE_TTL", 3600)),
+    preprocessor_path="models/preprocessor.joblib",
+)
+
+# TreeSHAP contributions of best.joblib, cached by the hash of the model input row
+explain_cache = PredictionCache(
+    "models/best.joblib",
+    max_size=int(os.environ.get("CHURN_EXPLAIN_CACHE_SIZE", 100_000)),
+    ttl=float(os.environ.get("CHURN_CACHE_TTL", 3600)),
+)
+get_explainer = registry.watch(
+    lambda model, preprocessor: TreeExplainer(model, preprocessor, cache=explain_cache), "best", "preprocessor"
+)
+
+# best.joblib scores of data/processed/churn_cleaned.csv and of the customers
+# added through /risk/customers, partitioned for top-K queries
+# (models/index/risk); rebuilt when the model changes, reloaded when another
+# process saves it or adds customers
+get_risk_store = registry.watch(
+    lambda model, preprocessor: SavedRiskIndex(InferenceEngine(model, preprocessor, compiled=compiled)),
+    "best",
+    "preprocessor",
+)
+
+# What-if grids are scored without the drift hook: they are not real traffic
+get_sweep_engine = registry.watch(
+    lambda model, preprocessor: InferenceEngine(
+        model, preprocessor, compiled=compiled, observe=observe_stage if metrics_enabled else None,
+    ),
+    "best",
+    "preprocessor",
+)
+
+# best.joblib scores and revenue of data/processed/churn_cleaned.csv for /campaign,
+# streamed into a memory-mapped temporary Arrow file once per model
+get_campaign_population = registry.watch(
+    lambda model, preprocessor: ChunkFile.from_chunks(scored_chunks(
+        InferenceEngine(model, preprocessor, compiled=compiled), data.load("churn_cleaned")
+    )),
+    "best",
+    "preprocessor",
+)
+
+def score_submitted(items):
+    """Score the ``(customer, profiled request)`` items of a micro-batch.
+
+    With the slow-request profiler on, the worker thread is sampled with every
+    request in the batch while it scores.
+    """
+    customers = [customer for customer, _ in items]
+    if profiler is None:
+        return score_customers(customers)
+    with profiler.working_for(request for _, request in items):
+        return score_customers(customers)
+
+
+# Concurrent /predict calls are scored together in one vectorized call
+batcher = MicroBatcher(
+    score_submitted,
+    max_batch_size=int(os.environ.get("CHURN_MAX_BATCH_SIZE", 256)),
+    max_wait_ms=float(os.environ.get("CHURN_MAX_WAIT_MS", 2)),
+)
+
+# Folded stacks of requests slower than CHURN_PROFILE_SLOW_MS are written to CHURN_PROFILE_DIR
+profiler = None
+if os.environ.get("CHURN_PROFILE_SLOW_MS"):
+    profiler = SlowRequestProfiler(
+        float(os.environ["CHURN_PROFILE_SLOW_MS"]),
+        output_dir=os.environ.get("CHURN_PROFILE_DIR", "profiles"),
+        interval_ms=float(os.environ.get("CHURN_PROFILE_INTERVAL_MS", 5)),
+    )
+
+
+def profile_start(scope, start):
+    profiler.request_started(start)
+
+
+def profile_request(scope, start, end, status):
+    endpoint = getattr(scope.get("endpoint"), "__name__", "not_found")
+    profiler.request_finished(endpoint, start, end)
+
+
+@metrics.collect
+def collect_runtime():
+    cache_stats = cache.stats()
+    return [
+        ("churn_model_version", "gauge", "Load count of each artifact; labelled with its SHA-256.",
+         [({"name": name, "fingerprint": fingerprint}, version)
+          for name, (version, fingerprint) in registry.versions().items()]),
+        ("churn_batch_size", "histogram", "Rows per micro-batch.", [({}, batcher.batch_sizes)]),
+        ("churn_batch_queue_wait_milliseconds", "histogram", "Time a /predict request waited for its batch.",
+         [({}, batcher.queue_wait_ms)]),
+        ("churn_cache_hits_total", "counter", "Prediction cache hits.", [({}, cache_stats["hits"])]),
+        ("churn_cache_misses_total", "counter", "Prediction cache misses.", [({}, cache_stats["misses"])]),
+        ("churn_cache_entries", "gauge", "Entries in the prediction cache.", [({}, cache_stats["size"])]),
+        ("churn_explain_cache_hits_total", "counter", "Explanation cache hits.", [({}, explain_cache.hits)]),
+        ("churn_explain_cache_misses_total", "counter", "Explanation cache misses.", [({}, explain_cache.misses)]),
+    ] + (shadow_metrics() if shadow is not None else []) + (drift_metrics() if drift is not None else [])
+
+
+def shadow_metrics():
+    stats = shadow.stats()
+    return [
+        ("churn_shadow_batches_total", "counter", "Batches shadow-scored by the challengers.",
+         [({}, stats["batches"])]),
+        ("churn_shadow_dropped_total", "counter", "Batches not shadowed because challengers were behind.",
+         [({}, stats["dropped"])]),
+        ("churn_shadow_errors_total", "counter", "Challenger scoring failures.", [({}, stats["errors"])]),
+    ]
+
+
+def drift_metrics():
+    report = drift.report()
+    window = report["window"]["features"]
+    return [
+        ("churn_drift_rows_total", "counter", "Scored rows binned by the drift monitor.",
+         [({}, report["rows_seen"])]),
+        ("churn_drift_dropped_total", "counter", "Batches not binned because the drift monitor was behind.",
+         [({}, report["dropped"])]),
+        ("churn_drift_psi", "gauge", "Population stability index of each feature over the drift window.",
+         [({"feature": name}, entry["psi"]) for name, entry in window.items() if "psi" in entry]),
+        ("churn_drift_ks", "gauge", "Binned Kolmogorov-Smirnov distance of each continuous feature over the window.",
+         [({"feature": name}, entry["ks"]) for name, entry in window.items() if "ks" in entry]),
+    ]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if profiler is not None:
+        profiler.start()
+    yield
+    await batcher.stop()
+    if shadow is not None:
+        shadow.flush()
+    if profiler is not None:
+        profiler.stop()
+
+
+app = FastAPI(title="Customer Churn Predictor API", lifespan=lifespan)
+if metrics_enabled:
+    app.add_middleware(
+        RequestMetrics,
+        metrics=metrics,
+        on_start=profile_start if profiler else None,
+        on_finish=profile_request if profiler else None,
+    )
+
+
+@app.post("/predict")
+async def predict_churn(data: CustomerData):
+    clock = request_clock()
+    key = cache.key(data)
+    result = cache.get(key)
+    clock.lap("cache")
+    if result is None:
+        result = await batcher.submit((data, profiler.current() if profiler is not None else None))
+        clock.lap("batch")
+        cache.put(key, result)
+    return result
+
+
+@app.post("/predict_batch")
+def predict_churn_batch(batch: CustomerBatch):
+    request_clock()
+    if not batch.customers:
+        return {"predictions": []}
+
+    return {"predictions": cache.get_or_compute(batch.customers, score_customers)}
+
+
+def score_table(body, fmt, output_fmt):
+    """Columnar bulk scoring: decode, validate column-wise, score and encode the predictions."""
+    clock = request_clock()
+    try:
+        table = read_table(body, fmt)
+    except Exception as exc:  # pyarrow raises ArrowInvalid, OSError, ... for corrupt bodies
+        raise HTTPException(status_code=400, detail=f"Cannot read the {fmt} body: {exc}")
+    clock.lap("decode")
+    columns = validate_table(table)
+    clock.lap("validate")
+    preds, churn_probs = score_columns(columns) if table.num_rows else ([], [])
+    clock.reset()
+    content = write_table(prediction_table(preds, churn_probs), output_fmt)
+    clock.lap("format")
+    return content
+
+
+@app.post("/predict_bulk")
+async def predict_churn_bulk(request: Request, format: Literal["arrow", "parquet"] | None = None):
+    fmt = media_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail=f"Send one of {sorted(MEDIA_TYPES.values())}")
+    body = await request.body()
+    output_fmt = format or fmt
+    try:
+        content = await run_in_threadpool(score_table, body, fmt, output_fmt)
+    except ColumnarError as exc:
+        return JSONResponse(status_code=422, content={"detail": exc.errors})
+    return Response(content=content, media_type=MEDIA_TYPES[output_fmt])
+
+
+@app.post("/explain")
+def explain_churn(batch: CustomerBatch, top: int = 3):
+    try:
+        explainer = get_explainer()
+    except ValueError as exc:  # best.joblib is not an XGBoost model
+        raise HTTPException(status_code=501, detail=str(exc))
+    explanations = explainer.explain(records_to_columns(batch.customers), top=top)
+    for explanation in explanations:
+        explanation.update(format_prediction(explanation["prediction"], explanation["churn_probability"]))
+    return {"explanations": explanations}
+
+
+@app.post("/sweep")
+def sweep_customer(request: SweepRequest):
+    """Churn probability of one customer over a grid of one or two feature values, scored in one call."""
+    request_clock()
+    record = {FIELD_COLUMNS[name]: value for name, value in request.customer.model_dump().items()}
+    axes = [(FIELD_COLUMNS.get(axis.feature, axis.feature), axis.values) for axis in request.axes]
+    try:
+        labels, proba, (label, churn_prob) = sweep(get_sweep_engine(), record, axes, request.link_charges)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {
+        "features": [column for column, _ in axes],
+        "values": [axis.values for axis in request.axes],
+        "prediction": labels.astype(int).tolist(),
+        "churn_probability": proba.tolist() if proba is not None else None,
+        "baseline": format_prediction(label, churn_prob),
+    }
+
+
+@app.post("/campaign")
+def plan_campaign(request: CampaignRequest):
+    """Customers of the base to make a retention offer to, maximizing expected retained revenue within a budget."""
+    try:
+        summary, selected = optimize(get_campaign_population(), request.budget, request.offer_cost, request.uplift,
+                                     request.discount, request.cost_unit)
+    except ValueError as exc:  # invalid parameters, or best.joblib has no predict_proba
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {**summary, "customers_selected": selected.head(max(request.limit, 0)).to_dict("records")}
+
+
+def risk_store():
+    try:
+        store = get_risk_store()
+        store.get()
+        return store
+    except ValueError as exc:  # best.joblib has no predict_proba
+        raise HTTPException(status_code=501, detail=str(exc))
+
+
+def risk_index():
+    return risk_store().get()
+
+
+def risk_filters(state, tenure, international_plan, voice_mail_plan):
+    return {"state": state, "tenure": tenure, "international_plan": international_plan,
+            "voice_mail_plan": voice_mail_plan}
+
+
+@app.get("/risk/top")
+def risk_top(k: int = Query(10, ge=0), state: str | None = None, tenure: Literal["Low", "Medium", "High"] | None = None,
+             international_plan: int | None = None, voice_mail_plan: int | None = None):
+    filters = risk_filters(state, tenure, international_plan, voice_mail_plan)
+    return {"customers": risk_index().top(k, **filters)}
+
+
+@app.get("/risk/range")
+def risk_range(min_proba: float = Query(0.5, ge=0, le=1), max_proba: float = Query(1.0, ge=0, le=1),
+               limit: int = Query(100, ge=0), state: str | None = None,
+               tenure: Literal["Low", "Medium", "High"] | None = None,
+               international_plan: int | None = None, voice_mail_plan: int | None = None):
+    if min_proba > max_proba:
+        raise HTTPException(status_code=422, detail="min_proba must not be greater than max_proba")
+    filters = risk_filters(state, tenure, international_plan, voice_mail_plan)
+    count, customers = risk_index().range(min_proba, max_proba, limit, **filters)
+    return {"count": count, "customers": customers}
+
+
+@app.post("/risk/customers")
+def risk_upsert(batch: RiskCustomers):
+    """Add customers to the risk index, or re-score existing ones (by ``customer_ids``)."""
+    if batch.customer_ids is not None and len(batch.customer_ids) != len(batch.customers):
+        raise HTTPException(status_code=422, detail="customer_ids must have one id per customer")
+    store = risk_store()
+    try:
+        ids, proba = store.upsert(records_to_columns(batch.customers), batch.customer_ids)
+    except ValueError as exc:  # duplicate or negative ids
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {"customer_ids": ids.tolist(), "churn_probabilities": proba.tolist(), "size": len(store.get())}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/batcher/stats")
+def batcher_stats():
+    return batcher.stats()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
+
+
+@app.get("/shadow/stats")
+def shadow_stats():
+    return shadow.stats() if shadow is not None else {"enabled": False}
+
+
+@app.get("/drift")
+def drift_report(scope: Literal["window", "total"] = "window"):
+    if drift is None:
+        return {"enabled": False}
+    report = drift.report()
+    other = "total" if scope == "window" else "window"
+    return {key: value for key, value in report.items() if key != other}
+
+
+@app.get("/models")
+def loaded_models():
+    return {"available": registry.names(), "loaded": registry.loaded()}
+
+
 @app.get("/")
 def home():
     return {"message": "Welcome to the Customer Churn Predictor API"}
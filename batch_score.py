@@ -0,0 +1,190 @@
+"""Score a raw customer file in bounded-size chunks.
+
+Reads records shaped like data/raw/churn-bigml-80.csv (CSV or Parquet), applies
+the feature engineering, models/preprocessor.joblib and models/best.joblib, and
+writes predictions incrementally to CSV or Parquet. Chunks are scored on a
+process pool; output keeps the input order and at most ``2 * workers`` chunks
+are held in memory at any time.
+
+    python batch_score.py data/raw/churn-bigml-80.csv predictions.parquet --workers 4
+
+With ``--shadow`` every other artifact next to the model also scores each
+chunk from the same feature matrix, and its predictions (with the ``Churn``
+labels, when the input has them) are appended to ``--shadow-log``; see
+churn/shadow.py and shadow_report.py.
+
+``--explain 3`` adds the three features pushing each customer hardest towards
+churn, with their TreeSHAP contributions in log-odds (``reason_1``,
+``reason_1_contribution``, ...; see churn/explain.py). ``--explain-min-proba``
+limits the explanations to customers at or above that churn probability.
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from churn.features import clean_raw
+from churn.cache import PredictionCache
+from churn.explain import TreeExplainer
+from churn.inference import InferenceEngine
+from churn.registry import ModelRegistry
+from churn.shadow import ShadowLog, ShadowScorer
+
+_engine = None
+_shadow = None
+_explainer = None
+
+
+def _init_worker(model_path, preprocessor_path, shadow_log=None, explain=False):
+    global _engine, _shadow, _explainer
+    _engine = InferenceEngine.load(model_path, preprocessor_path)
+    if explain:
+        # Repeat customers across chunks are explained once per worker
+        _explainer = TreeExplainer(_engine.model, _engine.preprocessor, cache=PredictionCache(model_path))
+    if shadow_log:
+        models_dir, name = os.path.split(model_path)
+        _shadow = ShadowScorer(lambda: _engine, ModelRegistry(models_dir or "."),
+                               champion=os.path.splitext(name)[0], log=ShadowLog(shadow_log))
+
+
+def explain_columns(explainer, X, churn_probs, top, min_proba=0.0):
+    """``reason_<k>`` / ``reason_<k>_contribution`` columns for the rows at or above ``min_proba``."""
+    rows = np.flatnonzero(churn_probs >= min_proba)
+    names = np.full((len(X), top), None, dtype=object)
+    values = np.full((len(X), top), np.nan)
+    if len(rows):
+        _, contributions = explainer.explain_matrix(X[rows])
+        picks = explainer.top_reasons(contributions, top)
+        chosen = np.take_along_axis(contributions, picks.clip(min=0), axis=1)
+        features = np.array(explainer.features + [None], dtype=object)
+        names[rows] = features[picks]
+        values[rows] = np.where(picks >= 0, chosen, np.nan)
+    # Fixed dtypes: a chunk with no row to explain must not give Parquet a null-typed column
+    columns = {}
+    for k in range(top):
+        columns[f"reason_{k + 1}"] = pd.array(names[:, k], dtype="string")
+        columns[f"reason_{k + 1}_contribution"] = values[:, k].astype(np.float64)
+    return columns
+
+
+def score_chunk(chunk, start, keep=(), engine=None, explain=0, explain_min_proba=0.0):
+    cleaned = clean_raw(chunk)
+    X = None
+    if engine is None and _shadow is not None:
+        labels = cleaned["Churn"].to_numpy() if "Churn" in cleaned.columns else None
+        preds, churn_probs = _shadow.score(cleaned, labels)
+        # Workers can exit without running finalizers, so log the chunk before returning it
+        _shadow.flush()
+    elif explain:
+        X = (engine or _engine).matrix(cleaned)
+        preds, churn_probs = (engine or _engine).predict_matrix(X)
+    else:
+        preds, churn_probs = (engine or _engine).predict(cleaned)
+
+    out = pd.DataFrame({"row": range(start, start + len(chunk))})
+    for col in keep:
+        out[col] = chunk[col].to_numpy()
+    out["prediction"] = preds.astype(int)
+    out["churn_probability"] = churn_probs.astype(float)
+    if explain:
+        if X is None:
+            X = (engine or _engine).matrix(cleaned)
+        explainer = _explainer or TreeExplainer((engine or _engine).model, (engine or _engine).preprocessor)
+        for name, values in explain_columns(explainer, X, out["churn_probability"].to_numpy(), explain,
+                                            explain_min_proba).items():
+            out[name] = values
+    return out
+
+
+def read_chunks(path, chunk_size):
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class ChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._header = True
+
+    def write(self, df):
+        if self.parquet:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="w" if self._header else "a", header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def score_file(input_path, output_path, chunk_size=100_000, workers=1, keep=(),
+               model_path="models/best.joblib", preprocessor_path="models/preprocessor.joblib", shadow_log=None,
+               explain=0, explain_min_proba=0.0):
+    writer = ChunkWriter(output_path)
+    rows = 0
+    try:
+        if workers <= 1:
+            _init_worker(model_path, preprocessor_path, shadow_log, bool(explain))
+            for chunk in read_chunks(input_path, chunk_size):
+                writer.write(score_chunk(chunk, rows, keep, explain=explain, explain_min_proba=explain_min_proba))
+                rows += len(chunk)
+            return rows
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(model_path, preprocessor_path, shadow_log, bool(explain))) as pool:
+            pending = deque()
+            for chunk in read_chunks(input_path, chunk_size):
+                pending.append(pool.submit(score_chunk, chunk, rows, keep, explain=explain,
+                                           explain_min_proba=explain_min_proba))
+                rows += len(chunk)
+                # Bound memory: wait for the oldest chunk before reading too far ahead
+                if len(pending) >= 2 * workers:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+        return rows
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="raw customer records (.csv or .parquet)")
+    parser.add_argument("output", help="predictions file (.csv or .parquet)")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--keep", nargs="*", default=[], help="input columns to copy to the output")
+    parser.add_argument("--model", default="models/best.joblib")
+    parser.add_argument("--preprocessor", default="models/preprocessor.joblib")
+    parser.add_argument("--shadow", action="store_true", help="also score every other model in the model's directory")
+    parser.add_argument("--shadow-log", default="results/shadow/predictions.jsonl")
+    parser.add_argument("--explain", type=int, default=0, metavar="N", help="add the top N churn reasons per customer")
+    parser.add_argument("--explain-min-proba", type=float, default=0.0,
+                        help="only explain customers with at least this churn probability")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = score_file(args.input, args.output, args.chunk_size, args.workers, args.keep,
+                      args.model, args.preprocessor, args.shadow_log if args.shadow else None,
+                      args.explain, args.explain_min_proba)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Scored {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/sec) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Wall-clock time of the MLFlow_Deployment.py evaluation step for 7 and 50 models.
+
+Run from the repository root:
+
+    python -m benchmarks.evaluation --counts 7 50
+
+The 50-model case cycles through the seven artifacts in models/. MLflow
+logging is left out so the numbers isolate evaluation: the sequential
+baseline loads each model, calls predict and computes the metrics like the
+old script; the parallel runner is MLFlow_Deployment.evaluate_models.
+"""
+import argparse
+import time
+import warnings
+
+import joblib
+import pandas as pd
+from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, precision_score, recall_score, roc_auc_score
+
+from MLFlow_Deployment import MODELS, X_TEST_PATH, Y_TEST_PATH, evaluate_models
+
+
+def sequential(models, X_test, y_test):
+    for artifact in models.values():
+        model = joblib.load(f"models/{artifact}.joblib")
+        y_pred = model.predict(X_test)
+        accuracy_score(y_test, y_pred)
+        precision_score(y_test, y_pred)
+        recall_score(y_test, y_pred)
+        f1_score(y_test, y_pred)
+        roc_auc_score(y_test, y_pred)
+        confusion_matrix(y_test, y_pred)
+
+
+def expand(count):
+    names = list(MODELS.items())
+    return {f"{names[i % len(names)][0]} #{i}": names[i % len(names)][1] for i in range(count)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[7, 50])
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    X_test = pd.read_csv(X_TEST_PATH)
+    y_test = pd.read_csv(Y_TEST_PATH).squeeze("columns")
+    print(f"{'models':>7}{'sequential s':>15}{'parallel s':>13}")
+    for count in args.counts:
+        models = expand(count)
+        start = time.perf_counter()
+        sequential(models, X_test, y_test)
+        seq = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in evaluate_models(models, workers=args.workers, X_test=X_test, y_test=y_test):
+            pass
+        par = time.perf_counter() - start
+        print(f"{count:>7}{seq:>15.2f}{par:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
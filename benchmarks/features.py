@@ -0,0 +1,102 @@
+"""Throughput benchmark for churn.features.
+
+Run from the repository root:
+
+    python -m benchmarks.features --sizes 1000 100000 10000000
+
+Times the scalar logic that used to live in api.py and ui/app.py, then the
+vectorized transformer at each size. tests/test_features.py checks that the
+two agree.
+"""
+import argparse
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from churn.features import RAW_COLUMNS, build_pipeline, derive_features
+
+
+def scalar_features(row):
+    # Reference: the per-customer logic previously copied into api.py and ui/app.py
+    total_national_minutes = row["Total day minutes"] + row["Total eve minutes"] + row["Total night minutes"]
+    total_national_calls = row["Total day calls"] + row["Total eve calls"] + row["Total night calls"]
+    total_national_charge = row["Total day charge"] + row["Total eve charge"] + row["Total night charge"]
+    return {
+        "State": row["State"],
+        "Tenure category": (
+            "Low" if row["Account length"] <= 74 else "Medium" if row["Account length"] <= 127 else "High"
+        ),
+        "International plan": row["International plan"],
+        "Voice mail plan": row["Voice mail plan"],
+        "Total day minutes": row["Total day minutes"],
+        "Total day charge": row["Total day charge"],
+        "Total eve minutes": row["Total eve minutes"],
+        "Total eve charge": row["Total eve charge"],
+        "Total night minutes": row["Total night minutes"],
+        "Total night charge": row["Total night charge"],
+        "Total intl minutes": row["Total intl minutes"],
+        "Total intl calls": row["Total intl calls"],
+        "Total intl charge": row["Total intl charge"],
+        "Customer service calls": row["Customer service calls"],
+        "Total national minutes": total_national_minutes,
+        "Total national calls": total_national_calls,
+        "Total national charge": total_national_charge,
+        "Avg minutes per call": (
+            total_national_minutes / total_national_calls if total_national_calls > 0 else 0
+        ),
+        "Avg int minutes per call": (
+            row["Total intl minutes"] / row["Total intl calls"] if row["Total intl calls"] > 0 else 0
+        ),
+        "Cost per minute": (
+            total_national_charge / total_national_minutes if total_national_minutes > 0 else 0
+        ),
+        "Cost per minute intl": (
+            row["Total intl charge"] / row["Total intl minutes"] if row["Total intl minutes"] > 0 else 0
+        ),
+        "High service calls": 1 if row["Customer service calls"] > 3 else 0,
+        "Has All Plans": 1 if (row["International plan"] == 1 and row["Voice mail plan"] == 1) else 0,
+        "zero_vmail_messages": 1 if row["Number vmail messages"] == 0 else 0,
+    }
+
+
+def sample_rows(base, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+
+
+def rows_per_sec(func, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return len(data) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    base = pd.read_csv("data/processed/churn_cleaned.csv")[RAW_COLUMNS]
+    pipeline = build_pipeline(joblib.load("models/preprocessor.joblib"))
+
+    scalar = sample_rows(base, 1_000)
+    scalar_rate = rows_per_sec(lambda df: [scalar_features(row) for _, row in df.iterrows()], scalar, 1)
+    print(f"{'scalar (old)':>14} {1_000:>12,} rows {scalar_rate:>16,.0f} rows/sec")
+
+    for n in args.sizes:
+        raw = sample_rows(base, n)
+        repeat = args.repeat if n <= 1_000_000 else 1
+        features_rate = rows_per_sec(derive_features, raw, repeat)
+        pipeline_rate = rows_per_sec(pipeline.transform, raw, repeat)
+        print(f"{'features':>14} {n:>12,} rows {features_rate:>16,.0f} rows/sec")
+        print(f"{'+ preprocessor':>14} {n:>12,} rows {pipeline_rate:>16,.0f} rows/sec")
+        del raw
+
+
+if __name__ == "__main__":
+    main()
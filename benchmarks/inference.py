@@ -0,0 +1,70 @@
+"""Single-customer latency of the inference paths for models/best.joblib.
+
+Run from the repository root:
+
+    python -m benchmarks.inference --requests 5000
+
+Compares the old two-call path (DataFrame -> preprocessor -> predict and
+predict_proba), the InferenceEngine sklearn path and the compiled evaluator,
+after checking the compiled probabilities against XGBoost on churn_cleaned.csv.
+"""
+import argparse
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from churn.features import RAW_COLUMNS, derive_features
+from churn.inference import InferenceEngine
+
+
+def latencies(func, records):
+    out = np.empty(len(records))
+    for i, record in enumerate(records):
+        start = time.perf_counter()
+        func(record)
+        out[i] = time.perf_counter() - start
+    return out * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5_000)
+    args = parser.parse_args()
+
+    model = joblib.load("models/best.joblib")
+    preprocessor = joblib.load("models/preprocessor.joblib")
+    raw = pd.read_csv("data/processed/churn_cleaned.csv")[RAW_COLUMNS]
+
+    sklearn_engine = InferenceEngine(model, preprocessor)
+    compiled_engine = InferenceEngine(model, preprocessor, compiled=True)
+    if compiled_engine.compiled is None:
+        raise SystemExit("❌ best.joblib cannot be compiled (not a binary XGBoost model)")
+
+    X = preprocessor.transform(derive_features(raw))
+    expected = model.predict_proba(X)[:, 1]
+    labels, proba = compiled_engine.predict(raw)
+    print(f"✅ Compiled vs XGBoost: max |dp| = {np.abs(proba - expected).max():.2e}, "
+          f"label agreement = {(labels == model.predict(X)).mean():.4f}")
+
+    def old_path(record):
+        X = preprocessor.transform(derive_features(pd.DataFrame([record])))
+        model.predict(X)[0]
+        model.predict_proba(X)[0][1]
+
+    records = raw.sample(args.requests, replace=True, random_state=0).to_dict("records")
+    paths = [
+        ("old predict + predict_proba", old_path),
+        ("engine (sklearn)", sklearn_engine.predict_record),
+        ("engine (compiled)", compiled_engine.predict_record),
+    ]
+    print(f"{'path':<30}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, func in paths:
+        n = len(records) if "compiled" in name else min(len(records), 500)
+        p50, p95, p99 = np.percentile(latencies(func, records[:n]), [50, 95, 99])
+        print(f"{name:<30}{p50:>10.3f}{p95:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Indexed KNN (churn.knn) against the current models/KNN.joblib estimator.
+
+Run from the repository root:
+
+    python -m benchmarks.knn --rows 20000
+
+Reports index build time, single-row latency (p50/p99), batch throughput,
+recall@k against exact search and label agreement with the estimator, for
+exact search and each ``--recalls`` target. Queries are
+data/processed/X_test_scaled.csv plus ``--rows`` synthetic customers (see
+``benchmarks.synthetic``) run through the preprocessor.
+"""
+import argparse
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+from benchmarks.synthetic import synthetic_raw
+from churn import data
+from churn.features import clean_raw, derive_features
+from churn.knn import IndexedKNN, KNNIndex
+
+
+def latency_ms(func, rows):
+    out = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        func(row[None, :])
+        out[i] = time.perf_counter() - start
+    return np.percentile(out * 1e3, [50, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--single", type=int, default=300, help="single-row queries for latency")
+    parser.add_argument("--recalls", type=float, nargs="+", default=[0.999, 0.99])
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    model = joblib.load("models/KNN.joblib")
+    preprocessor = joblib.load("models/preprocessor.joblib")
+    X_test = data.load("X_test").to_numpy()
+    X_syn = preprocessor.transform(derive_features(clean_raw(synthetic_raw(args.rows, seed=1))))
+    queries = np.vstack([X_test, X_syn])
+
+    start = time.perf_counter()
+    index = KNNIndex.from_model(model)
+    build = time.perf_counter() - start
+    index.calibrate(X_test)
+    print(f"index build: {build * 1e3:.1f} ms over {index.X.shape[0]:,} rows; queries: {len(queries):,} rows")
+
+    start = time.perf_counter()
+    expected = model.predict(queries)
+    brute_s = time.perf_counter() - start
+    truth = index.search(queries, eps=0.0)
+
+    scorers = [("sklearn brute (current)", model), ("index exact", IndexedKNN(index))]
+    scorers += [(f"index recall>={r} (eps={index.eps_for_recall(r)})", IndexedKNN(index, r)) for r in args.recalls]
+
+    print(f"{'backend':<40}{'p50 ms':>9}{'p99 ms':>9}{'rows/s':>12}{'recall':>9}{'agree':>9}")
+    for name, scorer in scorers:
+        p50, p99 = latency_ms(scorer.predict, queries[: args.single])
+        if scorer is model:
+            labels, elapsed, recall = expected, brute_s, 1.0
+        else:
+            start = time.perf_counter()
+            labels = scorer.predict(queries)
+            elapsed = time.perf_counter() - start
+            found = index.search(queries, recall=scorer.recall)
+            recall = sum(len(np.intersect1d(a, b)) for a, b in zip(found, truth)) / truth.size
+        agree = (labels == expected).mean()
+        print(f"{name:<40}{p50:>9.3f}{p99:>9.3f}{len(queries) / elapsed:>12,.0f}{recall:>9.4f}{agree:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
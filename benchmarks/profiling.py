@@ -0,0 +1,106 @@
+"""Overhead of the slow-request profiler (churn.profiling) on POST /predict under load.
+
+Run from the repository root:
+
+    python -m benchmarks.profiling --threads 8 --requests 4000
+
+Several client threads post distinct synthetic customers (see
+``benchmarks.synthetic``) to ``/predict`` in-process through the FastAPI test
+client. Each configuration runs in a fresh process, set up through the same
+environment variables as production: first without ``CHURN_PROFILE_SLOW_MS``,
+then with every ``--thresholds`` x ``--intervals`` pair. A threshold of 0
+samples every request for its whole duration (the worst case). The folded
+stacks go to a temporary directory, so the numbers include the dumps. Rounds
+alternate between configurations, and the best round of each is kept to hold
+machine noise out of the comparison. The prediction cache is turned off so
+every request does the full work.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+
+def load(client, payloads, threads):
+    """Requests per second and per-request latencies (ms) of ``payloads`` posted from ``threads`` threads."""
+    latencies = [0.0] * len(payloads)
+
+    def worker(offset):
+        for i in range(offset, len(payloads), threads):
+            start = time.perf_counter()
+            client.post("/predict", json=payloads[i]).raise_for_status()
+            latencies[i] = (time.perf_counter() - start) * 1e3
+
+    workers = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return len(payloads) / (time.perf_counter() - start), latencies
+
+
+def run(args):
+    """One configuration, in this process; prints a JSON result."""
+    import numpy as np
+    from fastapi.testclient import TestClient
+
+    import api
+    from benchmarks.wire import customers
+
+    warnings.filterwarnings("ignore")
+    payloads = customers(args.requests).to_dict("records")
+    with TestClient(api.app) as client:
+        load(client, payloads[: args.threads * 20], args.threads)  # warm-up
+        rate, latencies = load(client, payloads, args.threads)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    dumps = api.profiler.dumps if api.profiler is not None else 0
+    print(json.dumps({"rate": rate, "p50_ms": p50, "p99_ms": p99, "dumps": dumps}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=4_000)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[250.0, 20.0, 0.0], help="ms")
+    parser.add_argument("--intervals", type=float, nargs="+", default=[5.0, 1.0], help="sampling interval, ms")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        return run(args)
+
+    configs = [(None, None)] + [(threshold, interval) for threshold in args.thresholds for interval in args.intervals]
+    best = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for _ in range(args.rounds):
+            for threshold, interval in configs:
+                env = {**os.environ, "CHURN_CACHE_SIZE": "0", "CHURN_DRIFT": "0"}
+                env.pop("CHURN_PROFILE_SLOW_MS", None)
+                if threshold is not None:
+                    env.update(CHURN_PROFILE_SLOW_MS=str(threshold), CHURN_PROFILE_INTERVAL_MS=str(interval),
+                               CHURN_PROFILE_DIR=output_dir)
+                command = [sys.executable, "-m", "benchmarks.profiling", "--run",
+                           "--threads", str(args.threads), "--requests", str(args.requests)]
+                output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                key = (threshold, interval)
+                if key not in best or result["rate"] > best[key]["rate"]:
+                    best[key] = result
+
+    print(f"{args.requests:,} requests from {args.threads} threads, best of {args.rounds} rounds")
+    print(f"{'threshold':<11}{'interval':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'overhead':>10}{'dumps':>7}")
+    base = best[(None, None)]["rate"]
+    for (threshold, interval), result in best.items():
+        name, every = ("off", "") if threshold is None else (f"{threshold:g} ms", f"{interval:g} ms")
+        print(f"{name:<11}{every:>9}{result['rate']:>9.0f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+              f"{(base / result['rate'] - 1) * 100:>9.1f}%{result['dumps']:>7}")
+
+
+if __name__ == "__main__":
+    main()
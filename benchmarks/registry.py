@@ -0,0 +1,87 @@
+"""Cold start time and per-worker memory: eager joblib loads vs ModelRegistry.
+
+Run from the repository root:
+
+    python -m benchmarks.registry --workers 4
+
+Each scenario runs in fresh worker processes after importing numpy, sklearn,
+xgboost and joblib, so the numbers isolate artifact loading. ``rss`` is the resident set,
+``private`` the pages owned by that worker alone (USS, from
+/proc/self/smaps_rollup); memory-mapped arrays show up as shared, not private.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+SCENARIOS = {
+    # What api.py / MLFlow_Deployment.py did before: load everything eagerly
+    "eager, all artifacts": """
+import glob, joblib
+models = {p: joblib.load(p) for p in sorted(glob.glob("models/*.joblib"))}
+""",
+    # API start-up with the registry: nothing is loaded until the first request
+    "registry, start-up only": """
+from churn.registry import ModelRegistry
+registry = ModelRegistry("models")
+""",
+    "registry, best + preprocessor": """
+from churn.registry import ModelRegistry
+registry = ModelRegistry("models")
+registry.get("best"); registry.get("preprocessor")
+""",
+    "registry (mmap), all artifacts": """
+from churn.registry import ModelRegistry
+registry = ModelRegistry("models")
+models = {name: registry.get(name) for name in registry.names()}
+""",
+}
+
+PROBE = """
+import time, warnings, json
+warnings.filterwarnings("ignore")
+import numpy, sklearn, xgboost, joblib  # library import cost is the same for every scenario
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+
+def kb(path, keys):
+    total = 0
+    for line in open(path):
+        name, _, rest = line.partition(":")
+        if name in keys:
+            total += int(rest.split()[0])
+    return total
+
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": kb("/proc/self/status", {{"VmRSS"}}) / 1024,
+    "private_mb": kb("/proc/self/smaps_rollup", {{"Private_Clean", "Private_Dirty"}}) / 1024,
+}}))
+"""
+
+
+def run(body):
+    out = subprocess.run([sys.executable, "-c", PROBE.format(body=body)],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    baseline = run("pass")
+    print(f"interpreter + imports: {baseline['rss_mb']:.1f} MB RSS, {baseline['private_mb']:.1f} MB private")
+    print(f"{'scenario':<34}{'load ms':>9}{'+rss MB':>9}{'+private MB':>13}{'x' + str(args.workers) + ' workers':>13}")
+    for name, body in SCENARIOS.items():
+        results = [run(body) for _ in range(args.workers)]
+        ms = 1000 * sum(r["seconds"] for r in results) / len(results)
+        rss = sum(r["rss_mb"] for r in results) / len(results) - baseline["rss_mb"]
+        private = sum(r["private_mb"] for r in results) / len(results) - baseline["private_mb"]
+        print(f"{name:<34}{ms:>9.1f}{rss:>9.2f}{private:>13.2f}{private * args.workers:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Benchmark suite for every entry point, written as a JSON report.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --rows 10000000 --output results/benchmarks/run.json
+    python -m benchmarks.suite --compare results/benchmarks/base.json results/benchmarks/run.json
+
+Inputs are synthetic customers (see ``benchmarks.synthetic``) read
+memory-mapped from ``data/synthetic/``. The first ``--rows`` of that file are
+streamed through the engine for end-to-end throughput. The other sections
+slice the sizes they need:
+
+- ``api_predict``: POST /predict latency (p50/p95/p99) with distinct customers
+- ``batch``: ``InferenceEngine.predict`` throughput at ``--batch-sizes``, plus a full streamed pass
+- ``transform``: ``preprocessor.transform`` alone, sklearn vs compiled
+- ``models``: predict vs predict_proba for every artifact in models/
+- ``dashboard``: cube build plus ``update_dashboard`` with and without a State, cold and cached
+- ``evaluation``: ``MLFlow_Deployment.evaluate_models`` on a synthetic test set
+
+A section that cannot run (e.g. dashboard.py on Python < 3.12) is recorded as
+``{"error": ...}`` and the rest continue. ``--compare`` prints the ratio of every
+shared number between two reports.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import traceback
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow.feather as feather
+
+from benchmarks.synthetic import write_synthetic
+from churn.features import FIELD_COLUMNS, clean_raw, derive_features
+from churn.inference import CompiledPreprocessor
+
+SECTIONS = ["api_predict", "batch", "transform", "models", "dashboard", "evaluation"]
+
+
+def timed(func, repeat=3):
+    """Best and median wall time of ``repeat`` calls, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"best_s": min(times), "median_s": float(np.median(times))}
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1e3
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"n": len(ms), "mean_ms": float(ms.mean()), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def throughput(func, rows, repeat=3):
+    result = timed(func, repeat)
+    result["rows"] = rows
+    result["rows_per_s"] = rows / result["best_s"]
+    return result
+
+
+class Inputs:
+    """Lazily cleaned slices of the synthetic file."""
+
+    def __init__(self, path, rows):
+        self.table = feather.read_table(path, memory_map=True).slice(0, rows)
+        self._clean = {}
+
+    def clean(self, n):
+        n = min(n, self.table.num_rows)
+        if n not in self._clean:
+            self._clean[n] = clean_raw(self.table.slice(0, n).to_pandas())
+        return self._clean[n]
+
+
+def bench_api_predict(inputs, args):
+    from fastapi.testclient import TestClient
+
+    import api
+
+    api.cache.clear()
+    fields = {column: field for field, column in FIELD_COLUMNS.items()}
+    customers = inputs.clean(args.requests).rename(columns=fields)[list(fields.values())]
+    payloads = customers.to_dict("records")
+    latencies = []
+    with TestClient(api.app) as client:
+        client.post("/predict", json=payloads[0])
+        for payload in payloads:
+            start = time.perf_counter()
+            client.post("/predict", json=payload).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return {**percentiles(latencies), "cache_hit_rate": api.cache.stats()["hit_rate"]}
+
+
+def bench_batch(inputs, args):
+    import api
+
+    engine = api.get_engine()
+    result = {"compiled": engine.compiled is not None, "sizes": {}}
+    for size in args.batch_sizes:
+        if size > inputs.table.num_rows:
+            continue
+        df = inputs.clean(size)
+        columns = {name: df[name].to_numpy() for name in df.columns}
+        result["sizes"][str(size)] = throughput(lambda: engine.predict(columns), size, args.repeat)
+
+    start = time.perf_counter()
+    for batch in inputs.table.to_batches(max_chunksize=args.chunk_size):
+        engine.predict(clean_raw(batch.to_pandas()))
+    elapsed = time.perf_counter() - start
+    rows = inputs.table.num_rows
+    result["stream"] = {"rows": rows, "chunk_size": args.chunk_size, "seconds": elapsed, "rows_per_s": rows / elapsed}
+    return result
+
+
+def bench_transform(inputs, args):
+    import api
+
+    preprocessor = api.registry.get("preprocessor")
+    compiled = CompiledPreprocessor(preprocessor)
+    result = {}
+    for size in args.batch_sizes:
+        if size > inputs.table.num_rows:
+            continue
+        features = derive_features(inputs.clean(size))
+        columns = {name: features[name].to_numpy() for name in features.columns}
+        result[str(size)] = {
+            "sklearn": throughput(lambda: preprocessor.transform(features), size, args.repeat),
+            "compiled": throughput(lambda: compiled.transform(columns), size, args.repeat),
+        }
+    return result
+
+
+def bench_models(inputs, args):
+    import api
+
+    X = api.registry.get("preprocessor").transform(derive_features(inputs.clean(args.model_rows)))
+    result = {}
+    for name in api.registry.names():
+        if name == "preprocessor":
+            continue
+        model = api.registry.get(name)
+        entry = {"predict": throughput(lambda: model.predict(X), len(X), args.repeat)}
+        if hasattr(model, "predict_proba"):
+            entry["predict_proba"] = throughput(lambda: model.predict_proba(X), len(X), args.repeat)
+        result[name] = entry
+    return result
+
+
+def bench_dashboard(inputs, args):
+    import dashboard
+    from churn.cube import StateCube
+
+    df = inputs.clean(args.dashboard_rows)
+    start = time.perf_counter()
+    dashboard.cube = StateCube(df)
+    result = {"rows": len(df), "cube_build_s": time.perf_counter() - start}
+    state = df["State"].mode()[0]
+    for label, value in (("all_states", None), ("one_state", state)):
+        dashboard.build_dashboard.cache_clear()
+        start = time.perf_counter()
+        dashboard.update_dashboard(value)
+        cold = time.perf_counter() - start
+        result[label] = {"cold_s": cold, "cached": timed(lambda: dashboard.update_dashboard(value), args.repeat)}
+    result["state"] = state
+    return result
+
+
+def bench_evaluation(inputs, args):
+    import api
+    from MLFlow_Deployment import MODELS, evaluate_models
+
+    df = inputs.clean(args.model_rows)
+    X = api.registry.get("preprocessor").transform(derive_features(df))
+    y = df["Churn"]
+    start = time.perf_counter()
+    per_model = {name: elapsed for name, _, _, _, elapsed in evaluate_models(
+        MODELS, workers=args.workers, X_test=X, y_test=y)}
+    return {"rows": len(df), "models": len(MODELS), "total_s": time.perf_counter() - start, "per_model_s": per_model}
+
+
+def metadata(args):
+    import pandas
+    import sklearn
+    import xgboost
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {"numpy": np.__version__, "pandas": pandas.__version__,
+                     "scikit-learn": sklearn.__version__, "xgboost": xgboost.__version__},
+        "args": {key: value for key, value in vars(args).items() if key != "compare"},
+    }
+
+
+def flatten(report, prefix=""):
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, f"{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = dict(flatten(json.load(f)["results"]))
+    with open(new_path) as f:
+        new = dict(flatten(json.load(f)["results"]))
+    print(f"{'metric':<60}{'old':>14}{'new':>14}{'new/old':>10}")
+    for name in sorted(old.keys() & new.keys()):
+        ratio = new[name] / old[name] if old[name] else float("nan")
+        print(f"{name:<60}{old[name]:>14.4g}{new[name]:>14.4g}{ratio:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="synthetic rows (up to 10M)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--requests", type=int, default=2_000, help="single-row API requests")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 10_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="rows per chunk in the streamed pass")
+    parser.add_argument("--model-rows", type=int, default=10_000, help="rows for the per-model and evaluation sections")
+    parser.add_argument("--dashboard-rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None, help="evaluation process pool size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="results/benchmarks/latest.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two reports instead of running")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    warnings.filterwarnings("ignore")
+
+    path = write_synthetic(args.rows, args.seed)
+    inputs = Inputs(path, args.rows)
+    report = {"meta": metadata(args), "results": {}}
+    for section in args.sections:
+        print(f"⏱️  {section}...")
+        start = time.perf_counter()
+        try:
+            report["results"][section] = globals()[f"bench_{section}"](inputs, args)
+        except Exception as exc:
+            traceback.print_exc()
+            report["results"][section] = {"error": f"{type(exc).__name__}: {exc}"}
+        print(f"   done in {time.perf_counter() - start:.1f}s")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=float)
+    print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
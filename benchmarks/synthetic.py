@@ -0,0 +1,75 @@
+"""Synthetic customers with the schema of data/raw/churn-bigml-80.csv.
+
+Run from the repository root:
+
+    python -m benchmarks.synthetic --rows 10000000
+
+Rows are bootstrapped from the raw file, so State, plans, service calls and
+Churn keep their joint distribution. Minutes and call counts are jittered,
+and charges are recomputed from the minutes at each period's tariff. The
+output is an Arrow IPC file with the ``churn.data.RAW_TYPES`` dtypes. It is
+written in chunks, so memory use does not depend on ``--rows``. The same
+rows and seed always give the same file.
+"""
+import argparse
+import os
+
+import numpy as np
+import pyarrow as pa
+
+from churn import data
+
+SOURCE = "raw_train"
+PERIODS = ["day", "eve", "night", "intl"]
+CHUNK_SIZE = 1_000_000
+
+
+def synthetic_raw(n, seed=0, base=None):
+    """Return ``n`` synthetic raw rows as a DataFrame."""
+    base = data.load(SOURCE) if base is None else base
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+    df["Account length"] = np.clip(df["Account length"] + rng.integers(-10, 11, n), 1, None)
+    for period in PERIODS:
+        minutes, calls, charge = (f"Total {period} {kind}" for kind in ("minutes", "calls", "charge"))
+        rate = (base[charge] / base[minutes].where(base[minutes] > 0)).median()
+        noise = rng.normal(0, 0.05 * base[minutes].std(), n)
+        df[minutes] = np.clip(df[minutes] + noise, 0, None).round(1)
+        df[calls] = np.clip(df[calls] + rng.integers(-3, 4, n), 0, None)
+        df[charge] = (df[minutes] * rate).round(2)
+    return df
+
+
+def synthetic_path(rows, seed=0):
+    return f"data/synthetic/raw-{rows}-{seed}.feather"
+
+
+def write_synthetic(rows, seed=0, path=None, chunk_size=CHUNK_SIZE):
+    """Write ``rows`` synthetic rows to ``path`` unless it already exists; return the path."""
+    path = path or synthetic_path(rows, seed)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    base = data.load(SOURCE)
+    schema = pa.schema([(name, data.RAW_TYPES[name]) for name in base.columns])
+    tmp = f"{path}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for i, start in enumerate(range(0, rows, chunk_size)):
+            chunk = synthetic_raw(min(chunk_size, rows - start), seed=(seed, i), base=base)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="default: data/synthetic/raw-<rows>-<seed>.feather")
+    args = parser.parse_args()
+    path = write_synthetic(args.rows, args.seed, args.output)
+    print(f"✅ {args.rows:,} synthetic rows in {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
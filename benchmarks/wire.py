@@ -0,0 +1,83 @@
+"""Bytes and CPU per row of the JSON and the columnar bulk routes of api.py.
+
+Run from the repository root:
+
+    python -m benchmarks.wire --rows 10000
+
+Posts the same synthetic customers (see ``benchmarks.synthetic``) to
+``/predict_batch`` as JSON and to ``/predict_bulk`` as an Arrow IPC stream and
+as Parquet, in-process through the FastAPI test client. Bodies are encoded
+once up front; CPU time is measured around the calls, so it covers the
+server's decode, validation, scoring and response encoding (plus the test
+client's transport, which is the same for every route). The prediction cache
+and the drift monitor are turned off so every call does the full work.
+"""
+import argparse
+import json
+import os
+import time
+import warnings
+
+os.environ.setdefault("CHURN_CACHE_SIZE", "0")
+os.environ.setdefault("CHURN_DRIFT", "0")
+
+import pyarrow as pa  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api  # noqa: E402
+from benchmarks.synthetic import synthetic_raw  # noqa: E402
+from churn.columnar import ARROW_STREAM, PARQUET, write_table  # noqa: E402
+from churn.features import FIELD_COLUMNS, STATE_NAMES  # noqa: E402
+
+
+def customers(rows, seed=0):
+    raw = synthetic_raw(rows, seed=seed)
+    raw["State"] = raw["State"].map(STATE_NAMES)
+    for column in ("International plan", "Voice mail plan"):
+        raw[column] = raw[column].astype(int)
+    return raw[list(FIELD_COLUMNS.values())].rename(columns={v: k for k, v in FIELD_COLUMNS.items()})
+
+
+def measure(client, path, body, content_type, repeat):
+    client.post(path, content=body, headers={"content-type": content_type})  # warm-up
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(repeat):
+        response = client.post(path, content=body, headers={"content-type": content_type})
+        response.raise_for_status()
+    return (time.process_time() - cpu) / repeat, (time.perf_counter() - wall) / repeat, len(response.content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    df = customers(args.rows)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    bodies = [
+        ("json", "/predict_batch", json.dumps({"customers": df.to_dict("records")}).encode(), "application/json"),
+        ("arrow", "/predict_bulk", write_table(table, "arrow"), ARROW_STREAM),
+        ("parquet", "/predict_bulk", write_table(table, "parquet"), PARQUET),
+    ]
+    results = {}
+    with TestClient(api.app) as client:
+        for name, path, body, content_type in bodies:
+            cpu, wall, response_bytes = measure(client, path, body, content_type, args.repeat)
+            results[name] = (len(body) / args.rows, response_bytes / args.rows, cpu / args.rows * 1e6,
+                             wall / args.rows * 1e6)
+
+    print(f"{args.rows:,} rows per call, mean of {args.repeat} calls")
+    print(f"{'format':<8} {'req B/row':>10} {'resp B/row':>11} {'CPU us/row':>11} {'wall us/row':>12}")
+    for name, (request_b, response_b, cpu_us, wall_us) in results.items():
+        print(f"{name:<8} {request_b:>10.1f} {response_b:>11.1f} {cpu_us:>11.2f} {wall_us:>12.2f}")
+    base = results["json"]
+    for name in ("arrow", "parquet"):
+        request_b, response_b, cpu_us, _ = results[name]
+        print(f"{name} vs json: {(base[0] + base[1]) / (request_b + response_b):.1f}x fewer bytes, "
+              f"{base[2] / cpu_us:.1f}x less CPU per row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Build the nearest-neighbour index for models/KNN.joblib.
+
+    python build_knn_index.py
+
+Writes the float32 training matrix to models/index/KNN/ and calibrates
+approximate search on data/processed/X_test_scaled.csv: the recall of each
+``eps`` is stored with the index, so callers can ask for a target recall
+(see churn/knn.py). The registry serves the index in place of the model it was
+built from (shadow scoring, MLFlow_Deployment.py) until that model changes.
+"""
+import argparse
+import time
+
+import joblib
+
+from churn import data
+from churn.knn import KNNIndex
+from churn.registry import file_fingerprint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="models/KNN.joblib")
+    parser.add_argument("--output", default="models/index/KNN")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = KNNIndex.from_model(joblib.load(args.model), calibration_queries=data.load("X_test").to_numpy())
+    index.save(args.output, file_fingerprint(args.model))
+    print(f"✅ Index over {index.X.shape[0]:,} rows built in {time.perf_counter() - start:.2f}s -> {args.output}")
+    for eps, recall in zip(index.calibration["eps"], index.calibration["recall"]):
+        print(f"   eps={eps:<5} recall@{index.n_neighbors}={recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
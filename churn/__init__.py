@@ -0,0 +1 @@
+"""Shared code used by the API, the Streamlit app, the dashboard and the offline scripts."""
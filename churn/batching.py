@@ -0,0 +1,120 @@
+"""Asyncio micro-batching for the prediction routes.
+
+Concurrent requests are queued and flushed together once ``max_batch_size``
+rows are waiting or the oldest one has waited ``max_wait_ms``; a request that
+finds nothing else queued is flushed at once, so an idle server adds no wait.
+Each flush runs one vectorized call in a worker thread and hands every caller
+its own result. If the batch call fails, its items are scored one by one, so
+a bad record only fails its own request.
+"""
+import asyncio
+import time
+
+from churn.metrics import Histogram
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+QUEUE_WAIT_BUCKETS_MS = [0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250]
+
+
+class MicroBatcher:
+    """Collect single items into batches for ``predict_batch(items) -> results``."""
+
+    def __init__(self, predict_batch, max_batch_size=256, max_wait_ms=2.0):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._batch = []  # taken off the queue, not answered yet
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def stop(self):
+        """Stop the flush task and fail the requests it will no longer answer."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending = self._batch
+        self._batch = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("The micro-batcher was stopped"))
+
+    async def _collect(self):
+        batch = self._batch = [await self._queue.get()]
+        if self._queue.empty():
+            return batch  # nobody else is waiting: do not hold this one back
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Take whatever else is already queued, up to the size limit
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    def _predict_each(self, items):
+        """``(result, exception)`` per item, scoring them one at a time."""
+        outcomes = []
+        for item in items:
+            try:
+                outcomes.append((self.predict_batch([item])[0], None))
+            except Exception as exc:
+                outcomes.append((None, exc))
+        return outcomes
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            now = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_ms.observe((now - enqueued) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            items = [item for item, _, _ in batch]
+            try:
+                outcomes = [(result, None) for result in await asyncio.to_thread(self.predict_batch, items)]
+            except Exception as exc:
+                outcomes = [(None, exc)] if len(batch) == 1 else await asyncio.to_thread(self._predict_each, items)
+            for (_, future, _), (result, exc) in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if exc is not None:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+            self._batch = []
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
@@ -0,0 +1,138 @@
+"""Prediction cache shared by the API and the Streamlit app.
+
+Entries are keyed by a stable hash of the canonicalized customer fields plus
+the fingerprints of the model artifact and, when given, the preprocessor,
+evicted LRU-first once ``max_size`` is reached or when older than ``ttl``
+seconds, and dropped wholesale when either file changes on disk.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from churn.features import FIELD_COLUMNS
+from churn.registry import file_fingerprint
+
+
+def canonical_record(record):
+    """Map a CustomerData model or dict (field or raw column names) to a canonical tuple."""
+    if hasattr(record, "model_dump"):
+        record = record.model_dump()
+    values = {FIELD_COLUMNS.get(name, name): value for name, value in record.items()}
+    canonical = []
+    for column in sorted(values):
+        value = values[column]
+        canonical.append((column, value.strip() if isinstance(value, str) else float(value)))
+    return canonical
+
+
+def record_key(record, fingerprint=""):
+    payload = json.dumps([fingerprint, canonical_record(record)], separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def row_key(row, fingerprint=""):
+    """Key of one model input row (a NumPy array), e.g. for caching explanations."""
+    return hashlib.blake2b(row.tobytes(), digest_size=16, key=fingerprint.encode()[:64]).hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe LRU + TTL cache of prediction results.
+
+    ``model_path`` (and ``preprocessor_path``, for results that depend on it)
+    are re-checked at most every ``check_interval`` seconds; a new fingerprint
+    of either empties the cache.
+    """
+
+    def __init__(self, model_path="models/best.joblib", max_size=100_000, ttl=3600.0, check_interval=1.0,
+                 preprocessor_path=None):
+        self.model_path = model_path
+        self.preprocessor_path = preprocessor_path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = self._current_fingerprint()
+        self._checked = time.monotonic()
+
+    def _current_fingerprint(self):
+        fingerprint = file_fingerprint(self.model_path)
+        if self.preprocessor_path:
+            fingerprint += ":" + file_fingerprint(self.preprocessor_path)
+        return fingerprint
+
+    @property
+    def fingerprint(self):
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            fingerprint = self._current_fingerprint()
+            if fingerprint != self._fingerprint:
+                with self._lock:
+                    self._fingerprint = fingerprint
+                    self._entries.clear()
+                    self.invalidations += 1
+        return self._fingerprint
+
+    def key(self, record):
+        return record_key(record, self.fingerprint)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires <= now:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, records, compute):
+        """Return cached results for ``records``, computing the misses in one ``compute`` call."""
+        keys = [self.key(record) for record in records]
+        results = [self.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, result in zip(missing, compute([records[i] for i in missing])):
+                results[i] = result
+                self.put(keys[i], result)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "model_fingerprint": self._fingerprint.split(":")[0],
+            "preprocessor_fingerprint": self._fingerprint.split(":")[1] if self.preprocessor_path else None,
+        }
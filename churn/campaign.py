@@ -0,0 +1,325 @@
+"""Budgeted retention campaigns: which customers to make an offer to.
+
+A customer's revenue is the sum of the day, eve, night and intl charges (as
+in the dashboard). An offer costs ``offer_cost`` plus ``discount`` times that
+revenue, and keeps an ``uplift`` fraction of the customers who would have
+churned. Making an offer to customer ``i`` is therefore worth
+
+    expected retained revenue = churn probability x revenue x uplift
+
+and :class:`CampaignOptimizer` picks the customers that maximize the total
+worth with a total cost within ``budget`` (a 0/1 knapsack):
+
+* greedy: customers in decreasing worth/cost order, as long as they fit,
+  then the leftover budget is filled with the next customers that still fit.
+  With no ``discount`` every offer costs the same and this is exact;
+* knapsack refinement: when the budget is at most :data:`KNAPSACK_MAX_UNITS`
+  cost units (cents by default), a dynamic program with costs rounded up to
+  the unit replaces the greedy selection if it is better. A second pass keeps
+  only the customers that can be in the optimum: their worth plus the LP
+  relaxation bound for the rest of the budget must reach a solution already
+  found. If they fit in :data:`DP_MAX_CELLS`, the result is exact
+  (``refinement="exact"``). Otherwise (many small offers, where greedy is
+  within one offer of the optimum anyway) the program runs over the greedy
+  candidates (``refinement="candidates"``).
+
+The scored population is streamed in chunks. Only candidates that can still
+matter are kept: in worth/cost order, until their cumulative cost reaches
+twice the budget (enough for the greedy fill and the LP bound). Memory
+depends on the budget, not on the number of customers. The refinement needs
+a second pass: :func:`optimize` spills the chunks to a temporary Arrow file
+(:class:`ChunkFile`) on the first one and rereads it memory-mapped, so the
+input is read and scored only once.
+"""
+import os
+import tempfile
+import weakref
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from churn.cube import CHARGE_COLUMNS
+
+# The knapsack refinement runs for budgets up to this many cost units...
+KNAPSACK_MAX_UNITS = 100_000
+# ...and dynamic programs up to this many (candidate, capacity) cells
+DP_MAX_CELLS = 200_000_000
+# Candidates are kept while their cumulative cost is within this multiple of the budget
+POOL_BUDGETS = 2.0
+# Pending chunk rows are merged into the pool when they reach this many (or the pool size)
+MIN_COMPACT_ROWS = 1_000_000
+
+FIELDS = ("customer_id", "churn_probability", "revenue", "offer_cost", "expected_retained_revenue")
+CHUNK_SCHEMA = pa.schema([("customer_id", pa.int64()), ("churn_probability", pa.float64()),
+                          ("revenue", pa.float64())])
+
+
+def revenue(data):
+    """Revenue per customer: the sum of the charge columns of raw customer columns or a DataFrame."""
+    return sum(np.asarray(data[column], dtype=np.float64) for column in CHARGE_COLUMNS)
+
+
+def knapsack(costs, values, capacity):
+    """Indices of the 0/1 knapsack optimum for integer ``costs`` (>= 1) and a capacity, by dynamic programming."""
+    best = np.zeros(capacity + 1)
+    taken = np.zeros((len(costs), (capacity + 8) // 8), dtype=np.uint8)  # packed "item i improves cell c"
+    for i, (cost, value) in enumerate(zip(costs, values)):
+        if cost > capacity:
+            continue
+        with_item = best[:-cost] + value
+        better = with_item > best[cost:]
+        best[cost:] = np.where(better, with_item, best[cost:])
+        taken[i] = np.packbits(np.concatenate([np.zeros(cost, dtype=bool), better]), bitorder="little")
+    chosen, cell = [], capacity
+    for i in range(len(costs) - 1, -1, -1):
+        if (taken[i, cell >> 3] >> (cell & 7)) & 1:
+            chosen.append(i)
+            cell -= costs[i]
+    return np.array(chosen[::-1], dtype=np.int64)
+
+
+def _concat(parts):
+    return {name: np.concatenate([part[name] for part in parts]) for name in FIELDS}
+
+
+class CampaignOptimizer:
+    """Streaming budgeted selection of retention offers.
+
+    Feed the scored population with :meth:`add`, then call :meth:`result`.
+    For the knapsack refinement, feed the same population again with
+    :meth:`refine` before :meth:`result` (:func:`optimize` does both).
+    """
+
+    def __init__(self, budget, offer_cost, uplift=0.2, discount=0.0, cost_unit=0.01,
+                 knapsack_max_units=KNAPSACK_MAX_UNITS):
+        if budget < 0:
+            raise ValueError("budget must not be negative")
+        if offer_cost <= 0 or discount < 0:
+            raise ValueError("offer_cost must be positive and discount not negative")
+        if not 0 < uplift <= 1:
+            raise ValueError("uplift must be in (0, 1]")
+        if cost_unit <= 0:
+            raise ValueError("cost_unit must be positive")
+        self.budget = float(budget)
+        self.offer_cost = float(offer_cost)
+        self.uplift = float(uplift)
+        self.discount = float(discount)
+        self.cost_unit = float(cost_unit)
+        self.capacity = int(np.floor(self.budget / self.cost_unit + 1e-9))  # budget in cost units
+        # Equal offer costs (no discount) already make greedy exact
+        self.use_knapsack = self.capacity <= knapsack_max_units and self.discount > 0
+        self.customers = 0
+        self._pool = {name: np.empty(0) for name in FIELDS}
+        self._pool["customer_id"] = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_rows = 0
+        self._floor = 0.0  # worth/cost below which a customer can no longer make the pool
+        self._candidates = None  # from refine(): the customers the dynamic program runs over
+        self.refinement = None
+
+    def _chunk(self, ids, churn_probability, revenue):
+        proba = np.asarray(churn_probability, dtype=np.float64)
+        revenue = np.asarray(revenue, dtype=np.float64)
+        value = proba * revenue * self.uplift
+        cost = self.offer_cost + self.discount * revenue
+        return dict(zip(FIELDS, (np.asarray(ids, dtype=np.int64), proba, revenue, cost, value)))
+
+    def add(self, ids, churn_probability, revenue):
+        """Add one chunk of the scored population."""
+        chunk = self._chunk(ids, churn_probability, revenue)
+        self.customers += len(chunk["customer_id"])
+        value, cost = chunk["expected_retained_revenue"], chunk["offer_cost"]
+        keep = (value > 0) & (cost <= self.budget) & (value / cost >= self._floor)
+        if not keep.any():
+            return
+        self._pending.append({name: values[keep] for name, values in chunk.items()})
+        self._pending_rows += int(keep.sum())
+        if self._pending_rows >= max(MIN_COMPACT_ROWS, len(self._pool["customer_id"])):
+            self._compact()
+
+    def _compact(self):
+        """Merge the pending chunks into the pool, in worth/cost order, and drop what can no longer fit."""
+        if not self._pending:
+            return
+        merged = _concat([self._pool] + self._pending)
+        self._pending, self._pending_rows = [], 0
+        ratio = merged["expected_retained_revenue"] / merged["offer_cost"]
+        order = np.lexsort((merged["customer_id"], -ratio))
+        cumulative = np.cumsum(merged["offer_cost"][order])
+        limit = POOL_BUDGETS * self.budget
+        kept = min(int(np.searchsorted(cumulative, limit, side="right")) + 1, len(order))
+        order = order[:kept]
+        self._pool = {name: values[order] for name, values in merged.items()}
+        if kept and cumulative[kept - 1] >= limit:
+            self._floor = float(ratio[order[-1]])
+
+    def _greedy(self):
+        """Pool positions picked by the greedy ratio order (the pool is sorted by worth/cost)."""
+        cost = self._pool["offer_cost"]
+        prefix = int(np.searchsorted(np.cumsum(cost), self.budget, side="right"))
+        chosen = list(range(prefix))
+        left = self.budget - cost[:prefix].sum()
+        candidates = np.flatnonzero(cost[prefix:] <= left) + prefix
+        cheapest_after = np.minimum.accumulate(cost[candidates][::-1])[::-1]
+        for i, cheapest in zip(candidates, cheapest_after):
+            if left < cheapest:
+                break
+            if cost[i] <= left:
+                chosen.append(i)
+                left -= cost[i]
+        return np.array(chosen, dtype=np.int64)
+
+    def _units(self, cost):
+        return np.ceil(cost / self.cost_unit - 1e-9).astype(np.int64)
+
+    def _lp_bound(self, capacity):
+        """Best fractional worth within each ``capacity``; exact from the pool for capacities up to the budget."""
+        cost, value = self._pool["offer_cost"], self._pool["expected_retained_revenue"]
+        if not len(cost):
+            return np.zeros(len(capacity))
+        spent = np.concatenate([[0.0], np.cumsum(cost)])
+        worth = np.concatenate([[0.0], np.cumsum(value)])
+        whole = np.clip(np.searchsorted(spent, capacity, side="right") - 1, 0, len(cost))
+        partial = np.minimum(whole, len(cost) - 1)
+        fraction = np.where(whole < len(cost), (capacity - spent[whole]) * value[partial] / cost[partial], 0.0)
+        return worth[whole] + fraction
+
+    def refine(self, chunks):
+        """Second pass over the same ``(ids, churn_probabilities, revenue)`` chunks for the knapsack refinement."""
+        if not self.use_knapsack:
+            return
+        self._compact()
+        # A solution with rounded-up costs: the greedy prefix that still fits
+        units = np.cumsum(self._units(self._pool["offer_cost"]))
+        lower = float(self._pool["expected_retained_revenue"][:np.searchsorted(units, self.capacity, "right")].sum())
+        lower -= 1e-9 * max(lower, 1.0)
+        parts, rows, max_rows = [], 0, DP_MAX_CELLS // (self.capacity + 1)
+        for ids, proba, customer_revenue in chunks:
+            chunk = self._chunk(ids, proba, customer_revenue)
+            units = self._units(chunk["offer_cost"])
+            value = chunk["expected_retained_revenue"]
+            # Rounded-up costs can only lower the LP bound of the real costs
+            upper = value + self._lp_bound((self.capacity - units) * self.cost_unit)
+            keep = (value > 0) & (units <= self.capacity) & (upper >= lower)
+            rows += int(keep.sum())
+            if rows > max_rows:
+                parts = None
+                break
+            parts.append({name: values[keep] for name, values in chunk.items()})
+        if parts is not None:
+            empty = {name: values[:0] for name, values in self._pool.items()}
+            self._candidates, self.refinement = _concat([empty] + parts), "exact"
+        else:
+            fits = self._units(self._pool["offer_cost"]) <= self.capacity
+            self._candidates = {name: values[fits] for name, values in self._pool.items()}
+            self.refinement = "candidates"
+
+    def _knapsack(self):
+        """Candidate positions of the knapsack optimum on rounded-up costs, or ``None`` if not refined."""
+        pool = self._candidates
+        if pool is None or len(pool["customer_id"]) * (self.capacity + 1) > DP_MAX_CELLS:
+            return None
+        return knapsack(self._units(pool["offer_cost"]), pool["expected_retained_revenue"], self.capacity)
+
+    def result(self):
+        """``(summary dict, selected customers DataFrame)``; the customers are in decreasing worth order."""
+        self._compact()
+        pool, chosen, method = self._pool, self._greedy(), "greedy"
+        greedy_value = float(pool["expected_retained_revenue"][chosen].sum())
+        packed = self._knapsack()
+        if packed is not None and self._candidates["expected_retained_revenue"][packed].sum() > greedy_value + 1e-9:
+            pool, chosen, method = self._candidates, packed, "knapsack"
+        selected = pd.DataFrame({name: pool[name][chosen] for name in FIELDS})
+        selected = selected.sort_values(["expected_retained_revenue", "customer_id"], ascending=[False, True],
+                                        ignore_index=True)
+        summary = {
+            "customers": self.customers,
+            "candidates": len(self._pool["customer_id"]),
+            "knapsack_candidates": len(self._candidates["customer_id"]) if self._candidates is not None else None,
+            "refinement": self.refinement if packed is not None else None,
+            "method": method,
+            "selected": len(selected),
+            "total_cost": float(selected["offer_cost"].sum()),
+            "expected_retained_revenue": float(selected["expected_retained_revenue"].sum()),
+            "greedy_expected_retained_revenue": greedy_value,
+            "budget": self.budget,
+        }
+        return summary, selected
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class ChunkFile:
+    """``(ids, churn_probabilities, revenue)`` chunks in a temporary Arrow IPC file, reread memory-mapped.
+
+    The file is removed by :meth:`close` or when the object is garbage-collected.
+    """
+
+    def __init__(self, dir=None):
+        fd, self.path = tempfile.mkstemp(prefix="campaign-", suffix=".arrow", dir=dir)
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, _remove, self.path)
+
+    @classmethod
+    def from_chunks(cls, chunks, dir=None):
+        spill = cls(dir)
+        for _ in spill.write(chunks):
+            pass
+        return spill
+
+    def write(self, chunks):
+        """Yield the chunks unchanged, writing each one to the file on the way."""
+        with pa.OSFile(self.path, "wb") as sink, pa.ipc.new_file(sink, CHUNK_SCHEMA) as writer:
+            for ids, proba, customer_revenue in chunks:
+                writer.write_batch(pa.record_batch(
+                    [np.asarray(ids, dtype=np.int64), np.asarray(proba, dtype=np.float64),
+                     np.asarray(customer_revenue, dtype=np.float64)],
+                    schema=CHUNK_SCHEMA,
+                ))
+                yield ids, proba, customer_revenue
+
+    def __iter__(self):
+        with pa.memory_map(self.path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield tuple(column.to_numpy() for column in reader.get_batch(i).columns)
+
+    def close(self):
+        self._finalizer()
+
+
+def scored_chunks(engine, base, chunk_size=100_000):
+    """``(ids, churn_probabilities, revenue)`` chunks of a raw customer DataFrame; ids are its row numbers."""
+    for start in range(0, len(base), chunk_size):
+        chunk = base.iloc[start:start + chunk_size]
+        _, proba = engine.predict(chunk)
+        if proba.dtype == object:
+            raise ValueError("The campaign optimizer needs a model with predict_proba")
+        yield np.arange(start, start + len(chunk)), proba, revenue(chunk)
+
+
+def optimize(chunks, budget, offer_cost, uplift=0.2, discount=0.0, cost_unit=0.01, spill_dir=None):
+    """Run :class:`CampaignOptimizer` over ``(ids, churn_probabilities, revenue)`` chunks.
+
+    ``chunks`` is iterated once. When the knapsack refinement needs a second
+    pass, the chunks are spilled to a :class:`ChunkFile` in ``spill_dir`` on
+    the way, unless ``chunks`` already is one.
+    """
+    optimizer = CampaignOptimizer(budget, offer_cost, uplift, discount, cost_unit)
+    if not optimizer.use_knapsack or isinstance(chunks, ChunkFile):
+        for ids, proba, customer_revenue in chunks:
+            optimizer.add(ids, proba, customer_revenue)
+        optimizer.refine(chunks)
+        return optimizer.result()
+    spill = ChunkFile(spill_dir)
+    try:
+        for ids, proba, customer_revenue in spill.write(chunks):
+            optimizer.add(ids, proba, customer_revenue)
+        optimizer.refine(spill)
+        return optimizer.result()
+    finally:
+        spill.close()
@@ -0,0 +1,144 @@
+"""Columnar wire format for bulk scoring: Arrow IPC streams and Parquet.
+
+A bulk request body is one table with a row per customer and the columns of
+``CustomerData`` (field names such as ``total_day_minutes``, or the raw
+column names such as ``Total day minutes``). :func:`validate_table` checks
+whole columns with ``pyarrow.compute`` instead of validating object by
+object. It checks presence, nulls, numeric types, integral values for the
+count columns, non-negative finite values, 0/1 plans and known State names,
+and returns the raw-column NumPy arrays that
+:func:`churn.features.derive_columns` takes. Responses are tables with
+``prediction`` (int8) and ``churn_probability`` (float32, null for models
+without probabilities), in the format of the request.
+"""
+import io
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from churn.features import FIELD_COLUMNS, STATE_NAMES
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+ARROW_FILE = "application/vnd.apache.arrow.file"
+PARQUET = "application/vnd.apache.parquet"
+MEDIA_TYPES = {"arrow": ARROW_STREAM, "parquet": PARQUET}
+
+# Minutes and charges may have decimals; the other numeric columns are counts
+DECIMAL_COLUMNS = {
+    f"Total {period} {kind}" for period in ("day", "eve", "night", "intl") for kind in ("minutes", "charge")
+}
+FLAG_COLUMNS = {"International plan", "Voice mail plan"}
+STATES = pa.array(sorted(STATE_NAMES.values()))
+# Offending row numbers listed per error
+MAX_ROWS_REPORTED = 5
+
+
+class ColumnarError(ValueError):
+    """Invalid bulk request; ``errors`` lists ``{"column", "error", "count", "rows"}`` dicts."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{e['column']}: {e['error']}" for e in errors))
+        self.errors = errors
+
+
+def media_format(content_type):
+    """``"arrow"`` or ``"parquet"`` for a request Content-Type, ``None`` if unsupported."""
+    media = (content_type or "").split(";")[0].strip().lower()
+    if media in (ARROW_STREAM, ARROW_FILE, "application/x-arrow"):
+        return "arrow"
+    if media in (PARQUET, "application/x-parquet"):
+        return "parquet"
+    return None
+
+
+def read_table(body, fmt):
+    if fmt == "parquet":
+        return pq.read_table(pa.BufferReader(body))
+    if body[:6] == b"ARROW1":  # IPC file format rather than a stream
+        return ipc.open_file(pa.BufferReader(body)).read_all()
+    return ipc.open_stream(pa.BufferReader(body)).read_all()
+
+
+def write_table(table, fmt):
+    sink = io.BytesIO()
+    if fmt == "parquet":
+        pq.write_table(table, sink)
+    else:
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue()
+
+
+def _error(errors, column, message, mask=None):
+    entry = {"column": column, "error": message}
+    if mask is not None:
+        rows = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+        entry.update(count=int(len(rows)), rows=rows[:MAX_ROWS_REPORTED].tolist())
+    errors.append(entry)
+
+
+def validate_table(table):
+    """Raw-column NumPy arrays for a request table; raises :class:`ColumnarError` listing every problem."""
+    names = {FIELD_COLUMNS.get(name, name): name for name in table.column_names}
+    errors, columns = [], {}
+    for column in FIELD_COLUMNS.values():
+        if column not in names:
+            _error(errors, column, "missing column")
+            continue
+        values = table.column(names[column]).combine_chunks()
+        if values.null_count:
+            _error(errors, column, "null values", values.is_null())
+            continue
+        if column == "State":
+            if not (pa.types.is_string(values.type) or pa.types.is_large_string(values.type)
+                    or pa.types.is_dictionary(values.type)):
+                _error(errors, column, f"expected strings, got {values.type}")
+                continue
+            values = values.cast(pa.string())
+            unknown = pc.invert(pc.is_in(values, value_set=STATES))
+            if pc.any(unknown).as_py():
+                _error(errors, column, "unknown state name", unknown)
+                continue
+            columns[column] = values.to_numpy(zero_copy_only=False)
+            continue
+        integral = column not in DECIMAL_COLUMNS
+        if pa.types.is_boolean(values.type):
+            values = values.cast(pa.int8())
+        if not (pa.types.is_integer(values.type) or pa.types.is_floating(values.type)):
+            _error(errors, column, f"expected numbers, got {values.type}")
+            continue
+        if pa.types.is_floating(values.type):
+            bad = pc.invert(pc.is_finite(values))
+            if pc.any(bad).as_py():
+                _error(errors, column, "NaN or infinite values", bad)
+                continue
+            if integral:
+                fractional = pc.not_equal(values, pc.floor(values))
+                if pc.any(fractional).as_py():
+                    _error(errors, column, "expected whole numbers", fractional)
+                    continue
+        if column in FLAG_COLUMNS:
+            bad = pc.invert(pc.is_in(values, value_set=pa.array([0, 1], values.type)))
+            message = "expected 0 or 1"
+        else:
+            bad = pc.less(values, 0)
+            message = "negative values"
+        if pc.any(bad).as_py():
+            _error(errors, column, message, bad)
+            continue
+        array = values.to_numpy()
+        columns[column] = array.astype(np.int64) if integral else array
+    if errors:
+        raise ColumnarError(errors)
+    return columns
+
+
+def prediction_table(preds, churn_probs):
+    proba = None if len(churn_probs) and churn_probs[0] is None else np.asarray(churn_probs, dtype=np.float32)
+    return pa.table({
+        "prediction": pa.array(np.asarray(preds, dtype=np.int8)),
+        "churn_probability": pa.array(proba) if proba is not None else pa.nulls(len(preds), pa.float32()),
+    })
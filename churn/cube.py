@@ -0,0 +1,241 @@
+"""Per-State aggregates behind the Dash dashboard.
+
+Everything the dashboard draws is reduced to small per-State statistics once
+at start-up: KPI sums, Account length histogram bins, service-call and plan
+counts by churn, per-period sums, fixed-bin charge histograms for the box
+plots and correlation sufficient statistics (n, sums and cross-products).
+``ALL`` holds the totals. New rows are folded in with :meth:`StateCube.add`,
+which only touches the States they belong to; no raw rows are kept, so an add
+costs O(rows added) however much has been folded in before.
+
+The "Usage vs Charges" scatter is served from a fixed-size reservoir sample
+and a 2-D density grid per State, so its payload does not grow with the data.
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+ALL = None
+
+HIST_BINS = 30
+PERIOD_COLUMNS = ["Total day minutes", "Total eve minutes", "Total night minutes", "Total intl minutes"]
+CHARGE_COLUMNS = ["Total day charge", "Total eve charge", "Total night charge", "Total intl charge"]
+CORR_COLUMNS = [
+    "Account length", "Total day minutes", "Total eve minutes",
+    "Total night minutes", "Total intl minutes",
+    "Customer service calls", "Churn",
+]
+# Bins of the per-State charge histograms the box-plot quantiles are read from (even)
+BOX_BINS = 1_024
+SCATTER_X, SCATTER_Y = "Total day minutes", "Total day charge"
+RESERVOIR_SIZE = 5_000
+DENSITY_BINS = 60
+
+
+class Reservoir:
+    """Uniform sample of at most ``size`` rows from a stream (Algorithm R, vectorized per batch)."""
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.seen = 0
+        self.rows = None
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, rows):
+        if self.rows is None:
+            self.rows = np.empty((0, rows.shape[1]), dtype=rows.dtype)
+        fill = max(0, min(self.size - len(self.rows), len(rows)))
+        if fill:
+            self.rows = np.concatenate([self.rows, rows[:fill]])
+        rest = rows[fill:]
+        if len(rest):
+            # Row t (0-based in the stream) replaces slot j ~ U[0, t] when j < size
+            t = self.seen + fill + np.arange(len(rest))
+            slots = self.rng.integers(0, t + 1)
+            keep = slots < self.size
+            self.rows[slots[keep]] = rest[keep]
+        self.seen += len(rows)
+
+
+class Histogram:
+    """Histogram of non-negative values with exact count, sum, min and max: a mergeable quantile sketch.
+
+    ``bins`` equal bins start at 0. When a value lands past the last one,
+    neighbouring bins are merged pairwise and the width doubles, so memory
+    stays fixed. Quantiles are interpolated within a bin, so they are off by
+    at most one bin width.
+    """
+
+    def __init__(self, width, bins=BOX_BINS):
+        self.width = width
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.n = 0
+        self.sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _coarsen(self, width):
+        while self.width < width:
+            half = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts = np.concatenate([half, np.zeros(len(half), dtype=np.int64)])
+            self.width *= 2
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+        while values.max() >= self.width * len(self.counts):
+            self._coarsen(2 * self.width)
+        bins = np.clip((values // self.width).astype(np.intp), 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        self.n += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        self._coarsen(other.width)
+        counts = other.counts
+        width = other.width
+        while width < self.width:
+            half = counts.reshape(-1, 2).sum(axis=1)
+            counts = np.concatenate([half, np.zeros(len(half), dtype=np.int64)])
+            width *= 2
+        self.counts += counts
+        self.n += other.n
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _value(self, ranks):
+        """Estimated ``sorted(values)[ranks]``: spread evenly within their bins."""
+        cumulative = np.cumsum(self.counts)
+        b = np.minimum(np.searchsorted(cumulative, ranks, side="right"), len(self.counts) - 1)
+        within = (ranks - (cumulative[b] - self.counts[b]) + 0.5) / np.maximum(self.counts[b], 1)
+        return np.clip((b + within) * self.width, self.min, self.max)
+
+    def quantile(self, q):
+        """``np.percentile(values, 100 * q)`` (linear), up to the bin width."""
+        rank = q * (self.n - 1)
+        low, high = self._value(np.array([np.floor(rank), np.ceil(rank)]))
+        return float(low + (rank - np.floor(rank)) * (high - low))
+
+    def box(self):
+        """Quantiles and whisker ends as plotly's go.Box computes them (linear quartiles)."""
+        if self.n == 0:
+            return None
+        q1, median, q3 = (self.quantile(q) for q in (0.25, 0.5, 0.75))
+        # The whiskers end at the most extreme values within the limits, read
+        # from the first and last occupied bins within them. Each quartile may
+        # be a bin width off, so a limit may be up to four.
+        low = q1 - 1.5 * (q3 - q1) - 4 * self.width
+        high = q3 + 1.5 * (q3 - q1) + 4 * self.width
+        occupied = np.flatnonzero(self.counts)
+        first = occupied[min(np.searchsorted((occupied + 1) * self.width, low, side="right"), len(occupied) - 1)]
+        last = occupied[max(np.searchsorted(occupied * self.width, high, side="right") - 1, 0)]
+        return {
+            "q1": q1, "median": median, "q3": q3,
+            "lowerfence": float(np.clip(first * self.width, self.min, median)),
+            "upperfence": float(np.clip((last + 1) * self.width, median, self.max)),
+            "mean": self.sum / self.n, "n": self.n,
+        }
+
+
+class GroupStats:
+    def __init__(self, bins, box_widths, density_shape=(DENSITY_BINS, DENSITY_BINS)):
+        self.n = 0
+        self.churned = 0
+        self.service_calls_sum = 0.0
+        self.revenue = 0.0
+        self.hist = np.zeros((2, bins), dtype=np.int64)
+        self.service = Counter()
+        self.intl = Counter()
+        self.vmail = Counter()
+        self.churn_n = np.zeros(2, dtype=np.int64)
+        self.period_sum = np.zeros((2, len(PERIOD_COLUMNS)))
+        self.corr_sum = np.zeros(len(CORR_COLUMNS))
+        self.corr_xx = np.zeros((len(CORR_COLUMNS), len(CORR_COLUMNS)))
+        self.charges = {(col, churn_val): Histogram(box_widths[col])
+                        for col in CHARGE_COLUMNS for churn_val in (0, 1)}
+        self.box = {}
+        self.density = np.zeros((2,) + density_shape, dtype=np.int64)
+        self.reservoir = Reservoir(RESERVOIR_SIZE)
+
+    def add(self, df, bin_index, density_index):
+        churn = df["Churn"].to_numpy().astype(np.intp)
+        self.n += len(df)
+        self.churned += int(churn.sum())
+        self.service_calls_sum += float(df["Customer service calls"].sum())
+        self.revenue += float(df[CHARGE_COLUMNS].to_numpy().sum())
+        np.add.at(self.hist, (churn, bin_index), 1)
+        self.service.update(df.groupby(["Customer service calls", "Churn"]).size().to_dict())
+        self.intl.update(df.groupby(["International plan", "Churn"]).size().to_dict())
+        self.vmail.update(df.groupby(["Voice mail plan", "Churn"]).size().to_dict())
+        self.churn_n += np.bincount(churn, minlength=2)
+        np.add.at(self.period_sum, churn, df[PERIOD_COLUMNS].to_numpy(dtype=float))
+        X = df[CORR_COLUMNS].to_numpy(dtype=float)
+        self.corr_sum += X.sum(axis=0)
+        self.corr_xx += X.T @ X
+        np.add.at(self.density, (churn,) + density_index, 1)
+        self.reservoir.add(df[[SCATTER_X, SCATTER_Y, "Churn"]].to_numpy(dtype=float))
+        for (col, churn_val), histogram in self.charges.items():
+            histogram.add(df[col].to_numpy(dtype=float)[churn == churn_val])
+        self.box = {key: histogram.box() for key, histogram in self.charges.items()}
+
+    def period_means(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.period_sum / self.churn_n[:, None]
+
+    def correlation(self):
+        n = self.n
+        if n < 2:
+            corr = np.full((len(CORR_COLUMNS), len(CORR_COLUMNS)), np.nan)
+            return pd.DataFrame(corr, index=CORR_COLUMNS, columns=CORR_COLUMNS)
+        mean = self.corr_sum / n
+        cov = (self.corr_xx - n * np.outer(mean, mean)) / (n - 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.diag(cov))
+            corr = cov / np.outer(std, std)
+        return pd.DataFrame(corr, index=CORR_COLUMNS, columns=CORR_COLUMNS)
+
+
+def _bin(edges, values):
+    # Values outside the start-up range land in the first/last bin
+    return np.clip(np.searchsorted(edges, np.asarray(values), "right") - 1, 0, len(edges) - 2)
+
+
+class StateCube:
+    def __init__(self, df, hist_bins=HIST_BINS):
+        lengths = df["Account length"]
+        self.hist_edges = np.linspace(lengths.min(), lengths.max(), hist_bins + 1)
+        self.density_edges = (
+            np.linspace(df[SCATTER_X].min(), df[SCATTER_X].max(), DENSITY_BINS + 1),
+            np.linspace(df[SCATTER_Y].min(), df[SCATTER_Y].max(), DENSITY_BINS + 1),
+        )
+        # Start-up charges span the histograms; larger ones later widen the bins
+        self.box_widths = {col: max(float(df[col].max()), 1.0) / BOX_BINS for col in CHARGE_COLUMNS}
+        self.groups = {ALL: GroupStats(hist_bins, self.box_widths)}
+        self.version = 0
+        self.add(df)
+
+    def states(self):
+        return sorted(key for key in self.groups if key is not ALL)
+
+    def stats(self, state=ALL):
+        return self.groups.get(state)
+
+    def add(self, df):
+        """Fold new rows into the aggregates of their States and of ``ALL``."""
+        if df.empty:
+            return
+        bins = len(self.hist_edges) - 1
+        bin_index = _bin(self.hist_edges, df["Account length"])
+        density_index = tuple(_bin(edges, df[col]) for edges, col in zip(self.density_edges, (SCATTER_X, SCATTER_Y)))
+        self.groups[ALL].add(df, bin_index, density_index)
+        positions = df.groupby("State").indices
+        for state, rows in positions.items():
+            part = df.iloc[rows]
+            part_density = tuple(index[rows] for index in density_index)
+            group = self.groups.setdefault(state, GroupStats(bins, self.box_widths))
+            group.add(part, bin_index[rows], part_density)
+        self.version += 1
@@ -0,0 +1,140 @@
+"""Columnar data access for the CSVs in ``data/``.
+
+The first :func:`load` of a CSV converts it, in streaming batches, to an
+uncompressed Arrow IPC (Feather v2) file next to the source with explicit
+dtypes: compact integers and booleans, float64 for minutes and charges so the
+copy holds exactly the values pandas parses from the CSV. Later loads
+memory-map that copy and read only the requested columns. The copy is keyed
+by the source's mtime and size, and, when those change, by its SHA-256, so
+touching a file does not force a reconversion; changing the dtypes does.
+Conversions write to unique temporary files, so concurrent processes can
+convert the same file.
+
+    from churn import data
+    df = data.load("churn_cleaned", columns=["State", "Churn"])
+"""
+import json
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.feather as feather
+
+from churn.registry import file_fingerprint
+
+RAW_TYPES = {
+    "State": pa.string(),
+    "Account length": pa.int16(),
+    "Area code": pa.int16(),
+    "International plan": pa.bool_(),
+    "Voice mail plan": pa.bool_(),
+    "Number vmail messages": pa.int16(),
+    "Total day minutes": pa.float64(),
+    "Total day calls": pa.int16(),
+    "Total day charge": pa.float64(),
+    "Total eve minutes": pa.float64(),
+    "Total eve calls": pa.int16(),
+    "Total eve charge": pa.float64(),
+    "Total night minutes": pa.float64(),
+    "Total night calls": pa.int16(),
+    "Total night charge": pa.float64(),
+    "Total intl minutes": pa.float64(),
+    "Total intl calls": pa.int16(),
+    "Total intl charge": pa.float64(),
+    "Customer service calls": pa.int8(),
+    "Churn": pa.bool_(),
+}
+
+CLEANED_TYPES = {
+    **{name: pa.int16() for name in RAW_TYPES},
+    "State": pa.string(),
+    "International plan": pa.int8(),
+    "Voice mail plan": pa.int8(),
+    "Customer service calls": pa.int8(),
+    "Churn": pa.int8(),
+}
+
+# name -> (CSV path, column types; unlisted columns are inferred from the first block)
+DATASETS = {
+    "churn_cleaned": ("data/processed/churn_cleaned.csv", CLEANED_TYPES),
+    "X_train": ("data/processed/X_train_scaled.csv", {}),
+    "X_test": ("data/processed/X_test_scaled.csv", {}),
+    "y_train": ("data/processed/y_train.csv", {"Churn": pa.int8()}),
+    "y_test": ("data/processed/y_test.csv", {"Churn": pa.int8()}),
+    "raw_train": ("data/raw/churn-bigml-80.csv", RAW_TYPES),
+    "raw_test": ("data/raw/churn-bigml-20.csv", RAW_TYPES),
+}
+
+BLOCK_SIZE = 1 << 20
+
+
+def _resolve(name):
+    if name in DATASETS:
+        return DATASETS[name]
+    for source, types in DATASETS.values():
+        if os.path.normpath(source) == os.path.normpath(name):
+            return source, types
+    return name, {}
+
+
+def _convert(source, target, types):
+    """Stream the CSV into an Arrow IPC file without holding it in memory."""
+    reader = pv.open_csv(
+        source,
+        read_options=pv.ReadOptions(block_size=BLOCK_SIZE),
+        convert_options=pv.ConvertOptions(
+            column_types=types,
+            true_values=["Yes", "True", "true"],
+            false_values=["No", "False", "false"],
+        ),
+    )
+    fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(target)}.", suffix=".tmp", dir=os.path.dirname(target) or ".")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_meta(path, meta):
+    fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def columnar_path(name):
+    """Return the up-to-date Arrow copy of a dataset (or CSV path), converting if needed."""
+    source, types = _resolve(name)
+    target = f"{os.path.splitext(source)[0]}.feather"
+    meta_path = f"{target}.json"
+    stat = os.stat(source)
+    key = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "types": {k: str(v) for k, v in types.items()}}
+
+    meta = {}
+    if os.path.exists(target) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if all(meta.get(k) == v for k, v in key.items()):
+            return target
+
+    sha256 = file_fingerprint(source)
+    if meta.get("sha256") != sha256 or meta.get("types") != key["types"] or not os.path.exists(target):
+        _convert(source, target, types)
+    _write_meta(meta_path, {**key, "sha256": sha256})
+    return target
+
+
+def load_table(name, columns=None):
+    """Memory-mapped pyarrow Table of a dataset name (see ``DATASETS``) or CSV path."""
+    return feather.read_table(columnar_path(name), columns=columns, memory_map=True)
+
+
+def load(name, columns=None):
+    """DataFrame of a dataset name (see ``DATASETS``) or CSV path, reading only ``columns``."""
+    return load_table(name, columns).to_pandas(split_blocks=True)
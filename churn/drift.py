@@ -0,0 +1,272 @@
+"""Streaming input-drift monitor over the model input matrix.
+
+The baseline is built once from ``data/processed/X_train_scaled.csv`` (the
+same 24 columns the models see) and saved as JSON:
+
+* numeric features get ``bins`` quantile bins; the bin edges are the
+  training quantiles, so every bin holds about the same share of training
+  rows. Features with at most ``bins`` distinct training values (the plan
+  flags, service calls) get one bin per value, split at the midpoints, so
+  values between them still land in a bin;
+* State and Tenure category get a count table over their codes, plus one
+  slot for codes never seen in training (unknown states).
+
+:class:`DriftMonitor` keeps one fixed-size count array per time bucket in a
+ring of ``buckets`` buckets of ``bucket_seconds`` each, plus lifetime
+totals, so memory does not grow with traffic. ``observe(X)`` only puts the
+matrix on a bounded queue; a background thread bins whatever has queued up
+in one pass and, every
+``interval`` seconds, recomputes PSI for every feature, and the binned
+Kolmogorov-Smirnov distance for continuous ones, over the sliding window and
+over the lifetime counts. When the queue is full the batch is dropped and
+counted.
+
+PSI below 0.1 is reported as ``stable``, up to 0.25 as ``moderate`` and
+above that as ``significant``, the usual rule of thumb.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from churn import data
+from churn.registry import file_fingerprint
+
+CATEGORICAL = ("State", "Tenure category")
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Floor for empty bins so PSI stays finite
+EPSILON = 1e-4
+
+
+class DriftBaseline:
+    """Per-feature binning and the training share of every bin."""
+
+    def __init__(self, features, rows, source=None):
+        self.features = features
+        self.rows = rows
+        self.source = source
+        self.sizes = np.array([len(f["expected"]) for f in self.features])
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes)[:-1]])
+        self.expected = [np.asarray(f["expected"]) for f in self.features]
+        self._edges = [np.asarray(f.get("edges", []), dtype=float) for f in self.features]
+        self._values = [np.asarray(f.get("values", []), dtype=float) for f in self.features]
+
+    @property
+    def names(self):
+        return [f["name"] for f in self.features]
+
+    @property
+    def n_bins(self):
+        return int(self.sizes.sum())
+
+    @classmethod
+    def build(cls, X, bins=20, source=None):
+        """Baseline from a training DataFrame with the preprocessor's output columns."""
+        features = []
+        for name in X.columns:
+            column = X[name].to_numpy(dtype=float)
+            values = np.unique(column)
+            if name in CATEGORICAL:
+                feature = {"name": name, "kind": "categorical", "values": values.tolist()}
+            elif len(values) <= bins:
+                feature = {"name": name, "kind": "continuous", "edges": ((values[1:] + values[:-1]) / 2).tolist()}
+            else:
+                edges = np.unique(np.quantile(column, np.arange(1, bins) / bins))
+                feature = {"name": name, "kind": "continuous", "edges": edges.tolist()}
+            features.append(feature)
+        # Bin the training rows with the same code the monitor uses
+        sizes = [len(f["values"]) + 1 if f["kind"] == "categorical" else len(f["edges"]) + 1 for f in features]
+        baseline = cls([{**f, "expected": [0.0] * size} for f, size in zip(features, sizes)], len(X), source)
+        counts = baseline.count(X.to_numpy(dtype=float))
+        for feature, offset, size in zip(features, baseline.offsets, sizes):
+            feature["expected"] = (counts[offset:offset + size] / len(X)).tolist()
+        return cls(features, len(X), source)
+
+    def bin(self, X):
+        """Flat bin index of every cell of ``X`` (rows x features)."""
+        X = np.asarray(X, dtype=float)
+        index = np.empty(X.shape, dtype=np.intp)
+        for j, feature in enumerate(self.features):
+            if feature["kind"] == "continuous":
+                index[:, j] = np.searchsorted(self._edges[j], X[:, j], side="right")
+            else:
+                values = self._values[j]
+                pos = np.searchsorted(values, X[:, j]).clip(max=len(values) - 1)
+                index[:, j] = np.where(values[pos] == X[:, j], pos, len(values))
+        return index + self.offsets
+
+    def count(self, X):
+        return np.bincount(self.bin(X).ravel(), minlength=self.n_bins)
+
+    def compare(self, counts, min_rows=500):
+        """PSI (and KS for continuous features) of ``counts`` against the baseline.
+
+        Below ``min_rows`` rows no score is given: with few rows the 52 State
+        slots alone read as drift.
+        """
+        rows = int(counts[: self.sizes[0]].sum())
+        result = {}
+        for feature, expected, offset, size in zip(self.features, self.expected, self.offsets, self.sizes):
+            entry = {"kind": feature["kind"]}
+            if rows >= min_rows:
+                actual = counts[offset:offset + size] / rows
+                p, q = np.maximum(actual, EPSILON), np.maximum(expected, EPSILON)
+                psi = float(np.sum((p - q) * np.log(p / q)))
+                entry["psi"] = round(psi, 6)
+                if feature["kind"] == "continuous":
+                    entry["ks"] = round(float(np.abs(np.cumsum(actual) - np.cumsum(expected)).max()), 6)
+                else:
+                    entry["unseen"] = round(float(actual[-1]), 6)
+                entry["status"] = ("significant" if psi > PSI_SIGNIFICANT
+                                   else "moderate" if psi > PSI_MODERATE else "stable")
+            else:
+                entry["status"] = "insufficient data"
+            result[feature["name"]] = entry
+        return rows, result
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"rows": self.rows, "source": self.source, "features": self.features}, f)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            saved = json.load(f)
+        return cls(saved["features"], saved["rows"], saved.get("source"))
+
+
+def load_baseline(path="models/drift_baseline.json", source="X_train", bins=20):
+    """Saved baseline, rebuilt when the training matrix has changed since it was saved.
+
+    Without the training data (a deployment with only ``models/``) the saved
+    baseline is used as is.
+    """
+    source_path = data.DATASETS[source][0]
+    fingerprint = file_fingerprint(source_path) if os.path.exists(source_path) else None
+    if os.path.exists(path):
+        baseline = DriftBaseline.load(path)
+        if fingerprint is None or baseline.source == fingerprint:
+            return baseline
+    if fingerprint is None:
+        raise FileNotFoundError(f"Neither {path} nor {source_path} exists")
+    baseline = DriftBaseline.build(data.load(source), bins, fingerprint)
+    baseline.save(path)
+    return baseline
+
+
+class DriftMonitor:
+    """Bin every observed model input row off the request path and report drift periodically."""
+
+    def __init__(self, baseline_path="models/drift_baseline.json", source="X_train", bins=20, buckets=12,
+                 bucket_seconds=300.0, interval=10.0, max_pending=1024, min_rows=500):
+        self.baseline_path = baseline_path
+        self.source = source
+        self.bins = bins
+        self.bucket_seconds = bucket_seconds
+        self.interval = interval
+        self.min_rows = min_rows
+        self.baseline = load_baseline(baseline_path, source, bins)
+        self.n_buckets = buckets
+        self._reset()
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._report = None
+        self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+        self._thread.start()
+
+    def _reset(self):
+        self.counts = np.zeros((self.n_buckets, self.baseline.n_bins), dtype=np.int64)
+        self.epochs = np.full(self.n_buckets, -1, dtype=np.int64)
+        self.totals = np.zeros(self.baseline.n_bins, dtype=np.int64)
+        self.rows_seen = 0
+        self.started = time.time()
+
+    def observe(self, X):
+        """Queue a model input matrix; never blocks."""
+        try:
+            self._queue.put_nowait(X)
+        except queue.Full:
+            self.dropped += 1
+
+    def _update(self, X):
+        counts = self.baseline.count(X)
+        epoch = int(time.time() // self.bucket_seconds)
+        slot = epoch % self.n_buckets
+        with self._lock:
+            if self.epochs[slot] != epoch:
+                self.counts[slot] = 0
+                self.epochs[slot] = epoch
+            self.counts[slot] += counts
+            self.totals += counts
+            self.rows_seen += len(X)
+
+    def _refresh_baseline(self):
+        # Picks up a retrained scaler (retrain.py rewrites X_train_scaled.csv)
+        source_path = data.DATASETS[self.source][0]
+        if os.path.exists(source_path) and file_fingerprint(source_path) != self.baseline.source:
+            baseline = load_baseline(self.baseline_path, self.source, self.bins)
+            with self._lock:
+                self.baseline = baseline
+                self._reset()
+
+    def _run(self):
+        next_report = time.monotonic() + self.interval
+        while True:
+            try:
+                batch = [self._queue.get(timeout=max(0.0, next_report - time.monotonic()))]
+            except queue.Empty:
+                batch = []
+            while batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._update(np.concatenate([np.asarray(X, dtype=float) for X in batch]))
+                except Exception:
+                    self.dropped += len(batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            if time.monotonic() >= next_report:
+                self._refresh_baseline()
+                self._report = self.compute()
+                next_report = time.monotonic() + self.interval
+
+    def compute(self):
+        epoch = int(time.time() // self.bucket_seconds)
+        with self._lock:
+            live = self.epochs > epoch - self.n_buckets
+            window = self.counts[live].sum(axis=0)
+            totals = self.totals.copy()
+            rows_seen = self.rows_seen
+        window_rows, window_features = self.baseline.compare(window, self.min_rows)
+        _, total_features = self.baseline.compare(totals, self.min_rows)
+        return {
+            "computed_at": time.time(),
+            "baseline_rows": self.baseline.rows,
+            "rows_seen": rows_seen,
+            "dropped": self.dropped,
+            "window": {"seconds": self.n_buckets * self.bucket_seconds, "rows": window_rows,
+                       "features": window_features},
+            "total": {"seconds": time.time() - self.started, "rows": rows_seen, "features": total_features},
+        }
+
+    def report(self):
+        """Latest periodic report (computed now if none is ready yet)."""
+        return self._report if self._report is not None else self.compute()
+
+    def flush(self, timeout=5.0):
+        """Wait until queued matrices are binned; returns a fresh report."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return self.compute()
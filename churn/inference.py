@@ -0,0 +1,227 @@
+"""Model inference helpers.
+
+:class:`InferenceEngine` scores raw customer columns end to end. For the
+XGBoost ``best.joblib`` it can optionally compile the preprocessor and the
+tree ensemble into flat NumPy arrays (:class:`CompiledModel`), so scoring a
+single customer needs no DataFrame, sklearn or DMatrix work.
+"""
+import json
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+
+from churn.features import build_pipeline, derive_columns, derive_features
+from churn.metrics import NULL_CLOCK, StageClock
+
+# Above this many rows the compiled preprocessor feeds XGBoost's own predictor,
+# which beats the CompiledTrees walk from ~48 rows (python -m benchmarks.suite).
+COMPILED_MAX_ROWS = 48
+
+
+def predict_with_proba(model, X):
+    """Return ``(labels, churn_probabilities)`` from a single pass over the model.
+
+    Labels are read off the probabilities the same way ``predict`` does, so the
+    model is only evaluated once. Models without ``predict_proba`` return
+    ``None`` probabilities.
+    """
+    if hasattr(model, "predict_proba"):
+        proba = model.predict_proba(X)
+        return model.classes_[proba.argmax(axis=1)], proba[:, 1]
+    labels = np.asarray(model.predict(X))
+    return labels, np.full(len(labels), None, dtype=object)
+
+
+def _is_binary_xgboost(model):
+    return (
+        hasattr(model, "get_booster")
+        and len(getattr(model, "classes_", ())) == 2
+        and model.get_params().get("objective") in (None, "binary:logistic")
+    )
+
+
+class CompiledPreprocessor:
+    """Array-backed copy of the fitted ColumnTransformer.
+
+    Supports the OrdinalEncoder / StandardScaler layout produced by notebook 02
+    and raises ``ValueError`` for anything else.
+    """
+
+    def __init__(self, preprocessor):
+        self.steps = []
+        for _, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop":
+                continue
+            if isinstance(transformer, OrdinalEncoder):
+                for column, categories in zip(columns, transformer.categories_):
+                    codes = {category: float(code) for code, category in enumerate(categories)}
+                    self.steps.append(("ordinal", column, codes, float(transformer.unknown_value)))
+            elif isinstance(transformer, StandardScaler):
+                mean = transformer.mean_ if transformer.with_mean else np.zeros(len(columns))
+                scale = transformer.scale_ if transformer.with_std else np.ones(len(columns))
+                self.steps.append(("scale", list(columns), mean, scale))
+            else:
+                raise ValueError(f"Cannot compile transformer {type(transformer).__name__}")
+        self.n_features = sum(1 if step[0] == "ordinal" else len(step[1]) for step in self.steps)
+
+    def transform(self, columns):
+        n = len(columns["State"])
+        X = np.empty((n, self.n_features))
+        pos = 0
+        for kind, cols, a, b in self.steps:
+            if kind == "ordinal":
+                X[:, pos] = [a.get(value, b) for value in columns[cols]]
+                pos += 1
+            else:
+                block = np.column_stack([columns[c] for c in cols]).astype(float)
+                X[:, pos:pos + len(cols)] = (block - a) / b
+                pos += len(cols)
+        return X
+
+
+class CompiledTrees:
+    """Flat, array-backed evaluator for a binary:logistic XGBoost booster.
+
+    All trees are concatenated into one node table. Leaves point to
+    themselves, so every row walks ``max_depth`` levels across all trees at
+    once with NumPy gathers.
+    """
+
+    def __init__(self, booster):
+        learner = json.loads(booster.save_raw("json"))["learner"]
+        trees = learner["gradient_booster"]["model"]["trees"]
+        base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+
+        feature, threshold, left, right, default_left, value, roots = [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            lc = np.asarray(tree["left_children"])
+            rc = np.asarray(tree["right_children"])
+            is_leaf = lc == -1
+            nodes = np.arange(len(lc)) + offset
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree["split_indices"]))
+            threshold.append(np.where(is_leaf, np.inf, tree["split_conditions"]))
+            left.append(np.where(is_leaf, nodes, lc + offset))
+            right.append(np.where(is_leaf, nodes, rc + offset))
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            value.append(np.where(is_leaf, tree["split_conditions"], 0.0))
+            offset += len(lc)
+
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold).astype(np.float32)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.default_left = np.concatenate(default_left)
+        self.value = np.concatenate(value).astype(np.float32)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = self._max_depth()
+        self.base_margin = np.log(base_score / (1 - base_score))
+
+    def _max_depth(self):
+        depth = 0
+        node = self.roots.copy()
+        while True:
+            nxt = np.concatenate([self.left[node], self.right[node]])
+            if (nxt == np.concatenate([node, node])).all():
+                return depth
+            node = np.unique(nxt)
+            depth += 1
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        margin = self.value[node].sum(axis=1, dtype=np.float32) + self.base_margin
+        return 1.0 / (1.0 + np.exp(-margin))
+
+
+class CompiledModel:
+    def __init__(self, model, preprocessor):
+        self.preprocessor = CompiledPreprocessor(preprocessor)
+        self.trees = CompiledTrees(model.get_booster())
+        self.classes = model.classes_
+
+    def predict_columns(self, columns):
+        proba = self.trees.predict_proba(self.preprocessor.transform(columns))
+        return self.classes[(proba > 0.5).astype(int)], proba
+
+
+class InferenceEngine:
+    """Load the model and preprocessor once and score raw customer columns.
+
+    ``predict`` takes anything :func:`churn.features.derive_columns` accepts and
+    returns ``(labels, churn_probabilities)`` from one pass over the model.
+    With ``compiled=True`` a binary XGBoost model is scored by
+    :class:`CompiledModel`; other models fall back to the sklearn pipeline.
+    ``observe(stage, seconds)``, if given, receives the time spent in the
+    ``features``, ``transform`` and ``model`` stages of every call.
+    ``on_matrix(X)``, if given, receives every model input matrix (the drift
+    monitor in churn/drift.py); it must not block.
+    """
+
+    def __init__(self, model, preprocessor, compiled=False, observe=None, on_matrix=None):
+        self.model = model
+        self.observe = observe
+        self.on_matrix = on_matrix
+        self.preprocessor = preprocessor
+        self.pipeline = build_pipeline(preprocessor)
+        self.compiled = None
+        if compiled and _is_binary_xgboost(model):
+            try:
+                self.compiled = CompiledModel(model, preprocessor)
+            except ValueError:
+                self.compiled = None
+        self._booster = model.get_booster() if _is_binary_xgboost(model) else None
+
+    @classmethod
+    def load(cls, model_path="models/best.joblib", preprocessor_path="models/preprocessor.joblib",
+             compiled=False, observe=None, on_matrix=None):
+        return cls(joblib.load(model_path), joblib.load(preprocessor_path), compiled=compiled, observe=observe,
+                   on_matrix=on_matrix)
+
+    def transform(self, data):
+        return self.pipeline.transform(data)
+
+    def matrix(self, data, clock=NULL_CLOCK):
+        """Model input matrix for raw customer columns (feature engineering + preprocessor)."""
+        if self.compiled is not None:
+            columns = derive_columns(data)
+            clock.lap("features")
+            X = self.compiled.preprocessor.transform(columns)
+        else:
+            features = derive_features(data)
+            clock.lap("features")
+            X = self.preprocessor.transform(features)
+        clock.lap("transform")
+        if self.on_matrix is not None:
+            self.on_matrix(X)
+        return X
+
+    def predict_matrix(self, X, clock=NULL_CLOCK):
+        """Score a matrix from :meth:`matrix`; returns ``(labels, churn_probabilities)``."""
+        if self._booster is None:
+            result = predict_with_proba(self.model, X)
+            clock.lap("model")
+            return result
+        if self.compiled is not None and len(X) <= COMPILED_MAX_ROWS:
+            proba = self.compiled.trees.predict_proba(X)
+        else:
+            proba = self._booster.inplace_predict(np.asarray(X, dtype=np.float32))
+        clock.lap("model")
+        return self.model.classes_[(proba > 0.5).astype(int)], proba
+
+    def predict(self, data):
+        clock = StageClock(self.observe) if self.observe is not None else NULL_CLOCK
+        return self.predict_matrix(self.matrix(data, clock), clock)
+
+    def predict_record(self, record):
+        """Score one customer given as a dict of raw column values."""
+        labels, proba = self.predict({name: np.asarray([value]) for name, value in record.items()})
+        return labels[0], proba[0]
+
@@ -0,0 +1,137 @@
+"""Indexed nearest-neighbour scoring for ``models/KNN.joblib``.
+
+:class:`KNNIndex` searches the training matrix of a fitted
+``KNeighborsClassifier`` with a scipy ``cKDTree`` built on load (a few ms for
+our training set) instead of brute force.
+Searches are exact by default. ``eps > 0`` turns them approximate: a returned
+neighbour may be up to ``1 + eps`` times farther than the true k-th one.
+``calibrate`` measures recall@k for a grid of ``eps`` values on held-out
+queries and stores the curve with the index, so callers can ask for a target
+recall (``search(..., recall=0.99)``) and get the largest ``eps`` that meets it.
+
+Indexes are saved as a directory of ``.npy`` files plus ``index.json``
+(``models/index/KNN/`` by default), with the matrix stored as float32. The
+registry does not pick them up because they are not ``*.joblib`` files. On
+load the tree copies the matrix into float64, and that copy is the only one
+kept in memory. ``index.json`` records the fingerprint of the artifact the
+index was built from; :meth:`churn.registry.ModelRegistry.scorer` serves the
+index in place of that artifact (shadow scoring, MLFlow_Deployment.py) and
+ignores an index built from an older one.
+:class:`IndexedKNN` wraps an index with the ``predict``/``predict_proba``
+interface of the estimator it replaces.
+"""
+import json
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+METRICS = {"manhattan": 1, "cityblock": 1, "l1": 1, "euclidean": 2, "l2": 2}
+EPS_GRID = [0.0, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0]
+
+
+def _metric_p(model):
+    metric = model.metric
+    if metric == "minkowski":
+        p = model.effective_metric_params_.get("p", model.p)
+        if p in (1, 2):
+            return p
+    elif metric in METRICS:
+        return METRICS[metric]
+    raise ValueError(f"Unsupported KNN metric for indexing: {metric!r}")
+
+
+class KNNIndex:
+    def __init__(self, X, y, classes, n_neighbors, p, calibration=None):
+        self.y = y
+        self.classes = classes
+        self.n_neighbors = n_neighbors
+        self.p = p
+        self.calibration = calibration or {}
+        self.tree = cKDTree(X)
+
+    @property
+    def X(self):
+        """The training matrix, as the tree's float64 copy."""
+        return self.tree.data
+
+    @classmethod
+    def from_model(cls, model, calibration_queries=None):
+        """Build an index from a fitted single-output, uniform-weight ``KNeighborsClassifier``."""
+        if model.weights != "uniform" or model._y.ndim != 1:
+            raise ValueError("Only single-output, uniform-weight KNN models can be indexed")
+        # _y holds class positions (indices into classes_)
+        index = cls(np.ascontiguousarray(model._fit_X, dtype=np.float32), np.asarray(model._y, dtype=np.int32),
+                    np.asarray(model.classes_), model.n_neighbors, _metric_p(model))
+        if calibration_queries is not None:
+            index.calibrate(calibration_queries)
+        return index
+
+    def calibrate(self, queries, eps_grid=EPS_GRID):
+        """Measure recall@k against exact search for each ``eps`` in ``eps_grid``."""
+        truth = self.search(queries, eps=0.0)
+        recalls = []
+        for eps in eps_grid:
+            found = self.search(queries, eps=eps)
+            hits = sum(len(np.intersect1d(a, b)) for a, b in zip(found, truth))
+            recalls.append(hits / truth.size)
+        self.calibration = {"queries": len(queries), "eps": list(eps_grid), "recall": recalls}
+        return dict(zip(eps_grid, recalls))
+
+    def eps_for_recall(self, recall):
+        """Largest calibrated ``eps`` whose recall is at least ``recall`` (0, i.e. exact, if uncalibrated)."""
+        best = 0.0
+        for eps, value in zip(self.calibration.get("eps", []), self.calibration.get("recall", [])):
+            if value >= recall:
+                best = max(best, eps)
+        return best
+
+    def search(self, queries, k=None, recall=None, eps=None):
+        """Indices of the ``k`` nearest training rows for each query row, shape (n, k)."""
+        queries = np.asarray(queries, dtype=np.float32)
+        k = k or self.n_neighbors
+        if eps is None:
+            eps = self.eps_for_recall(recall) if recall is not None else 0.0
+        _, idx = self.tree.query(queries, k=k, p=self.p, eps=eps)
+        return idx.reshape(len(queries), k)
+
+    def save(self, path, model_fingerprint=None):
+        """Write the index to ``path``; ``model_fingerprint`` is that of the artifact it was built from."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "X.npy"), self.X.astype(np.float32))
+        for name in ("y", "classes"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        meta = {"n_neighbors": self.n_neighbors, "p": self.p, "calibration": self.calibration,
+                "model_fingerprint": model_fingerprint}
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path="models/index/KNN"):
+        with open(os.path.join(path, "index.json")) as f:
+            meta = json.load(f)
+        X, y, classes = (
+            np.load(os.path.join(path, f"{name}.npy"), allow_pickle=False) for name in ("X", "y", "classes")
+        )
+        return cls(X, y, classes, meta["n_neighbors"], meta["p"], meta["calibration"])
+
+
+class IndexedKNN:
+    """Drop-in ``predict``/``predict_proba`` for a uniform-weight KNN classifier, backed by a :class:`KNNIndex`."""
+
+    def __init__(self, index, recall=None):
+        self.index = index
+        self.recall = recall
+        self.classes_ = index.classes
+
+    @classmethod
+    def load(cls, path="models/index/KNN", recall=None):
+        return cls(KNNIndex.load(path), recall)
+
+    def predict_proba(self, X):
+        labels = np.asarray(self.index.y)[self.index.search(X, recall=self.recall)]
+        counts = np.stack([(labels == c).sum(axis=1) for c in range(len(self.classes_))], axis=1)
+        return counts / labels.shape[1]
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
@@ -0,0 +1,225 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+:class:`MetricsRegistry` holds labelled counters, gauges and histograms and
+renders them, together with any registered collector callbacks, in the
+Prometheus text format. :class:`RequestMetrics` is a pure-ASGI middleware
+counting requests, in-flight requests and latency per endpoint.
+"""
+import bisect
+import contextvars
+import threading
+import time
+
+LATENCY_BUCKETS_S = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+
+# perf_counter() when the current request entered the middleware
+request_start = contextvars.ContextVar("request_start", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style) with a running sum."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            count, total = self.count, self.sum
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + [float("inf")], counts):
+            running += n
+            cumulative["+Inf" if bound == float("inf") else f"{bound:g}"] = running
+        return {"count": count, "sum": total, "mean": total / count if count else 0.0, "buckets": cumulative}
+
+
+class Value:
+    """A counter or gauge value."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+
+class Family:
+    """A named metric with one child (Value or Histogram) per label set."""
+
+    def __init__(self, name, kind, help, factory):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.factory = factory
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted(labels.items()))
+        child = self.children.get(key)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    def samples(self):
+        return [(dict(key), child) for key, child in list(self.children.items())]
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels.items()) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_family(name, kind, help, samples):
+    """Prometheus text lines for ``samples``: a list of (labels, Value | Histogram | number)."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, sample in samples:
+        if isinstance(sample, Histogram):
+            snap = sample.snapshot()
+            for le, count in snap["buckets"].items():
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {snap['sum']:.9g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {snap['count']}")
+        else:
+            value = sample.value if isinstance(sample, Value) else sample
+            lines.append(f"{name}{_format_labels(labels)} {value:.9g}")
+    return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families = []
+        self.collectors = []
+
+    def _add(self, name, kind, help, factory):
+        for family in self.families:
+            if family.name == name:
+                return family
+        family = Family(name, kind, help, factory)
+        self.families.append(family)
+        return family
+
+    def counter(self, name, help):
+        return self._add(name, "counter", help, Value)
+
+    def gauge(self, name, help):
+        return self._add(name, "gauge", help, Value)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS_S):
+        return self._add(name, "histogram", help, lambda: Histogram(buckets))
+
+    def collect(self, func):
+        """Register ``func() -> [(name, kind, help, samples), ...]`` to run on every render."""
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            lines += render_family(family.name, family.kind, family.help, family.samples())
+        for func in self.collectors:
+            for name, kind, help, samples in func():
+                lines += render_family(name, kind, help, samples)
+        return "\n".join(lines) + "\n"
+
+
+class StageClock:
+    """Times consecutive stages: each ``lap(stage)`` observes the time since the previous lap."""
+
+    __slots__ = ("observe", "last")
+
+    def __init__(self, observe, start=None):
+        self.observe = observe
+        self.last = time.perf_counter() if start is None else start
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.observe(stage, now - self.last)
+        self.last = now
+
+    def reset(self):
+        """Start the next stage now, leaving the time since the last lap unrecorded."""
+        self.last = time.perf_counter()
+
+
+class _NullClock:
+    __slots__ = ()
+
+    def lap(self, stage):
+        pass
+
+    def reset(self):
+        pass
+
+
+NULL_CLOCK = _NullClock()
+
+
+class RequestMetrics:
+    """ASGI middleware: request count, in-flight gauge and latency per endpoint.
+
+    The endpoint label is the handler's function name (bounded cardinality);
+    unmatched paths are reported as ``not_found``. ``on_start(scope, start)``
+    is called before and ``on_finish(scope, start, end, status)`` after every
+    request, in the request's context, e.g. for slow-request profiling.
+    """
+
+    def __init__(self, app, metrics, on_start=None, on_finish=None):
+        self.app = app
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.requests = metrics.counter("churn_http_requests_total", "HTTP requests by endpoint, method and status.")
+        self.in_flight = metrics.gauge("churn_http_requests_in_flight", "HTTP requests currently being served.").labels()
+        self.latency = metrics.histogram("churn_http_request_duration_seconds", "HTTP request latency by endpoint.")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        token = request_start.set(start)
+        status = 500
+        self.in_flight.inc()
+        if self.on_start is not None:
+            self.on_start(scope, start)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end = time.perf_counter()
+            self.in_flight.dec()
+            request_start.reset(token)
+            endpoint = getattr(scope.get("endpoint"), "__name__", "not_found")
+            self.requests.labels(endpoint=endpoint, method=scope["method"], status=status).inc()
+            self.latency.labels(endpoint=endpoint).observe(end - start)
+            if self.on_finish is not None:
+                self.on_finish(scope, start, end, status)
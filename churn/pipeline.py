@@ -0,0 +1,409 @@
+"""Cached data preparation: the raw CSVs to the processed train/test splits.
+
+Notebook 02 (and the cleaning that produced churn_cleaned.csv) as a DAG of
+stages, each reading its inputs from files and writing its outputs to files:
+
+    clean     data/raw/churn-bigml-{80,20}.csv -> churn_cleaned.csv
+    features  churn_cleaned.csv -> the cleaned and derived feature columns
+    rfe       features -> rfe_ranking.csv, feature_importance.csv, selected columns
+    split     features -> stratified train/test row numbers
+    encode    features, rfe, split -> X_{train,test}_scaled.csv, y_{train,test}.csv,
+              preprocessor.joblib
+
+A stage's outputs are stored under ``data/cache/pipeline/<stage>/<key>``,
+where the key is the SHA-256 of the contents of its inputs, the source of the
+stage function and of the modules it lists, the module-level constants the
+function reads (``DERIVED_COLUMNS``, ``TARGET``), the versions of the
+libraries it uses and its parameters. A stage only runs when no output exists for its key.
+Since inputs are hashed by content, a rerun that writes the same bytes (a
+cleaning tweak that drops the same rows, say) leaves the later stages cached.
+
+Stages whose inputs are ready run side by side in worker processes; rfe and
+split both only need the features. :meth:`Pipeline.publish` finally copies
+the outputs to data/processed/, results/ and models/, skipping files whose
+contents are unchanged so the Feather copies and loaded models stay valid.
+The models in models/ are not retrained, so a preprocessor whose columns or
+fitted parameters differ from the deployed one is written to
+models/candidate/ instead of replacing it under the running API (an
+equivalent one is not copied at all), and the
+scaled splits and RFE reports fitted with it go to a ``candidate/``
+directory next to theirs. While the preprocessor still matches, the RFE
+reports are left as they are: lbfgs stops at ``max_iter`` on the unscaled
+columns, so the ranks of the dropped columns and the coefficients vary with
+the numerical libraries even when the selection does not.
+"""
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from importlib import metadata
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.feature_selection import RFE
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+
+from churn import data, features
+from churn.features import clean_raw, derive_columns
+from churn.registry import file_fingerprint
+
+CACHE_DIR = "data/cache/pipeline"
+TARGET = "Churn"
+
+# Raw columns whose IQR fences define the outliers dropped from churn_cleaned.csv
+OUTLIER_COLUMNS = (
+    "Account length",
+    "Total day minutes",
+    "Total day charge",
+    "Total eve minutes",
+    "Total eve calls",
+    "Total eve charge",
+    "Total night minutes",
+    "Total night calls",
+    "Total night charge",
+)
+
+# Columns added to churn_cleaned.csv by notebook 02, in its order
+DERIVED_COLUMNS = [
+    "Total national minutes",
+    "Total national calls",
+    "Total national charge",
+    "Avg minutes per call",
+    "Avg int minutes per call",
+    "Cost per minute",
+    "Cost per minute intl",
+    "High service calls",
+    "Tenure category",
+    "Has All Plans",
+    "zero_vmail_messages",
+]
+
+
+def clean_data(inputs, output_dir, columns=OUTLIER_COLUMNS, iqr_factor=1.5):
+    """Both raw files in churn_cleaned.csv format, without the outliers.
+
+    A customer is an outlier when one of ``columns`` lies more than
+    ``iqr_factor`` interquartile ranges outside the quartiles of the raw values.
+    """
+    raw = pd.concat([pd.read_csv(inputs["raw_train"]), pd.read_csv(inputs["raw_test"])], ignore_index=True)
+    outlier = np.zeros(len(raw), dtype=bool)
+    for column in columns:
+        q1, q3 = raw[column].quantile([0.25, 0.75])
+        fence = iqr_factor * (q3 - q1)
+        outlier |= ((raw[column] < q1 - fence) | (raw[column] > q3 + fence)).to_numpy()
+    clean_raw(raw[~outlier]).to_csv(os.path.join(output_dir, "churn_cleaned.csv"), index=False)
+
+
+def add_features(inputs, output_dir):
+    """The cleaned columns plus the derived ones; Area code and Tenure category are categorical."""
+    frame = pd.read_csv(inputs["cleaned"])
+    derived = derive_columns(frame)
+    for column in DERIVED_COLUMNS:
+        frame[column] = derived[column]
+    frame["Tenure category"] = pd.Categorical(frame["Tenure category"], categories=["Low", "Medium", "High"])
+    frame["Area code"] = frame["Area code"].astype("category")
+    frame.to_feather(os.path.join(output_dir, "features.feather"))
+
+
+def select_features(inputs, output_dir, n_features=22, max_iter=1000):
+    """Recursive feature elimination over the numeric columns with a balanced logistic regression."""
+    frame = pd.read_feather(inputs["features"])
+    X = frame.select_dtypes(include=[np.number]).drop(columns=[TARGET])
+    estimator = LogisticRegression(max_iter=max_iter, class_weight="balanced")
+    with warnings.catch_warnings():
+        # lbfgs stops at max_iter on the unscaled columns, as it did in notebook 02
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        selector = RFE(estimator, n_features_to_select=min(n_features, X.shape[1])).fit(X, frame[TARGET])
+    selected = X.columns[selector.support_].tolist()
+    importance = pd.Series(abs(selector.estimator_.coef_[0]), index=selected).sort_values(ascending=False)
+    importance.to_csv(os.path.join(output_dir, "feature_importance.csv"))
+    pd.Series(selector.ranking_, index=X.columns).to_csv(os.path.join(output_dir, "rfe_ranking.csv"))  # 1 = selected
+    with open(os.path.join(output_dir, "selected.json"), "w") as f:
+        json.dump(selected, f)
+
+
+def split_rows(inputs, output_dir, test_size=0.2, random_state=42):
+    """Stratified train/test row numbers; they only depend on the labels."""
+    y = pd.read_feather(inputs["features"], columns=[TARGET])[TARGET]
+    train, test = train_test_split(np.arange(len(y)), test_size=test_size, stratify=y, random_state=random_state)
+    np.save(os.path.join(output_dir, "train.npy"), train)
+    np.save(os.path.join(output_dir, "test.npy"), test)
+
+
+def encode_splits(inputs, output_dir):
+    """Fit the preprocessor on the training rows and write both scaled splits."""
+    frame = pd.read_feather(inputs["features"])
+    with open(inputs["selected"]) as f:
+        selected = json.load(f)
+    X = frame[["State", "Tenure category", *selected]]
+    train, test = np.load(inputs["train"]), np.load(inputs["test"])
+    encoder = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1)
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ("state", encoder, ["State"]),
+            ("tenure category", encoder, ["Tenure category"]),
+            ("num", StandardScaler(), selected),
+        ],
+        remainder="drop",
+        verbose_feature_names_out=False,
+    )
+    X_train = preprocessor.fit_transform(X.iloc[train])
+    X_test = preprocessor.transform(X.iloc[test])
+    names = preprocessor.get_feature_names_out()
+    pd.DataFrame(X_train, columns=names).to_csv(os.path.join(output_dir, "X_train_scaled.csv"), index=False)
+    pd.DataFrame(X_test, columns=names).to_csv(os.path.join(output_dir, "X_test_scaled.csv"), index=False)
+    frame[TARGET].iloc[train].to_csv(os.path.join(output_dir, "y_train.csv"), index=False)
+    frame[TARGET].iloc[test].to_csv(os.path.join(output_dir, "y_test.csv"), index=False)
+    joblib.dump(preprocessor, os.path.join(output_dir, "preprocessor.joblib"))
+
+
+class Stage:
+    """One step of the DAG: ``func(inputs, output_dir, **params)`` writes ``outputs`` into ``output_dir``.
+
+    ``inputs`` maps the names ``func`` reads to a file path or to a
+    ``(stage, output)`` pair of an earlier stage. ``code`` lists modules whose
+    source is part of the stage's code version besides ``func`` and the plain
+    data globals it reads; ``packages`` the libraries whose versions are.
+    """
+
+    def __init__(self, name, func, inputs, outputs, params=None, code=(), packages=()):
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params or {}
+        self.code = code
+        self.packages = packages
+
+    @property
+    def depends(self):
+        return {source[0] for source in self.inputs.values() if isinstance(source, tuple)}
+
+    def code_version(self):
+        digest = hashlib.sha256()
+        for obj in (self.func, *self.code):
+            digest.update(inspect.getsource(obj).encode())
+        for name in sorted(set(self.func.__code__.co_names)):
+            value = self.func.__globals__.get(name)
+            if isinstance(value, (str, int, float, bool, tuple, list, dict, set, frozenset)):
+                digest.update(f"{name}={json.dumps(value, sort_keys=True, default=sorted)}".encode())
+        for package in self.packages:
+            digest.update(f"{package}=={metadata.version(package)}".encode())
+        return digest.hexdigest()
+
+    def key(self, input_fingerprints):
+        payload = {
+            "stage": self.name,
+            "code": self.code_version(),
+            "params": self.params,
+            "inputs": input_fingerprints,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=list).encode()).hexdigest()
+
+
+def build_stages(iqr_factor=1.5, n_features=22, test_size=0.2, random_state=42):
+    """The preparation of notebook 02 as :class:`Stage` objects, in dependency order."""
+    return [
+        Stage("clean", clean_data,
+              {"raw_train": data.DATASETS["raw_train"][0], "raw_test": data.DATASETS["raw_test"][0]},
+              ["churn_cleaned.csv"], {"columns": list(OUTLIER_COLUMNS), "iqr_factor": iqr_factor},
+              code=(features,), packages=("pandas", "numpy")),
+        Stage("features", add_features, {"cleaned": ("clean", "churn_cleaned.csv")},
+              ["features.feather"], code=(features,), packages=("pandas", "numpy", "pyarrow")),
+        Stage("rfe", select_features, {"features": ("features", "features.feather")},
+              ["rfe_ranking.csv", "feature_importance.csv", "selected.json"],
+              {"n_features": n_features, "max_iter": 1000}, packages=("pandas", "scikit-learn")),
+        Stage("split", split_rows, {"features": ("features", "features.feather")},
+              ["train.npy", "test.npy"], {"test_size": test_size, "random_state": random_state},
+              packages=("numpy", "scikit-learn")),
+        Stage("encode", encode_splits,
+              {"features": ("features", "features.feather"), "selected": ("rfe", "selected.json"),
+               "train": ("split", "train.npy"), "test": ("split", "test.npy")},
+              ["X_train_scaled.csv", "X_test_scaled.csv", "y_train.csv", "y_test.csv", "preprocessor.joblib"],
+              packages=("pandas", "scikit-learn", "joblib")),
+    ]
+
+
+# (stage, output) -> where notebook 02 put it
+PUBLISHED = {
+    ("clean", "churn_cleaned.csv"): data.DATASETS["churn_cleaned"][0],
+    ("rfe", "rfe_ranking.csv"): "results/rfe_ranking.csv",
+    ("rfe", "feature_importance.csv"): "results/feature_importance.csv",
+    ("encode", "X_train_scaled.csv"): data.DATASETS["X_train"][0],
+    ("encode", "X_test_scaled.csv"): data.DATASETS["X_test"][0],
+    ("encode", "y_train.csv"): data.DATASETS["y_train"][0],
+    ("encode", "y_test.csv"): data.DATASETS["y_test"][0],
+    ("encode", "preprocessor.joblib"): "models/preprocessor.joblib",
+}
+
+
+PREPROCESSOR = "models/preprocessor.joblib"
+
+# The deployed preprocessor and the published files fitted with it -> where they
+# go when a new preprocessor does not match the deployed one (see :func:`same_preprocessor`)
+CANDIDATES = {
+    target: os.path.join(os.path.dirname(target), "candidate", os.path.basename(target))
+    for (stage, _), target in PUBLISHED.items()
+    if stage in ("rfe", "encode")
+}
+
+# Published files left as they are while the preprocessor matches the deployed one
+REPORTS = {"results/rfe_ranking.csv", "results/feature_importance.csv"}
+
+
+def same_preprocessor(path, other_path):
+    """Whether two fitted preprocessors have the same output columns and fitted parameters."""
+    a, b = joblib.load(path), joblib.load(other_path)
+    if list(a.get_feature_names_out()) != list(b.get_feature_names_out()):
+        return False
+    if len(a.transformers_) != len(b.transformers_):
+        return False
+    for (name, ta, columns), (other_name, tb, other_columns) in zip(a.transformers_, b.transformers_):
+        if name != other_name or type(ta) is not type(tb) or list(columns) != list(other_columns):
+            return False
+        for attribute in ("mean_", "scale_"):
+            if hasattr(ta, attribute) and not np.allclose(getattr(ta, attribute), getattr(tb, attribute)):
+                return False
+        if hasattr(ta, "categories_") and not all(
+            np.array_equal(x, y) for x, y in zip(ta.categories_, tb.categories_)
+        ):
+            return False
+    return True
+
+
+def _execute(func, inputs, output_dir, params):
+    func(inputs, output_dir, **params)
+
+
+class Pipeline:
+    """Runs :class:`Stage` objects against the content-addressed cache in ``cache_dir``."""
+
+    def __init__(self, stages, cache_dir=CACHE_DIR):
+        seen = set()
+        for stage in stages:
+            if not stage.depends <= seen:
+                raise ValueError(f"Stage {stage.name!r} needs {sorted(stage.depends - seen)} to come first")
+            seen.add(stage.name)
+        self.stages = stages
+        self.cache_dir = cache_dir
+        self.outputs = {}  # stage name -> {output: (path, fingerprint)}
+
+    def _inputs(self, stage):
+        """``{name: (path, fingerprint)}`` of the stage's inputs."""
+        inputs = {}
+        for name, source in stage.inputs.items():
+            if isinstance(source, tuple):
+                inputs[name] = self.outputs[source[0]][source[1]]
+            else:
+                inputs[name] = (source, file_fingerprint(source))
+        return inputs
+
+    def _load(self, stage, output_dir):
+        with open(os.path.join(output_dir, "manifest.json")) as f:
+            fingerprints = json.load(f)["outputs"]
+        self.outputs[stage.name] = {
+            name: (os.path.join(output_dir, name), fingerprints[name]) for name in stage.outputs
+        }
+
+    def _store(self, stage, work_dir, output_dir):
+        missing = [name for name in stage.outputs if not os.path.exists(os.path.join(work_dir, name))]
+        if missing:
+            raise RuntimeError(f"Stage {stage.name!r} did not write {missing}")
+        fingerprints = {name: file_fingerprint(os.path.join(work_dir, name)) for name in stage.outputs}
+        with open(os.path.join(work_dir, "manifest.json"), "w") as f:
+            json.dump({"stage": stage.name, "params": stage.params, "outputs": fingerprints}, f, indent=2)
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(work_dir, output_dir)
+        self._load(stage, output_dir)
+
+    def run(self, workers=1, force=()):
+        """Bring every stage up to date; returns ``[{"stage", "status", "seconds", "key"}]`` in finishing order.
+
+        ``force`` names stages to rerun even if their outputs are cached.
+        Up to ``workers`` stages run at once in worker processes.
+        """
+        self.outputs = {}
+        waiting, running, report = list(self.stages), {}, []
+        pool = ProcessPoolExecutor(workers) if workers > 1 else None
+        try:
+            while waiting or running:
+                for stage in [stage for stage in waiting if stage.depends <= self.outputs.keys()]:
+                    waiting.remove(stage)
+                    inputs = self._inputs(stage)
+                    key = stage.key({name: fingerprint for name, (_, fingerprint) in inputs.items()})
+                    output_dir = os.path.join(self.cache_dir, stage.name, key[:16])
+                    if stage.name not in force and os.path.exists(os.path.join(output_dir, "manifest.json")):
+                        self._load(stage, output_dir)
+                        report.append({"stage": stage.name, "status": "cached", "seconds": 0.0, "key": key})
+                        continue
+                    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+                    work_dir = tempfile.mkdtemp(prefix=f"{key[:16]}.", dir=os.path.dirname(output_dir))
+                    args = (stage.func, {name: path for name, (path, _) in inputs.items()}, work_dir, stage.params)
+                    job = (stage, key, work_dir, output_dir, time.perf_counter())
+                    if pool is None:
+                        self._finish(job, report, lambda: _execute(*args))
+                    else:
+                        running[pool.submit(_execute, *args)] = job
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._finish(running.pop(future), report, future.result)
+                elif waiting and not any(stage.depends <= self.outputs.keys() for stage in waiting):
+                    raise RuntimeError(f"Stages {[stage.name for stage in waiting]} cannot run")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            for stage, key, work_dir, output_dir, start in running.values():
+                shutil.rmtree(work_dir, ignore_errors=True)
+        return report
+
+    def _finish(self, job, report, result):
+        stage, key, work_dir, output_dir, start = job
+        try:
+            result()
+            self._store(stage, work_dir, output_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        report.append({"stage": stage.name, "status": "ran", "seconds": time.perf_counter() - start, "key": key})
+
+    def publish(self, targets=None, candidates=None):
+        """Copy the outputs of the last :meth:`run` to ``targets``; returns the paths that changed.
+
+        When the new preprocessor is not equivalent to the deployed
+        :data:`PREPROCESSOR`, every target in ``candidates`` (default
+        :data:`CANDIDATES`) goes to its candidate path instead. When it is,
+        the deployed preprocessor and existing :data:`REPORTS` are left alone.
+        """
+        targets = PUBLISHED if targets is None else targets
+        candidates = CANDIDATES if candidates is None else candidates
+        deployed = held_back = False
+        for (stage, name), target in targets.items():
+            if target == PREPROCESSOR and os.path.exists(target):
+                path, fingerprint = self.outputs[stage][name]
+                deployed = True
+                held_back = file_fingerprint(target) != fingerprint and not same_preprocessor(path, target)
+        changed = []
+        for (stage, name), target in targets.items():
+            path, fingerprint = self.outputs[stage][name]
+            if held_back and target in candidates:
+                target = candidates[target]
+            elif deployed and (target == PREPROCESSOR or target in REPORTS) and os.path.exists(target):
+                continue
+            if os.path.exists(target) and file_fingerprint(target) == fingerprint:
+                continue
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            shutil.copyfile(path, f"{target}.tmp")
+            os.replace(f"{target}.tmp", target)
+            changed.append(target)
+        return changed
@@ -0,0 +1,157 @@
+"""Sampling profiler that dumps flame-graph data for slow requests.
+
+Requests are registered with :meth:`~SlowRequestProfiler.request_started`
+and :meth:`~SlowRequestProfiler.request_finished`. The threads that run a
+request's work join it with :meth:`~SlowRequestProfiler.attach`. Work shared
+by several requests, such as a micro-batch, can join all of them for its
+duration with :meth:`~SlowRequestProfiler.working_for`. A daemon
+thread sleeps until the oldest request in flight passes ``threshold_ms``. It
+then samples the Python stacks of that request's threads every
+``interval_ms`` until the request finishes. Other threads are never walked,
+and nothing is sampled while every request is under the threshold.
+
+A request slower than the threshold gets the stacks sampled after it crossed
+the threshold written to ``output_dir`` in folded-stack format
+(``thread;frame;frame count``), which flamegraph.pl and speedscope read
+directly. Aggregation and file writes happen on the sampler thread, never on
+the request path. ``python -m benchmarks.profiling`` measures the overhead.
+"""
+import contextlib
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+_current = contextvars.ContextVar("profiled_request", default=None)
+
+
+def _folded(thread_name, frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class _Request:
+    __slots__ = ("deadline", "threads", "counts", "token")
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.threads = {threading.get_ident()}
+        self.counts = Counter()
+        self.token = None
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms, output_dir="profiles", interval_ms=5.0, max_dumps=100):
+        self.threshold = threshold_ms / 1000
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self._active = set()
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def request_started(self, start):
+        """Register a request that arrived at ``start`` (``time.perf_counter()``) on the calling thread."""
+        request = _Request(start + self.threshold)
+        request.token = _current.set(request)
+        with self._lock:
+            idle = not self._active
+            self._active.add(request)
+        if idle:  # later arrivals cannot have an earlier deadline than the requests already in flight
+            self._wake.set()
+
+    def attach(self):
+        """Add the calling thread to the current request, e.g. a worker thread running a sync handler."""
+        request = _current.get()
+        if request is not None:
+            request.threads.add(threading.get_ident())
+
+    def current(self):
+        """The request of the calling context (``None`` outside one), e.g. to pass to :meth:`working_for`."""
+        return _current.get()
+
+    @contextlib.contextmanager
+    def working_for(self, requests):
+        """Sample the calling thread with each of ``requests`` (from :meth:`current`) while the block runs."""
+        ident = threading.get_ident()
+        requests = [request for request in requests if request is not None]
+        for request in requests:
+            request.threads.add(ident)
+        try:
+            yield
+        finally:
+            for request in requests:
+                request.threads.discard(ident)
+
+    def request_finished(self, label, start, end):
+        """Unregister the current request and queue a dump if it took longer than the threshold (cheap)."""
+        request = _current.get()
+        if request is None:
+            return
+        _current.reset(request.token)
+        with self._lock:
+            self._active.discard(request)
+        if end - start >= self.threshold and request.counts and self.dumps < self.max_dumps:
+            self._pending.append((label, start, end, request.counts))
+            self._wake.set()
+
+    def _sample(self, requests):
+        frames = sys._current_frames()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for request in requests:
+            for ident in list(request.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    request.counts[_folded(names.get(ident, str(ident)), frame)] += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            while self._pending:
+                self._dump(*self._pending.popleft())
+            with self._lock:
+                requests = list(self._active)
+            now = time.perf_counter()
+            overdue = [request for request in requests if request.deadline <= now]
+            if overdue:
+                self._sample(overdue)
+                timeout = self.interval
+            elif requests:
+                timeout = min(request.deadline for request in requests) - now
+            else:
+                timeout = None
+            self._wake.wait(timeout)
+
+    def _dump(self, label, start, end, counts):
+        if self.dumps >= self.max_dumps:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{time.time_ns()}-{label}-{(end - start) * 1000:.0f}ms.folded")
+        with open(path, "w") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumps += 1
@@ -0,0 +1,157 @@
+"""Lazy, memory-mapped registry of the artifacts in ``models/``.
+
+Artifacts are discovered by file name (``models/KNN.joblib`` -> ``"KNN"``) and
+only loaded on first use, with ``joblib.load(mmap_mode="r")`` so the numpy
+arrays inside them (KNN's training matrix, SVC's support vectors, ...) are
+file-backed pages shared by every worker process instead of private copies.
+An artifact whose file changes on disk is reloaded on the next ``get``.
+:meth:`ModelRegistry.scorer` serves a nearest-neighbour index from
+``models/index/<name>/`` (see churn/knn.py) in place of the artifact it was
+built from.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import joblib
+
+from churn.knn import IndexedKNN
+
+_fingerprints = {}
+
+
+def file_fingerprint(path):
+    """SHA-256 of a file, recomputed only when its mtime or size changes."""
+    stat = os.stat(path)
+    cached = _fingerprints.get(path)
+    if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    fingerprint = digest.hexdigest()
+    _fingerprints[path] = ((stat.st_mtime_ns, stat.st_size), fingerprint)
+    return fingerprint
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.obj = None
+        self.fingerprint = None
+        self.version = 0
+        self.checked = 0.0
+        self.scorer = None
+        self.scorer_key = None
+
+
+class ModelRegistry:
+    def __init__(self, models_dir="models", mmap_mode="r", check_interval=1.0):
+        self.models_dir = models_dir
+        self.mmap_mode = mmap_mode
+        self.check_interval = check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return sorted(
+            name[: -len(".joblib")] for name in os.listdir(self.models_dir) if name.endswith(".joblib")
+        )
+
+    def path(self, name):
+        return os.path.join(self.models_dir, f"{name}.joblib")
+
+    def _entry(self, name):
+        with self._lock:
+            return self._entries.setdefault(name, _Entry())
+
+    def get(self, name):
+        """Return the loaded artifact, loading or hot-swapping it if needed."""
+        entry = self._entry(name)
+        now = time.monotonic()
+        if entry.obj is not None and now - entry.checked < self.check_interval:
+            return entry.obj
+        with entry.lock:
+            path = self.path(name)
+            if not os.path.exists(path):
+                raise KeyError(f"No artifact named {name!r} in {self.models_dir}")
+            fingerprint = file_fingerprint(path)
+            if fingerprint != entry.fingerprint:
+                entry.obj = joblib.load(path, mmap_mode=self.mmap_mode)
+                entry.fingerprint = fingerprint
+                entry.version += 1
+            entry.checked = now
+            return entry.obj
+
+    def index_path(self, name):
+        return os.path.join(self.models_dir, "index", name)
+
+    def scorer(self, name):
+        """The artifact, or its :class:`~churn.knn.IndexedKNN` if ``index_path(name)`` was built from it.
+
+        The index answers ``predict``/``predict_proba`` like the estimator it
+        was built from (exact search) without brute force. An index built from
+        an older artifact is ignored until build_knn_index.py is rerun.
+        """
+        model = self.get(name)
+        meta_path = os.path.join(self.index_path(name), "index.json")
+        if not os.path.exists(meta_path):
+            return model
+        entry = self._entry(name)
+        key = (entry.fingerprint, file_fingerprint(meta_path))
+        if entry.scorer_key != key:
+            with entry.lock:
+                if entry.scorer_key != key:
+                    with open(meta_path) as f:
+                        built_from = json.load(f).get("model_fingerprint")
+                    entry.scorer = IndexedKNN.load(self.index_path(name)) if built_from == key[0] else None
+                    entry.scorer_key = key
+        return entry.scorer if entry.scorer is not None else model
+
+    def fingerprint(self, name):
+        self.get(name)
+        return self._entry(name).fingerprint
+
+    def version(self, name):
+        self.get(name)
+        return self._entry(name).version
+
+    def loaded(self):
+        with self._lock:
+            return {name: entry.fingerprint for name, entry in self._entries.items() if entry.obj is not None}
+
+    def versions(self):
+        """``{name: (version, fingerprint)}`` of the loaded artifacts."""
+        with self._lock:
+            return {
+                name: (entry.version, entry.fingerprint)
+                for name, entry in self._entries.items() if entry.obj is not None
+            }
+
+    def unload(self, name):
+        entry = self._entry(name)
+        with entry.lock:
+            entry.obj = None
+            entry.fingerprint = None
+            entry.scorer = None
+            entry.scorer_key = None
+
+    def watch(self, build, *names):
+        """Return a callable giving ``build(*artifacts)``, rebuilt whenever one of them is swapped."""
+        state = {"versions": None, "value": None}
+        lock = threading.Lock()
+
+        def current():
+            artifacts = [self.get(name) for name in names]
+            versions = tuple(self._entry(name).version for name in names)
+            if versions != state["versions"]:
+                with lock:
+                    if versions != state["versions"]:
+                        state["value"] = build(*artifacts)
+                        state["versions"] = versions
+            return state["value"]
+
+        return current
@@ -0,0 +1,534 @@
+"""Scored-population index: churn probabilities of the customer base, ready for top-K queries.
+
+The base (``data/processed/churn_cleaned.csv`` by default; customer ids are
+row numbers) is scored once with ``models/best.joblib``. The probabilities are
+split into partitions by State, Tenure category, International plan and Voice
+mail plan, and sorted within each partition, highest first. Queries filter on
+any of those four keys:
+
+* :meth:`RiskIndex.top` merges the first ``k`` entries of every matching
+  partition;
+* :meth:`RiskIndex.range` binary-searches each matching partition for a
+  probability interval.
+
+Both only touch the heads or the matching slices of the partitions, so they
+take well under a millisecond regardless of how many customers there are.
+:meth:`RiskIndex.upsert` adds or re-scores customers without touching the
+sorted arrays: the new entries go to an append buffer, the entries they
+replace are marked dead, and queries read the buffer alongside the sorted
+heads. Buffered entries carry their partition code, so a query picks
+the matching ones with a single vectorized mask instead of a loop over
+partitions. The buffer and the dead entries are merged into the sorted arrays
+once they grow past a fraction of the index, so an upsert costs O(batch)
+amortized.
+
+The index is saved under ``models/index/risk`` together with the fingerprint
+of the model that scored it; :func:`load_or_build` rebuilds it when the model
+has changed. Customers added through :class:`SavedRiskIndex` are also appended
+to a :class:`CustomerTable` there, so a rebuild re-scores them and other
+processes serving the same index pick them up.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from churn import data
+from churn.features import RAW_COLUMNS, derive_columns
+from churn.registry import file_fingerprint
+
+PARTITION_KEYS = ("State", "Tenure category", "International plan", "Voice mail plan")
+
+
+def partition_keys(data):
+    """Partition key tuples for raw customer columns (anything :func:`derive_columns` accepts)."""
+    columns = derive_columns(data)
+    return list(zip(
+        (str(s) for s in columns["State"]),
+        (str(t) for t in columns["Tenure category"]),
+        (int(v) for v in columns["International plan"]),
+        (int(v) for v in columns["Voice mail plan"]),
+    ))
+
+
+def score(engine, data):
+    """``(partition keys, churn probabilities)`` of raw customer columns."""
+    _, proba = engine.predict(data)
+    if proba.dtype == object:
+        raise ValueError("The risk index needs a model with predict_proba")
+    return partition_keys(data), np.asarray(proba, dtype=np.float64)
+
+
+def _segment_search(values, starts, ends, targets, side="left"):
+    """``np.searchsorted`` of ``targets[i]`` in ``values[starts[i]:ends[i]]``, vectorized over segments."""
+    lo, hi = starts.astype(np.int64), ends.astype(np.int64)
+    while True:
+        active = lo < hi
+        if not active.any():
+            return lo
+        mid = (lo + hi) // 2
+        probe = values[np.minimum(mid, len(values) - 1)] if len(values) else np.zeros(len(mid))
+        go_right = (probe <= targets) if side == "right" else (probe < targets)
+        lo = np.where(active & go_right, mid + 1, lo)
+        hi = np.where(active & ~go_right, mid, hi)
+
+
+def _segment_index(starts, lengths):
+    """Concatenated ``arange(starts[i], starts[i] + lengths[i])`` for every segment."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    first = np.repeat(np.asarray(starts, dtype=np.int64) - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return first + np.arange(total)
+
+
+def _grow(array, size, fill):
+    grown = np.full(size, fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class RiskIndex:
+    """Churn probabilities partitioned by :data:`PARTITION_KEYS` and sorted within each partition.
+
+    The sorted entries live in two flat arrays (``-probability`` ascending and
+    customer id), one partition after another; ``offsets[c]:offsets[c + 1]``
+    is partition ``c``. Upserted entries wait in an append buffer until it
+    and the dead sorted entries exceed ``merge_fraction`` of the index (and
+    at least ``merge_min`` entries).
+    """
+
+    def __init__(self, keys, ids, proba, model_fingerprint=None, merge_fraction=0.05, merge_min=4096,
+                 max_selections=1024):
+        self.model_fingerprint = model_fingerprint
+        self.merge_fraction = merge_fraction
+        self.merge_min = merge_min
+        self.max_selections = max_selections
+        self.parts = set()      # CustomerTable parts already applied
+        self.keys = []          # partition code -> key tuple
+        self._codes = {}        # key tuple -> partition code
+        self._neg = np.empty(0)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._dead = np.zeros(0, dtype=np.int64)          # dead sorted entries per partition
+        self._dead_positions = []
+        self._buffer = []       # [(neg, ids, partition codes, generations)]
+        self._buffered = 0
+        self._size = 0
+        # customer id -> partition code (-1: absent), sorted position (-1: buffered) and generation
+        self._partition_of = np.empty(0, dtype=np.int32)
+        self._slot = np.empty(0, dtype=np.int64)
+        self._generation = np.empty(0, dtype=np.int64)
+        self._selections = OrderedDict()
+        self._lock = threading.Lock()
+        self.upsert(ids, keys, proba)
+        with self._lock:
+            self._merge()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def next_id(self):
+        return len(self._partition_of)
+
+    def _code(self, key):
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.keys)
+            self.keys.append(key)
+            self._offsets = np.append(self._offsets, self._offsets[-1])
+            self._dead = np.append(self._dead, 0)
+            self._selections.clear()
+        return code
+
+    def _drop(self, ids):
+        """Remove the given customers if present; caller holds the lock."""
+        codes = self._partition_of[ids]
+        ids, codes = ids[codes >= 0], codes[codes >= 0]
+        if not len(ids):
+            return
+        slots = self._slot[ids]
+        sorted_ = slots >= 0
+        self._alive[slots[sorted_]] = False
+        self._dead += np.bincount(codes[sorted_], minlength=len(self.keys))
+        self._dead_positions.append(slots[sorted_])
+        self._slot[ids] = -1
+        self._generation[ids] += 1  # their buffered entries, if any, are stale now
+        self._partition_of[ids] = -1
+        self._size -= len(ids)
+
+    def _coalesce(self):
+        """The live buffered ``(neg, ids, codes)`` as one chunk; caller holds the lock."""
+        if not self._buffer:
+            return np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        neg, ids, codes, generations = (np.concatenate(parts) for parts in zip(*self._buffer))
+        live = self._generation[ids] == generations
+        neg, ids, codes, generations = neg[live], ids[live], codes[live], generations[live]
+        self._buffer = [(neg, ids, codes, generations)]
+        self._buffered = len(ids)
+        return neg, ids, codes
+
+    def _merge(self):
+        """Fold the buffer into the sorted arrays and drop the dead entries; caller holds the lock."""
+        if not self._buffered and not self._dead_positions:
+            return
+        codes = np.repeat(np.arange(len(self.keys)), np.diff(self._offsets))
+        buffered_neg, buffered_ids, buffered_codes = self._coalesce()
+        neg = np.concatenate([self._neg[self._alive], buffered_neg])
+        ids = np.concatenate([self._ids[self._alive], buffered_ids])
+        codes = np.concatenate([codes[self._alive], buffered_codes])
+        order = np.lexsort((ids, neg, codes))
+        self._neg, self._ids = neg[order], ids[order]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(self.keys)))])
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._slot[self._ids] = np.arange(len(self._ids))
+        self._dead[:] = 0
+        self._dead_positions = []
+        self._buffer = []
+        self._buffered = 0
+
+    def _pending(self):
+        return self._buffered + int(self._dead.sum())
+
+    def upsert(self, ids, keys, proba):
+        """Insert customers, or move re-scored ones to their new position; ``keys`` from :func:`partition_keys`.
+
+        ``ids=None`` adds the customers with new ids, which are returned.
+        """
+        neg = -np.asarray(proba, dtype=np.float64)
+        if ids is not None:
+            ids = np.asarray(ids, dtype=np.int64)
+            if len(np.unique(ids)) != len(ids):
+                raise ValueError("Duplicate customer ids in one upsert")
+            if len(ids) and ids.min() < 0:
+                raise ValueError("Customer ids must be non-negative")
+        with self._lock:
+            if ids is None:
+                ids = np.arange(self.next_id, self.next_id + len(neg), dtype=np.int64)
+            codes = np.fromiter((self._code(tuple(key)) for key in keys), dtype=np.int32, count=len(ids))
+            if len(ids) and ids.max() >= len(self._partition_of):
+                size = int(ids.max()) + 1
+                self._partition_of = _grow(self._partition_of, size, -1)
+                self._slot = _grow(self._slot, size, -1)
+                self._generation = _grow(self._generation, size, 0)
+            self._drop(ids)
+            self._generation[ids] += 1
+            self._buffer.append((neg, ids, codes, self._generation[ids]))
+            self._buffered += len(ids)
+            self._partition_of[ids] = codes
+            self._size += len(ids)
+            if self._pending() > max(self.merge_min, self.merge_fraction * len(self._ids)):
+                self._merge()
+        return ids
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            self._drop(ids[ids < len(self._partition_of)])
+
+    def _select(self, state=None, tenure=None, international_plan=None, voice_mail_plan=None):
+        """Codes of the partitions matching the filters (``None`` matches anything), LRU-cached."""
+        wanted = (state, tenure, international_plan, voice_mail_plan)
+        codes = self._selections.get(wanted)
+        if codes is None:
+            codes = np.array([code for code, key in enumerate(self.keys)
+                              if all(w is None or w == k for w, k in zip(wanted, key))], dtype=np.int64)
+            self._selections[wanted] = codes
+            if len(self._selections) > self.max_selections:
+                self._selections.popitem(last=False)
+        else:
+            self._selections.move_to_end(wanted)
+        return codes
+
+    def _buffered_entries(self, codes, low=None, high=None):
+        """Live buffered ``(neg, ids)`` in the partitions ``codes``, optionally within a probability interval."""
+        neg, ids, buffered_codes = self._coalesce()
+        wanted = np.zeros(len(self.keys), dtype=bool)
+        wanted[codes] = True
+        match = wanted[buffered_codes]
+        if low is not None:
+            match &= (neg >= -high) & (neg <= -low)
+        return neg[match], ids[match]
+
+    def _sorted_entries(self, positions):
+        positions = positions[self._alive[positions]]
+        return self._neg[positions], self._ids[positions]
+
+    def _rows(self, neg, ids, limit):
+        if len(neg) > limit:
+            best = np.argpartition(neg, limit - 1)[:limit]
+            neg, ids = neg[best], ids[best]
+        order = np.lexsort((ids, neg))
+        keys = [self.keys[code] for code in self._partition_of[ids[order]]]
+        return [
+            {"customer_id": int(i), "churn_probability": float(-n), **dict(zip(PARTITION_KEYS, key))}
+            for i, n, key in zip(ids[order], neg[order], keys)
+        ]
+
+    def top(self, k=10, **filters):
+        """The ``k`` customers most likely to churn among the matching partitions, highest first.
+
+        Customers tied with the ``k``-th probability may be left out in any order.
+        """
+        with self._lock:
+            codes = self._select(**filters)
+            starts = self._offsets[codes]
+            # A dead entry can hide in each head, so read that many more
+            lengths = np.minimum(self._offsets[codes + 1] - starts, k + self._dead[codes])
+            neg, ids = self._sorted_entries(_segment_index(starts, lengths))
+            buffered_neg, buffered_ids = self._buffered_entries(codes)
+            return self._rows(np.concatenate([neg, buffered_neg]), np.concatenate([ids, buffered_ids]), k)
+
+    def range(self, low=0.0, high=1.0, limit=100, **filters):
+        """``(count, customers)`` with ``low <= probability <= high``; at most ``limit`` rows, highest first."""
+        with self._lock:
+            codes = self._select(**filters)
+            starts, ends = self._offsets[codes], self._offsets[codes + 1]
+            first = _segment_search(self._neg, starts, ends, np.full(len(codes), -high), side="left")
+            last = _segment_search(self._neg, starts, ends, np.full(len(codes), -low), side="right")
+            count = int((last - first).sum())
+            if self._dead_positions:
+                # Dead entries inside the matching slices are not customers any more
+                lo, hi = np.zeros(len(self.keys), dtype=np.int64), np.zeros(len(self.keys), dtype=np.int64)
+                lo[codes], hi[codes] = first, last
+                dead = self._dead_positions = [np.concatenate(self._dead_positions)]
+                dead = dead[0]
+                dead_codes = np.searchsorted(self._offsets, dead, side="right") - 1
+                count -= int(((dead >= lo[dead_codes]) & (dead < hi[dead_codes])).sum())
+            lengths = np.minimum(last - first, limit + self._dead[codes])
+            neg, ids = self._sorted_entries(_segment_index(first, lengths))
+            buffered_neg, buffered_ids = self._buffered_entries(codes, low, high)
+            count += len(buffered_ids)
+            rows = self._rows(np.concatenate([neg, buffered_neg]), np.concatenate([ids, buffered_ids]), limit)
+            return count, rows
+
+    def save(self, path="models/index/risk"):
+        with self._lock:
+            self._merge()
+            os.makedirs(path, exist_ok=True)
+            for name in ("neg", "ids", "offsets"):
+                np.save(os.path.join(path, f"{name}.npy"), getattr(self, f"_{name}"))
+            meta = {"model_fingerprint": self.model_fingerprint, "keys": [list(key) for key in self.keys],
+                    "parts": sorted(self.parts)}
+        with open(os.path.join(path, "index.json.tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(path, "index.json.tmp"), os.path.join(path, "index.json"))
+
+    @classmethod
+    def load(cls, path="models/index/risk"):
+        with open(os.path.join(path, "index.json")) as f:
+            meta = json.load(f)
+        neg, ids, offsets = (np.load(os.path.join(path, f"{name}.npy")) for name in ("neg", "ids", "offsets"))
+        keys = [tuple(meta["keys"][code]) for code in np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))]
+        index = cls(keys, ids, -neg, meta["model_fingerprint"])
+        index.parts = set(meta.get("parts", []))
+        return index
+
+    @classmethod
+    def build(cls, engine, base, model_fingerprint=None, chunk_size=100_000):
+        """Score a raw customer DataFrame in chunks; customer ids are its row numbers."""
+        keys, proba = [], []
+        for start in range(0, len(base), chunk_size):
+            chunk_keys, chunk_proba = score(engine, base.iloc[start:start + chunk_size])
+            keys.extend(chunk_keys)
+            proba.append(chunk_proba)
+        return cls(keys, np.arange(len(base)), np.concatenate(proba) if proba else [], model_fingerprint)
+
+
+class CustomerTable:
+    """Raw columns of the customers upserted into an index, one Parquet part per upsert.
+
+    Part names start with the time they were written, so sorting them gives
+    the upsert order; later rows win when a customer appears more than once.
+    """
+
+    def __init__(self, path="models/index/risk/customers", lock_timeout=10.0):
+        self.path = path
+        self.lock_timeout = lock_timeout
+
+    def parts(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if name.endswith(".parquet"))
+
+    def stamp(self):
+        """Changes whenever a part is added or removed."""
+        return os.stat(self.path).st_mtime_ns if os.path.isdir(self.path) else None
+
+    @contextmanager
+    def locked(self):
+        """Serialize id assignment and part writes across processes with an exclusive lock file.
+
+        A lock older than ``lock_timeout`` is taken to belong to a process that
+        died holding it and is broken.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        lock = f"{self.path}.lock"  # outside the directory, so taking it does not change stamp()
+        while True:
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock) > self.lock_timeout:
+                        os.remove(lock)
+                except FileNotFoundError:
+                    pass
+                time.sleep(0.005)
+        try:
+            yield
+        finally:
+            os.remove(lock)
+
+    def append(self, ids, columns):
+        """Write one part with ``customer_id`` and the raw columns; returns its name."""
+        table = pa.table({"customer_id": np.asarray(ids, dtype=np.int64),
+                          **{name: np.asarray(columns[name]) for name in RAW_COLUMNS}})
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+        return name
+
+    def read(self, parts):
+        """The customers of ``parts``, last write per id; parts removed by a compaction are skipped."""
+        frames = []
+        for name in parts:
+            try:
+                frames.append(pq.read_table(os.path.join(self.path, name)).to_pandas())
+            except FileNotFoundError:
+                continue
+        if not frames:
+            return pd.DataFrame(columns=["customer_id", *RAW_COLUMNS])
+        return pd.concat(frames, ignore_index=True).drop_duplicates("customer_id", keep="last")
+
+    def compact(self, parts):
+        """Replace ``parts`` by a single part; returns the remaining part names. Call under :meth:`locked`."""
+        if len(parts) < 2:
+            return list(parts)
+        customers = self.read(parts)
+        name = self.append(customers.pop("customer_id").to_numpy(), customers)
+        for part in parts:
+            os.remove(os.path.join(self.path, part))
+        return [name]
+
+
+def _apply(index, engine, table, parts):
+    """Score the customers of ``parts`` and upsert them into ``index``."""
+    if not parts:
+        return
+    customers = table.read(parts)
+    if len(customers):
+        ids = customers.pop("customer_id").to_numpy()
+        keys, proba = score(engine, customers)
+        index.upsert(ids, keys, proba)
+    index.parts.update(parts)
+
+
+def build(engine, path="models/index/risk", model_path="models/best.joblib", source="churn_cleaned"):
+    """Score ``source`` and every customer in the index's :class:`CustomerTable`, then save the index."""
+    index = RiskIndex.build(engine, data.load(source), file_fingerprint(model_path))
+    table = CustomerTable(os.path.join(path, "customers"))
+    with table.locked():
+        _apply(index, engine, table, table.compact(table.parts()))
+        index.save(path)
+    return index
+
+
+def load_or_build(engine, path="models/index/risk", model_path="models/best.joblib", source="churn_cleaned"):
+    """The saved index if it was scored by the current model, otherwise a fresh one from ``source``.
+
+    A loaded index also takes in the customers appended since it was saved.
+    """
+    fingerprint = file_fingerprint(model_path)
+    if os.path.exists(os.path.join(path, "index.json")):
+        index = RiskIndex.load(path)
+        if index.model_fingerprint == fingerprint:
+            table = CustomerTable(os.path.join(path, "customers"))
+            _apply(index, engine, table, [part for part in table.parts() if part not in index.parts])
+            return index
+    return build(engine, path, model_path, source)
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SavedRiskIndex:
+    """The index saved under ``path``, kept current for one process.
+
+    Checked at most every ``check_interval`` seconds: the index is reloaded
+    when another process saved it (``index.json`` changed) and takes in the
+    customers other processes appended to the :class:`CustomerTable`.
+    Rebuilding for a new model is up to the caller (a new instance).
+    """
+
+    def __init__(self, engine, path="models/index/risk", model_path="models/best.joblib", source="churn_cleaned",
+                 check_interval=1.0):
+        self.engine = engine
+        self.path = path
+        self.model_path = model_path
+        self.source = source
+        self.check_interval = check_interval
+        self.table = CustomerTable(os.path.join(path, "customers"))
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        self.index = load_or_build(self.engine, self.path, self.model_path, self.source)
+        self._saved = _stamp(os.path.join(self.path, "index.json"))
+        self._table = self.table.stamp()
+        self._checked = time.monotonic()
+
+    def _sync(self):
+        """Reload or catch up with other processes; caller holds the lock."""
+        if _stamp(os.path.join(self.path, "index.json")) != self._saved:
+            self._load()
+            return
+        stamp = self.table.stamp()
+        if stamp != self._table:
+            self._table = stamp
+            _apply(self.index, self.engine, self.table,
+                   [part for part in self.table.parts() if part not in self.index.parts])
+
+    def get(self):
+        if time.monotonic() - self._checked < self.check_interval:
+            return self.index
+        with self._lock:
+            self._sync()
+            self._checked = time.monotonic()
+            return self.index
+
+    def upsert(self, columns, ids=None):
+        """Score raw customer columns, record them in the table and upsert them; returns ``(ids, proba)``.
+
+        ``ids=None`` adds the customers with new ids, unique across processes.
+        """
+        keys, proba = score(self.engine, columns)
+        with self._lock, self.table.locked():
+            self._sync()
+            ids = self.index.upsert(ids, keys, proba)
+            self.index.parts.add(self.table.append(ids, columns))
+            self._table = self.table.stamp()
+        return ids, proba
+
+    def save(self):
+        with self._lock:
+            self.index.save(self.path)
+            self._saved = _stamp(os.path.join(self.path, "index.json"))
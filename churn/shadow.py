@@ -0,0 +1,216 @@
+"""Champion/challenger scoring over one shared feature matrix.
+
+:class:`ShadowScorer` transforms a batch once (with the champion engine's
+preprocessor) and answers with the champion, ``models/best.joblib``. The same
+matrix is handed to every challenger artifact in ``models/`` on a thread pool.
+Their predictions are appended to a :class:`ShadowLog` by a background thread,
+so the answer never waits for a challenger. Challengers still compete with
+the champion for CPU: ``sample`` shadows only that fraction of batches, and
+when ``max_pending`` challenger batches are already in flight, new batches
+are not shadowed and are counted as ``dropped``.
+
+The log is JSON lines, one line per model per batch:
+
+    {"batch": "...", "ts": ..., "role": "champion", "model": "best", "fingerprint": "...",
+     "ms": 0.4, "rows": 2, "pred": [0, 1], "proba": [0.02, 0.91], "label": [0, 1]}
+
+``label`` is only present when the caller passes true labels (offline scoring
+of a file with a ``Churn`` column). Models without ``predict_proba`` (SVC)
+log their ``decision_function`` as ``score`` instead. See shadow_report.py for
+the comparison with results/models_summary.csv.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from churn.inference import predict_with_proba
+from churn.metrics import NULL_CLOCK, StageClock
+
+NOT_MODELS = {"best", "preprocessor"}
+
+
+def default_challengers(registry):
+    return [name for name in registry.names() if name not in NOT_MODELS]
+
+
+def _tolist(values):
+    return None if values is None else np.asarray(values).tolist()
+
+
+class ShadowLog:
+    """Append-only JSON-lines file written by a daemon thread."""
+
+    def __init__(self, path="results/shadow/predictions.jsonl"):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    self._thread = threading.Thread(target=self._run, name="shadow-log", daemon=True)
+                    self._thread.start()
+
+    def append(self, entry):
+        self._ensure_started()
+        self._queue.put(entry)
+
+    def _run(self):
+        # Unbuffered append: each line is a single write(), so several worker
+        # processes can share one file without interleaving lines
+        with open(self.path, "ab", buffering=0) as f:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    self._queue.task_done()
+                    return
+                f.write(json.dumps(entry, separators=(",", ":")).encode() + b"\n")
+                self.written += 1
+                self._queue.task_done()
+
+    def flush(self):
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+
+
+class ShadowScorer:
+    """Score with the champion engine and shadow-score the same matrix with every challenger.
+
+    ``get_engine`` returns the champion :class:`~churn.inference.InferenceEngine`
+    (e.g. from ``ModelRegistry.watch``) for the ``champion`` artifact;
+    challengers are loaded lazily from ``registry`` by name.
+    """
+
+    def __init__(self, get_engine, registry, champion="best", challengers=None, log=None, workers=None,
+                 max_pending=8, sample=1.0):
+        self.get_engine = get_engine
+        self.registry = registry
+        self.champion = champion
+        if challengers is None:
+            challengers = [name for name in default_challengers(registry) if name != champion]
+        self.challengers = list(challengers)
+        self.log = log if log is not None else ShadowLog()
+        self.pool = ThreadPoolExecutor(workers or len(self.challengers) or 1, thread_name_prefix="shadow")
+        self.max_pending = max_pending
+        self.sample = sample
+        self._pending = 0
+        self._lock = threading.Condition()
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self._warm = False
+
+    def score(self, data, labels=None):
+        """Return the champion's ``(labels, churn_probabilities)`` for raw customer columns."""
+        engine = self.get_engine()
+        clock = StageClock(engine.observe) if engine.observe is not None else NULL_CLOCK
+        X = engine.matrix(data, clock)
+        start = time.perf_counter()
+        preds, proba = engine.predict_matrix(X, clock)
+        self._shadow(X, preds, proba, labels, time.perf_counter() - start)
+        return preds, proba
+
+    def warm_up(self, X):
+        """Load every challenger and score one row with each, one model at a time.
+
+        sklearn and threadpoolctl import and dlopen native libraries on first
+        use; doing that from several threads at once can deadlock on the
+        loader lock, so the first batch is never fanned out cold.
+        """
+        for name in self.challengers:
+            try:
+                self._score_one(name, X[:1])
+            except Exception:
+                pass  # reported per batch by _challenger_done
+        self._warm = True
+
+    def _shadow(self, X, preds, proba, labels, seconds):
+        if not self.challengers or (self.sample < 1.0 and random.random() >= self.sample):
+            return
+        if not self._warm:
+            with self._lock:
+                if not self._warm:
+                    self.warm_up(X)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+            self.batches += 1
+        batch = {"batch": uuid.uuid4().hex[:16], "ts": time.time(), "rows": len(X)}
+        if labels is not None:
+            batch["label"] = _tolist(labels)
+        self.log.append({**batch, "role": "champion", "model": self.champion,
+                         "fingerprint": self.registry.fingerprint(self.champion), "ms": round(seconds * 1000, 3),
+                         "pred": _tolist(preds), "proba": _tolist(proba)})
+        # Challengers only read X, so they share it without copies
+        remaining = [len(self.challengers)]
+        for name in self.challengers:
+            future = self.pool.submit(self._score_one, name, X)
+            future.add_done_callback(partial(self._challenger_done, name, batch, remaining))
+
+    def _challenger_done(self, name, batch, remaining, future):
+        try:
+            entry = future.result()
+        except Exception as exc:
+            with self._lock:
+                self.errors += 1
+            entry = {"error": f"{type(exc).__name__}: {exc}"}
+        self.log.append({**batch, "role": "challenger", "model": name, **entry})
+        with self._lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                self._pending -= 1
+                self._lock.notify_all()
+
+    def _score_one(self, name, X):
+        model = self.registry.scorer(name)
+        start = time.perf_counter()
+        preds, proba = predict_with_proba(model, X)
+        entry = {"ms": round((time.perf_counter() - start) * 1000, 3), "pred": _tolist(preds)}
+        if proba[0] is None and hasattr(model, "decision_function"):
+            entry["score"] = _tolist(model.decision_function(X))
+        else:
+            entry["proba"] = _tolist(proba)
+        entry["fingerprint"] = self.registry.fingerprint(name)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                "challengers": self.challengers,
+                "batches": self.batches,
+                "dropped": self.dropped,
+                "pending": self._pending,
+                "errors": self.errors,
+                "log": self.log.path,
+                "written": self.log.written,
+            }
+
+    def flush(self):
+        """Wait until every shadowed batch has been scored and written."""
+        with self._lock:
+            self._lock.wait_for(lambda: self._pending == 0)
+        self.log.flush()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.log.close()
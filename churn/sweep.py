@@ -0,0 +1,95 @@
+"""What-if sweeps: one customer's churn probability over a grid of feature values.
+
+:func:`sweep` takes one customer (raw column values) and one or two axes,
+each a raw column with the values to try. The whole grid is built as one set
+of raw columns, one row per grid cell, with the other columns repeated. The
+derived features (High service calls, Has All Plans, cost ratios, ...) are
+then recomputed for every cell by :func:`churn.features.derive_columns`, and
+the grid is scored in one :class:`churn.inference.InferenceEngine` call.
+
+Minutes and charges are tied by a per-minute rate. When a minutes column is
+swept and its charge is not, the charge is scaled with the minutes by
+default (``link_charges``), so the cost-per-minute features stay realistic.
+"""
+import numpy as np
+
+from churn.columnar import DECIMAL_COLUMNS, FLAG_COLUMNS
+from churn.features import RAW_COLUMNS, STATE_NAMES
+
+# Largest grid scored in one call (a 500x500 sweep)
+MAX_CELLS = 250_000
+
+
+def _check_axis(column, values):
+    if column not in RAW_COLUMNS:
+        raise ValueError(f"Unknown feature {column!r}")
+    if not len(values):
+        raise ValueError(f"{column}: no values to sweep")
+    if column == "State":
+        unknown = sorted(set(values) - set(STATE_NAMES.values()))
+        if unknown:
+            raise ValueError(f"State: unknown state names {unknown[:5]}")
+        return np.asarray(values, dtype=object)
+    values = np.asarray(values, dtype=float)
+    if not np.isfinite(values).all() or (values < 0).any():
+        raise ValueError(f"{column}: values must be finite and non-negative")
+    if column in FLAG_COLUMNS and not np.isin(values, (0, 1)).all():
+        raise ValueError(f"{column}: values must be 0 or 1")
+    if column not in DECIMAL_COLUMNS:
+        if (values != np.floor(values)).any():
+            raise ValueError(f"{column}: values must be whole numbers")
+        return values.astype(np.int64)
+    return values
+
+
+def grid_columns(record, axes, link_charges=True):
+    """Raw columns with one row per grid cell (first axis slowest), then the unchanged customer.
+
+    ``record`` maps every raw column to a value; ``axes`` is a list of one or
+    two ``(column, values)`` pairs.
+    """
+    if not 1 <= len(axes) <= 2:
+        raise ValueError("Sweep one or two features")
+    if len(axes) == 2 and axes[0][0] == axes[1][0]:
+        raise ValueError("The two swept features must differ")
+    missing = [name for name in RAW_COLUMNS if name not in record]
+    if missing:
+        raise ValueError(f"Missing customer columns: {missing}")
+    grids = [_check_axis(column, values) for column, values in axes]
+    shape = tuple(len(values) for values in grids)
+    cells = int(np.prod(shape))
+    if cells > MAX_CELLS:
+        raise ValueError(f"The grid has {cells:,} cells; at most {MAX_CELLS:,} are scored in one sweep")
+
+    columns = {}
+    for name in RAW_COLUMNS:
+        value = record[name]
+        dtype = object if name == "State" else (float if name in DECIMAL_COLUMNS else np.int64)
+        columns[name] = np.full(cells + 1, value, dtype=dtype)
+    swept = {column for column, _ in axes}
+    for axis, ((column, _), values) in enumerate(zip(axes, grids)):
+        # Cell i of a C-ordered grid takes value index np.unravel_index(i, shape)[axis]
+        repeat = int(np.prod(shape[axis + 1:]))
+        tile = cells // (len(values) * repeat)
+        cell_values = np.tile(np.repeat(values, repeat), tile)
+        columns[column] = np.concatenate([cell_values, columns[column][-1:].astype(cell_values.dtype)])
+        charge = column.replace("minutes", "charge")
+        if link_charges and column.endswith("minutes") and charge not in swept:
+            base_minutes = float(record[column])
+            if base_minutes > 0:
+                columns[charge] = columns[charge] * (columns[column] / base_minutes)
+    return columns, shape
+
+
+def sweep(engine, record, axes, link_charges=True):
+    """``(labels, churn_probabilities, baseline)`` over the grid of ``axes``.
+
+    Labels and probabilities have the grid's shape (``len(values)`` per axis);
+    ``baseline`` is ``(label, probability)`` of the customer as given.
+    Probabilities are ``None`` for models without ``predict_proba``.
+    """
+    columns, shape = grid_columns(record, axes, link_charges)
+    labels, proba = engine.predict(columns)
+    baseline = (labels[-1], proba[-1])
+    proba = proba[:-1]
+    return labels[:-1].reshape(shape), (proba.reshape(shape) if proba.dtype != object else None), baseline
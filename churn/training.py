@@ -0,0 +1,308 @@
+"""Incremental updates of the ``models/`` artifacts from a batch of labelled customers.
+
+Notebook 03 refits everything on the full history. :func:`update_models`
+instead folds one new batch into the existing artifacts, so its cost grows
+with the batch and not with the history:
+
+* the StandardScaler's mean and variance are updated with ``partial_fit``;
+* every model is then re-expressed in the new scale. Each scaled feature
+  changes by ``z_old = A * z_new + B``, so tree thresholds, linear
+  coefficients and GaussianNB moments can be rewritten exactly. KNN and SVC
+  store training points, which are rescaled too; that is exact for KNN's
+  points but only approximate for SVC's RBF kernel;
+* XGBoost continues boosting from the existing booster for a few rounds on
+  the new batch, GaussianNB uses ``partial_fit``, Logistic Regression takes a
+  few SGD passes (same L1 penalty) starting from its coefficients, and KNN
+  appends the new customers to its training points. The decision tree and
+  SVC are only rescaled.
+
+A model type with no rebase (e.g. the Random Forest that tune.py can write)
+would be served against the wrong scale, so :func:`update_models` refuses to
+update the scaler while one is present.
+
+Artifacts are written with :func:`atomic_dump`, so a reader (the API's
+registry) sees either the old file or the new one, never a partial write.
+"""
+import copy
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+
+from churn.features import clean_raw, derive_features
+from churn.registry import file_fingerprint
+
+
+def atomic_dump(obj, path):
+    """``joblib.dump`` to a temporary file next to ``path``, then rename it into place."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        joblib.dump(obj, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_labelled(path):
+    """Cleaned customers and their ``Churn`` labels from a raw-format CSV or Parquet file."""
+    raw = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    if "Churn" not in raw.columns:
+        raise ValueError(f"{path} has no Churn column; retraining needs labelled customers")
+    df = clean_raw(raw)
+    return df.drop(columns=["Churn"]), df["Churn"].to_numpy()
+
+
+def _scaler(preprocessor):
+    for _, transformer, columns in preprocessor.transformers_:
+        if isinstance(transformer, StandardScaler):
+            return transformer, list(columns)
+    raise ValueError("The preprocessor has no StandardScaler")
+
+
+def scale_change(preprocessor, old_scaler):
+    """Per-output-column ``(A, B)`` with ``z_old = A * z_new + B`` after the scaler was updated."""
+    A, B = [], []
+    for _, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop":
+            continue
+        width = len(columns)
+        if isinstance(transformer, StandardScaler):
+            A.append(transformer.scale_ / old_scaler.scale_)
+            B.append((transformer.mean_ - old_scaler.mean_) / old_scaler.scale_)
+        else:
+            A.append(np.ones(width))
+            B.append(np.zeros(width))
+    return np.concatenate(A), np.concatenate(B)
+
+
+def rescale_points(X, A, B):
+    """Training points stored in the old scale, expressed in the new one."""
+    return (np.asarray(X) - B) / A
+
+
+# Cut points often equal a data value exactly; rounding the rescaled cut could
+# send such a value down the other branch, so cuts are moved a few ulps
+# towards the side ties took before (XGBoost: x < cut, sklearn trees: x <= t).
+TIE_ULPS = 4
+
+
+def rebase_xgboost(model, A, B):
+    booster = model.get_booster()
+    config = json.loads(booster.save_raw("json"))
+    for tree in config["learner"]["gradient_booster"]["model"]["trees"]:
+        left = np.asarray(tree["left_children"])
+        feature = np.asarray(tree["split_indices"])
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float64)
+        split = left != -1
+        cuts = ((conditions[split] - B[feature[split]]) / A[feature[split]]).astype(np.float32)
+        conditions[split] = cuts - TIE_ULPS * np.spacing(np.abs(cuts))
+        tree["split_conditions"] = conditions.astype(np.float32).tolist()
+    booster.load_model(bytearray(json.dumps(config).encode()))
+    return "exact"
+
+
+def rebase_tree(model, A, B):
+    tree = model.tree_
+    split = tree.feature >= 0
+    feature = tree.feature[split]
+    # tree_.threshold is a writable view of the node array; sklearn compares float32 inputs
+    threshold = (tree.threshold[split] - B[feature]) / A[feature]
+    tree.threshold[split] = threshold + TIE_ULPS * np.spacing(np.abs(threshold).astype(np.float32))
+    return "exact"
+
+
+def rebase_linear(model, A, B):
+    model.intercept_ = model.intercept_ + model.coef_ @ B
+    model.coef_ = model.coef_ * A
+    return "exact"
+
+
+def rebase_gaussian_nb(model, A, B):
+    # var_ includes the epsilon_ smoothing that partial_fit takes off and puts back
+    model.theta_ = (model.theta_ - B) / A
+    model.var_ = (model.var_ - model.epsilon_) / A ** 2 + model.epsilon_
+    return "exact"
+
+
+def rebase_knn(model, A, B):
+    model._fit_X = rescale_points(model._fit_X, A, B)
+    return "exact"
+
+
+def rebase_svc(model, A, B):
+    # libsvm reads support_vectors_; the RBF distance itself is not scale-invariant
+    model.support_vectors_ = np.ascontiguousarray(rescale_points(model.support_vectors_, A, B))
+    return "approximate"
+
+
+def update_xgboost(model, X, y, rounds=10, learning_rate=None):
+    booster = model.get_booster()
+    total = booster.num_boosted_rounds() + rounds
+    params = {"n_estimators": rounds}
+    if learning_rate is not None:
+        params["learning_rate"] = learning_rate
+    model.set_params(**params)
+    model.fit(X, y, xgb_model=booster)
+    model.set_params(n_estimators=total)
+    return f"+{rounds} boosting rounds"
+
+
+def update_gaussian_nb(model, X, y):
+    model.partial_fit(X, y)
+    return "partial_fit"
+
+
+def update_logistic(model, X, y, n_seen, epochs=5, eta0=0.001):
+    """A few SGD passes over the batch from the fitted coefficients, with the model's own penalty.
+
+    LogisticRegression minimises ``C * sum(loss) + penalty``; per sample that
+    is SGD's ``mean(loss) + alpha * penalty`` with ``alpha = 1 / (C * n)``.
+    """
+    penalty = model.penalty if model.penalty in ("l1", "l2", "elasticnet") else None
+    sgd = SGDClassifier(loss="log_loss", penalty=penalty, alpha=1.0 / (model.C * n_seen),
+                        l1_ratio=model.l1_ratio if model.l1_ratio is not None else 0.15,
+                        learning_rate="constant", eta0=eta0)
+    sgd.coef_ = model.coef_.copy()
+    sgd.intercept_ = model.intercept_.copy()
+    for _ in range(epochs):
+        sgd.partial_fit(X, y, classes=model.classes_)
+    model.coef_, model.intercept_ = sgd.coef_, sgd.intercept_
+    return f"{epochs} SGD epochs"
+
+
+def update_knn(model, X, y):
+    # Fitting KNN stores the points (and builds a tree if it uses one); _y holds class positions
+    points = pd.DataFrame(np.vstack([model._fit_X, X]), columns=X.columns)
+    model.fit(points, np.concatenate([model.classes_[model._y], y]))
+    return f"+{len(X):,} points"
+
+
+REBASE = [
+    (DecisionTreeClassifier, rebase_tree),
+    (LogisticRegression, rebase_linear),
+    (GaussianNB, rebase_gaussian_nb),
+    (KNeighborsClassifier, rebase_knn),
+    (SVC, rebase_svc),
+]
+
+
+def _rebase_for(model):
+    if hasattr(model, "get_booster"):
+        return rebase_xgboost
+    return next((func for kind, func in REBASE if isinstance(model, kind)), None)
+
+
+def update_model(model, X, y, A=None, B=None, rounds=10, learning_rate=None, n_seen=None, epochs=5, eta0=0.001):
+    """Re-express ``model`` in the new scale (if ``A``/``B`` are given) and fold in ``(X, y)``."""
+    rebased = "-"
+    if A is not None:
+        rebase = _rebase_for(model)
+        if rebase is None:
+            raise ValueError(f"{type(model).__name__} cannot be re-expressed in the new scale")
+        rebased = rebase(model, A, B)
+    if hasattr(model, "get_booster"):
+        updated = update_xgboost(model, X, y, rounds, learning_rate)
+    elif isinstance(model, GaussianNB):
+        updated = update_gaussian_nb(model, X, y)
+    elif isinstance(model, LogisticRegression):
+        updated = update_logistic(model, X, y, n_seen or len(X), epochs, eta0)
+    elif isinstance(model, KNeighborsClassifier):
+        updated = update_knn(model, X, y)
+    else:
+        updated = "rescaled only"
+    return rebased, updated
+
+
+def model_names(models_dir="models"):
+    return sorted(f[: -len(".joblib")] for f in os.listdir(models_dir)
+                  if f.endswith(".joblib") and f != "preprocessor.joblib")
+
+
+def update_models(features, y, models_dir="models", output_dir=None, update_scaler=True, names=None, **options):
+    """Fold a labelled batch into every artifact in ``models_dir`` and write them to ``output_dir``.
+
+    ``features`` are cleaned customers (:func:`read_labelled`). Returns
+    ``(report, A, B, X)``: one dict per model, the scale change (``None`` when
+    the scaler was frozen) and the batch in the new model input space.
+
+    Raises ``ValueError`` before anything is written when the scaler is
+    updated and a model has no rebase for the new scale.
+    """
+    output_dir = output_dir or models_dir
+    preprocessor_path = os.path.join(models_dir, "preprocessor.joblib")
+    preprocessor = joblib.load(preprocessor_path)
+    scaler, columns = _scaler(preprocessor)
+    old_scaler = copy.deepcopy(scaler)
+    n_seen = int(np.max(old_scaler.n_samples_seen_)) + len(y)
+    derived = derive_features(features)
+
+    A = B = None
+    if update_scaler:
+        scaler.partial_fit(derived[columns])
+        A, B = scale_change(preprocessor, old_scaler)
+    X = pd.DataFrame(preprocessor.transform(derived), columns=preprocessor.get_feature_names_out())
+
+    if names is None:
+        names = model_names(models_dir)
+    # Identical files (best.joblib is a copy of the winning model) are updated once
+    by_fingerprint = {}
+    for name in names:
+        by_fingerprint.setdefault(file_fingerprint(os.path.join(models_dir, f"{name}.joblib")), []).append(name)
+    models = {fingerprint: joblib.load(os.path.join(models_dir, f"{group[0]}.joblib"))
+              for fingerprint, group in by_fingerprint.items()}
+    if update_scaler:
+        unsupported = sorted(name for fingerprint, group in by_fingerprint.items() for name in group
+                             if _rebase_for(models[fingerprint]) is None)
+        if unsupported:
+            raise ValueError(f"Cannot re-express {', '.join(unsupported)} in the updated scale; "
+                             f"freeze the scaler or move them out of {models_dir}")
+
+    report, updated = [], {}
+    for fingerprint, group in by_fingerprint.items():
+        start = time.perf_counter()
+        model = models[fingerprint]
+        rebased, change = update_model(model, X, y, A, B, n_seen=n_seen, **options)
+        seconds = time.perf_counter() - start
+        for name in group:
+            updated[name] = model
+            report.append({"model": name, "type": type(model).__name__, "rescaled": rebased,
+                           "update": change, "seconds": seconds})
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, model in updated.items():
+        atomic_dump(model, os.path.join(output_dir, f"{name}.joblib"))
+    # The renames run back to back; the preprocessor goes last so a reader
+    # never pairs the old models with the new scale for longer than that
+    atomic_dump(preprocessor, os.path.join(output_dir, "preprocessor.joblib"))
+    return sorted(report, key=lambda r: r["model"]), A, B, X
+
+
+def rebase_processed(A, B, X, y, processed_dir="data/processed"):
+    """Bring the notebook's scaled train/test matrices to the new scale and append the batch to train.
+
+    The notebooks and MLFlow_Deployment.py evaluate on these files, so they
+    have to match the updated preprocessor. Unlike the model update, this
+    rewrites the (small) processed history.
+    """
+    paths = {name: os.path.join(processed_dir, f"{name}.csv")
+             for name in ("X_train_scaled", "X_test_scaled", "y_train")}
+    X_train, X_test = pd.read_csv(paths["X_train_scaled"]), pd.read_csv(paths["X_test_scaled"])
+    if A is not None:
+        X_train = pd.DataFrame(rescale_points(X_train, A, B), columns=X_train.columns)
+        X_test = pd.DataFrame(rescale_points(X_test, A, B), columns=X_test.columns)
+    X_train = pd.concat([X_train, pd.DataFrame(X, columns=X_train.columns)], ignore_index=True)
+    y_train = pd.concat([pd.read_csv(paths["y_train"]), pd.DataFrame({"Churn": y})], ignore_index=True)
+    for name, frame in (("X_train_scaled", X_train), ("X_test_scaled", X_test), ("y_train", y_train)):
+        tmp = f"{paths[name]}.tmp-{os.getpid()}"
+        frame.to_csv(tmp, index=False)
+        os.replace(tmp, paths[name])
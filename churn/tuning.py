@@ -0,0 +1,260 @@
+"""Hyperparameter search with cached folds, successive halving and resumable trials.
+
+Notebook 03 runs an exhaustive ``GridSearchCV`` over :data:`PARAM_GRIDS`. This
+module searches the same grids differently:
+
+* the training set is split into stratified folds once, optionally
+  oversampled with ADASYN inside each training fold (when ``imblearn`` is
+  installed), and the fold matrices are saved as ``.npy`` files under
+  ``data/cache/folds/<key>``. Trials memory-map them instead of repeating the
+  work. ``key`` hashes the data files and the fold settings;
+* each model's candidates go through successive halving. Every rung gives
+  the candidates ``eta`` times more budget than the one before and keeps the
+  best ``1 / eta`` by mean validation accuracy; the last rung is the full
+  candidate on the full folds. The budget is a share of each training fold,
+  except for the tree ensembles (:data:`ESTIMATOR_BUDGET`), whose fit time
+  hardly shrinks with fewer rows: they get a share of their ``n_estimators``;
+* trials run on a process pool, and every result is appended to a JSON-lines
+  log. A restarted search reads the log and skips the trials already done.
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import (accuracy_score, classification_report, f1_score, precision_score, recall_score,
+                             roc_auc_score)
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+from xgboost import XGBClassifier
+
+try:
+    from imblearn.over_sampling import ADASYN
+except ImportError:  # optional, as in notebook 03
+    ADASYN = None
+
+# Same estimators and grids as notebook 03
+ESTIMATORS = {
+    "SVC": lambda: SVC(),
+    "Decision Tree": lambda: DecisionTreeClassifier(),
+    "Random Forest": lambda: RandomForestClassifier(n_jobs=1),
+    "XGBoost": lambda: XGBClassifier(eval_metric="logloss", n_jobs=1),
+    "Logistic Regression": lambda: LogisticRegression(max_iter=1000),
+    "KNN": lambda: KNeighborsClassifier(),
+    "GaussianNB": lambda: GaussianNB(),
+}
+PARAM_GRIDS = {
+    "SVC": {"C": [0.1, 1, 10], "kernel": ["linear", "rbf"], "gamma": [0.01, 0.1, 1]},
+    "Decision Tree": {"criterion": ["gini", "entropy"], "max_depth": [None, 5, 10, 20],
+                      "min_samples_split": [2, 5, 10]},
+    "Random Forest": {"n_estimators": [100, 200, 300], "max_depth": [None, 10, 20, 30],
+                      "min_samples_split": [2, 5, 10], "bootstrap": [True, False]},
+    "XGBoost": {"n_estimators": [100, 200], "max_depth": [3, 5, 7], "learning_rate": [0.01, 0.1, 0.2],
+                "subsample": [0.7, 1.0]},
+    "Logistic Regression": {"C": [0.01, 0.1, 1, 10], "penalty": ["l1", "l2"], "solver": ["lbfgs", "liblinear", "saga"]},
+    "KNN": {"n_neighbors": list(range(1, 11)), "weights": ["uniform", "distance"], "metric": ["euclidean", "manhattan"]},
+    "GaussianNB": {"var_smoothing": [1e-9, 1e-8, 1e-7]},
+}
+
+
+# Models whose rung budget is a share of n_estimators (on the full folds) instead of rows
+ESTIMATOR_BUDGET = {"Random Forest", "XGBoost"}
+MIN_ESTIMATORS = 10
+
+
+def make_model(name, params):
+    return ESTIMATORS[name]().set_params(**params)
+
+
+def candidates(name):
+    return list(ParameterGrid(PARAM_GRIDS[name]))
+
+
+def resample(X, y, method, seed):
+    if method == "adasyn":
+        return ADASYN(random_state=seed).fit_resample(X, y)
+    return X, y
+
+
+def fold_cache(X, y, source_key, folds=5, seed=42, method="none", cache_dir="data/cache/folds"):
+    """Write the fold matrices once and return their directory.
+
+    Each fold has ``X_train``/``y_train`` (resampled), ``X_val``/``y_val`` and a
+    fixed random ``order`` of the training rows; a rung with budget ``m``
+    trains on ``order[:m]``.
+    """
+    key = hashlib.sha256(json.dumps([source_key, folds, seed, method]).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(path, "folds.json")):
+        return path
+    tmp = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    sizes = []
+    splits = StratifiedKFold(folds, shuffle=True, random_state=seed).split(X, y)
+    for i, (train, val) in enumerate(splits):
+        X_train, y_train = resample(X[train], y[train], method, seed)
+        arrays = {"X_train": X_train, "y_train": y_train, "X_val": X[val], "y_val": y[val],
+                  "order": rng.permutation(len(y_train))}
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f"fold{i}_{name}.npy"), np.ascontiguousarray(array))
+        sizes.append(len(y_train))
+    with open(os.path.join(tmp, "folds.json"), "w") as f:
+        json.dump({"folds": folds, "seed": seed, "method": method, "train_sizes": sizes}, f)
+    os.replace(tmp, path)
+    return path
+
+
+def load_folds(path):
+    with open(os.path.join(path, "folds.json")) as f:
+        meta = json.load(f)
+    names = ("X_train", "y_train", "X_val", "y_val", "order")
+    return [
+        {name: np.load(os.path.join(path, f"fold{i}_{name}.npy"), mmap_mode="r") for name in names}
+        for i in range(meta["folds"])
+    ]
+
+
+_folds = None
+
+
+def _init_worker(path):
+    global _folds
+    warnings.filterwarnings("ignore")
+    _folds = load_folds(path)
+
+
+def run_trial(name, params, fraction):
+    """Mean validation accuracy of one candidate fitted on ``fraction`` of every training fold."""
+    start = time.perf_counter()
+    scores = []
+    fit_params, share = params, fraction
+    if name in ESTIMATOR_BUDGET:
+        fit_params = {**params, "n_estimators": max(MIN_ESTIMATORS, math.ceil(fraction * params["n_estimators"]))}
+        share = 1.0
+    try:
+        for fold in _folds:
+            rows = np.sort(fold["order"][: max(1, math.ceil(share * len(fold["order"])))])
+            model = make_model(name, fit_params).fit(fold["X_train"][rows], fold["y_train"][rows])
+            scores.append(accuracy_score(fold["y_val"], model.predict(fold["X_val"])))
+        score, error = float(np.mean(scores)), None
+    except Exception as exc:  # invalid combinations in the grid (e.g. lbfgs + l1), as GridSearchCV scores them
+        score, error = float("nan"), f"{type(exc).__name__}: {exc}"
+    return {"model": name, "params": params, "fraction": fraction, "score": score, "fold_scores": scores,
+            "seconds": time.perf_counter() - start, "error": error}
+
+
+def trial_key(cache_key, name, params, fraction):
+    return hashlib.sha256(json.dumps([cache_key, name, params, fraction], sort_keys=True).encode()).hexdigest()[:20]
+
+
+class TrialLog:
+    """Append-only JSON lines of finished trials, keyed by :func:`trial_key`."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted run
+                    self.done[entry["key"]] = entry
+
+    def append(self, entry):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.done[entry["key"]] = entry
+
+
+def rung_fractions(n_candidates, eta, min_fraction):
+    """Training-set fractions of each rung; the last one is always 1."""
+    rungs = max(1, math.ceil(math.log(max(n_candidates, 1), eta)))
+    rungs = min(rungs, max(1, int(math.log(1 / min_fraction, eta)) + 1))
+    return [eta ** (i - rungs + 1) for i in range(rungs)]
+
+
+def _rank(results):
+    # Ties are broken by the parameters so a resumed search keeps the same survivors
+    return sorted(results, key=lambda r: (-np.nan_to_num(r["score"], nan=-1.0), json.dumps(r["params"], sort_keys=True)))
+
+
+def successive_halving(names, folds_path, log, eta=3, min_resource=250, workers=None, progress=print):
+    """Run the halving search for every model in ``names``; returns ``{name: ranked final-rung results}``.
+
+    ``min_resource`` is the training rows per fold in the first rung (or
+    :data:`MIN_ESTIMATORS` trees for :data:`ESTIMATOR_BUDGET` models). All
+    models advance rung by rung together so the pool stays busy.
+    """
+    cache_key = os.path.basename(folds_path)
+    with open(os.path.join(folds_path, "folds.json")) as f:
+        min_rows = min(1.0, min_resource / min(json.load(f)["train_sizes"]))
+    alive = {name: candidates(name) for name in names}
+    fractions = {}
+    for name in names:
+        if name in ESTIMATOR_BUDGET:
+            min_fraction = MIN_ESTIMATORS / min(params["n_estimators"] for params in alive[name])
+        else:
+            min_fraction = min_rows
+        fractions[name] = rung_fractions(len(alive[name]), eta, min_fraction)
+    finals = {}
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(folds_path,)) as pool:
+        for rung in itertools.count():
+            active = [name for name in names if rung < len(fractions[name])]
+            if not active:
+                return finals
+            results = {name: [] for name in active}
+            futures = {}
+            for name in active:
+                fraction = fractions[name][rung]
+                for params in alive[name]:
+                    key = trial_key(cache_key, name, params, fraction)
+                    if key in log.done:
+                        results[name].append(log.done[key])
+                    else:
+                        futures[pool.submit(run_trial, name, params, fraction)] = key
+            resumed = sum(len(r) for r in results.values())
+            progress(f"rung {rung}: {len(futures)} trials to run, {resumed} resumed from {log.path}")
+            for future in as_completed(futures):
+                entry = {"key": futures[future], "folds": cache_key, **future.result()}
+                log.append(entry)
+                results[entry["model"]].append(entry)
+            for name in active:
+                ranked = _rank(results[name])
+                if rung == len(fractions[name]) - 1:
+                    finals[name] = ranked
+                else:
+                    alive[name] = [r["params"] for r in ranked[: max(1, math.ceil(len(ranked) / eta))]]
+
+
+def refit(name, params, X, y, method="none", seed=42):
+    """Fit the winning candidate on the whole (resampled) training set, as notebook 03 does."""
+    warnings.filterwarnings("ignore")
+    X_res, y_res = resample(X, y, method, seed)
+    return make_model(name, params).fit(X_res, y_res)
+
+
+def test_metrics(name, model, X_test, y_test):
+    """``(summary row, model_results entry)`` in the formats notebook 03 writes."""
+    y_pred = model.predict(X_test)
+    y_score = model.predict_proba(X_test)[:, 1] if hasattr(model, "predict_proba") else model.decision_function(X_test)
+    acc = accuracy_score(y_test, y_pred)
+    auc = roc_auc_score(y_test, y_score)
+    row = {"name": name, "acc": acc, "auc": auc, "f1": f1_score(y_test, y_pred, average="weighted"),
+           "prec": precision_score(y_test, y_pred, average="weighted"),
+           "rec": recall_score(y_test, y_pred, average="weighted")}
+    report = classification_report(y_test, y_pred, output_dict=True)
+    return row, {"accuracy": acc, "auc": auc, "report": report}
@@ -1,16 +1,25 @@
 import dash
-from dash import html, dcc, Input, Output
+from dash import html, dcc, dash_table, Input, Output
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 import pandas as pd
 import numpy as np
 import logging
+import os
+from functools import lru_cache
+
+from churn import data
+from churn.cube import ALL, CHARGE_COLUMNS, StateCube
+from churn.inference import InferenceEngine
+from churn.registry import file_fingerprint
+from churn.risk_index import PARTITION_KEYS, SavedRiskIndex
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-df = pd.read_csv("data/processed/churn_cleaned.csv")
+table = data.load_table("churn_cleaned")
 
 required_columns = [
     "State", "Churn", "Account length", "Customer service calls",
@@ -18,10 +27,11 @@ required_columns = [
     "International plan", "Voice mail plan", "Total day minutes", "Total eve minutes",
     "Total night minutes", "Total intl minutes"
 ]
-missing_cols = [col for col in required_columns if col not in df.columns]
+missing_cols = [col for col in required_columns if col not in table.column_names]
 if missing_cols:
     logger.error(f"Missing required columns: {missing_cols}")
     raise ValueError(f"Missing required columns: {missing_cols}")
+df = table.select(required_columns).to_pandas()
 
 # Ensure Churn column is numeric/0-1
 df["Churn"] = df["Churn"].map({True: 1, False: 0, "Yes": 1, "No": 0, 1: 1, 0: 0})
@@ -29,6 +39,14 @@ if df["Churn"].isnull().any():
     logger.error("Churn column contains invalid or missing values")
     raise ValueError("Churn column contains invalid or missing values")
 
+# Aggregates for every State, computed once; callbacks only look them up
+cube = StateCube(df)
+
+# Scatter rendering: "sample" draws a fixed-size reservoir sample, "density" a binned grid.
+# Traces switch to WebGL (Scattergl) above DASHBOARD_SCATTERGL_THRESHOLD points.
+SCATTER_MODE = os.environ.get("DASHBOARD_SCATTER_MODE", "sample")
+SCATTERGL_THRESHOLD = int(os.environ.get("DASHBOARD_SCATTERGL_THRESHOLD", 1000))
+
 # Initialize Dash app
 app = dash.Dash(__name__)
 
@@ -62,7 +80,7 @@ app.layout = html.Div([
                 html.Label("State", className="filter-label"),
                 dcc.Dropdown(
                     id="state-dropdown",
-                    options=[{"label": f"{state}", "value": state} for state in sorted(df["State"].unique())],
+                    options=[{"label": f"{state}", "value": state} for state in cube.states()],
                     placeholder="All States",
                     className="custom-dropdown",
                     clearable=True
@@ -126,6 +144,32 @@ app.layout = html.Div([
             html.H3("🔥 Feature Correlation Heatmap", className="chart-title"),
             dcc.Loading(dcc.Graph(id="correlation-heatmap", className="chart"), type="circle"),
         ], className="chart-card chart-half"),
+
+        # Row 6 - Full Width: best.joblib scores of the customer base (churn/risk_index.py)
+        html.Div([
+            html.H3("🎯 Top At-Risk Customers", className="chart-title"),
+            html.Div([
+                dcc.Input(id="risk-k", type="number", min=1, max=500, step=1, value=10),
+                dcc.Dropdown(id="risk-tenure", options=["Low", "Medium", "High"], placeholder="Any tenure",
+                             className="custom-dropdown"),
+                dcc.Dropdown(id="risk-intl", options=[{"label": "International plan", "value": 1},
+                                                      {"label": "No international plan", "value": 0}],
+                             placeholder="Any international plan", className="custom-dropdown"),
+                dcc.Dropdown(id="risk-vmail", options=[{"label": "Voice mail plan", "value": 1},
+                                                       {"label": "No voice mail plan", "value": 0}],
+                             placeholder="Any voice mail plan", className="custom-dropdown"),
+            ], className="filters-section"),
+            dcc.Loading(dash_table.DataTable(
+                id="risk-table",
+                columns=[{"name": "Customer", "id": "customer_id"},
+                         {"name": "Churn probability", "id": "churn_probability", "type": "numeric",
+                          "format": dash_table.FormatTemplate.percentage(1)}]
+                        + [{"name": key, "id": key} for key in PARTITION_KEYS],
+                page_size=20,
+                style_header={"backgroundColor": COLORS["bg"], "color": "#ffffff", "fontWeight": "bold"},
+                style_cell={"backgroundColor": COLORS["card"], "color": "#ffffff", "border": "none"},
+            ), type="circle"),
+        ], className="chart-card chart-full"),
     ], className="charts-grid"),
 
     # Footer
@@ -156,13 +200,24 @@ app.layout = html.Div([
     Input("state-dropdown", "value"),
 )
 def update_dashboard(state):
-    # Filter data
-    filtered_df = df.copy()
-    if state:
-        filtered_df = filtered_df[filtered_df["State"] == state]
+    outputs, payload = build_dashboard(state or ALL, cube.version)
+    logger.info(f"Dashboard payload for {state or 'All States'}: {payload / 1024:.1f} KB")
+    return outputs
+
+
+@lru_cache(maxsize=256)
+def build_dashboard(state, version):
+    outputs = _build_outputs(state)
+    payload = sum(len(pio.to_json(out, validate=False)) if isinstance(out, go.Figure)
+                  else len(str(out.to_plotly_json())) for out in outputs)
+    return outputs, payload
+
+
+def _build_outputs(state):
+    stats = cube.stats(state)
 
     # Handle empty filtered data
-    if filtered_df.empty:
+    if stats is None or stats.n == 0:
         empty_fig = go.Figure().update_layout(
             annotations=[dict(text="No data available for selected filters", showarrow=False)],
             plot_bgcolor=COLORS["bg"], paper_bgcolor=COLORS["card"], font=dict(color="#ffffff")
@@ -171,14 +226,11 @@ def update_dashboard(state):
         return (empty_kpi,) * 5 + (empty_fig,) * 8
 
     # Calculate KPIs
-    total = len(filtered_df)
-    churned = filtered_df["Churn"].sum()
+    total = stats.n
+    churned = stats.churned
     rate = (churned / total * 100) if total > 0 else 0
-    avg_calls = filtered_df["Customer service calls"].mean()
-    revenue = (filtered_df["Total day charge"].sum() +
-               filtered_df["Total eve charge"].sum() +
-               filtered_df["Total night charge"].sum() +
-               filtered_df["Total intl charge"].sum())
+    avg_calls = stats.service_calls_sum / total
+    revenue = stats.revenue
 
     # KPI Cards
     kpi1 = html.Div([
@@ -221,16 +273,17 @@ def update_dashboard(state):
         ])
     ])
 
-    # Chart 1: Account Length - Histogram
+    # Chart 1: Account Length - Histogram (precomputed bins)
+    edges = cube.hist_edges
     fig1 = go.Figure()
     for churn_val in [0, 1]:
-        data = filtered_df[filtered_df["Churn"] == churn_val]["Account length"]
-        fig1.add_trace(go.Histogram(
-            x=data,
+        fig1.add_trace(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=stats.hist[churn_val],
+            width=np.diff(edges),
             name="Retained" if churn_val == 0 else "Churned",
             opacity=0.75,
             marker_color=COLORS["success"] if churn_val == 0 else COLORS["danger"],
-            nbinsx=30
         ))
     fig1.update_layout(
         barmode="overlay",
@@ -245,7 +298,7 @@ def update_dashboard(state):
     )
 
     # Chart 2: Service Calls - Line + Bar Combo
-    service_data = filtered_df.groupby(["Customer service calls", "Churn"]).size().unstack(fill_value=0)
+    service_data = pd.Series(stats.service).unstack(fill_value=0).sort_index()
     fig2 = go.Figure()
 
     if 0 in service_data.columns:
@@ -264,13 +317,9 @@ def update_dashboard(state):
         ))
 
     # Add churn rate line
-    churn_rates = []
-    for calls in service_data.index:
-        total_calls = filtered_df[filtered_df["Customer service calls"] == calls]
-        if len(total_calls) > 0:
-            churn_rates.append((total_calls["Churn"].sum() / len(total_calls)) * 100)
-        else:
-            churn_rates.append(0)
+    service_totals = service_data.sum(axis=1)
+    churned_calls = service_data[1] if 1 in service_data.columns else 0
+    churn_rates = (churned_calls / service_totals * 100).tolist()
 
     fig2.add_trace(go.Scatter(
         x=service_data.index,
@@ -295,7 +344,7 @@ def update_dashboard(state):
     )
 
     # Chart 3: International Plan - Sunburst
-    intl_data = filtered_df.groupby(["International plan", "Churn"]).size().reset_index(name="count")
+    intl_data = _counts_frame(stats.intl, "International plan")
     intl_data["Churn_label"] = intl_data["Churn"].map({0: "Retained", 1: "Churned"})
     intl_data = intl_data.dropna(subset=["International plan", "Churn_label"])
     intl_data = intl_data[(intl_data["International plan"] != "") & (intl_data["Churn_label"] != "")]
@@ -322,7 +371,7 @@ def update_dashboard(state):
         )
 
     # Chart 4: Voice Mail - Donut Chart (robust)
-    vm_data = filtered_df.groupby(["Voice mail plan", "Churn"]).size().reset_index(name="count")
+    vm_data = _counts_frame(stats.vmail, "Voice mail plan")
 
     def normalize_vm(x):
         if pd.isna(x):
@@ -365,22 +414,50 @@ def update_dashboard(state):
             margin=dict(l=20, r=20, t=20, b=20)
         )
 
-    # Chart 5: Usage vs Charges - Scatter
+    # Chart 5: Usage vs Charges - Scatter (reservoir sample or density grid)
     fig5 = go.Figure()
-    for churn_val in [0, 1]:
-        data = filtered_df[filtered_df["Churn"] == churn_val]
-        fig5.add_trace(go.Scatter(
-            x=data["Total day minutes"],
-            y=data["Total day charge"],
-            mode="markers",
-            name="Retained" if churn_val == 0 else "Churned",
-            marker=dict(
-                size=8,
-                color=COLORS["success"] if churn_val == 0 else COLORS["danger"],
-                opacity=0.6,
-                line=dict(width=1, color="white")
-            )
-        ))
+    if SCATTER_MODE == "density":
+        x_edges, y_edges = cube.density_edges
+        x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+        y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+        peak = max(stats.density.max(), 1)
+        for churn_val in [0, 1]:
+            ix, iy = np.nonzero(stats.density[churn_val])
+            counts = stats.density[churn_val][ix, iy]
+            scatter = go.Scattergl if len(counts) > SCATTERGL_THRESHOLD else go.Scatter
+            fig5.add_trace(scatter(
+                x=x_centers[ix],
+                y=y_centers[iy],
+                mode="markers",
+                name="Retained" if churn_val == 0 else "Churned",
+                text=counts,
+                hovertemplate="%{text} customers<extra></extra>",
+                marker=dict(
+                    size=4 + 16 * np.sqrt(counts / peak),
+                    color=COLORS["success"] if churn_val == 0 else COLORS["danger"],
+                    opacity=0.6,
+                )
+            ))
+    else:
+        sample = stats.reservoir.rows
+        scatter = go.Scattergl if len(sample) > SCATTERGL_THRESHOLD else go.Scatter
+        for churn_val in [0, 1]:
+            data = sample[sample[:, 2] == churn_val]
+            fig5.add_trace(scatter(
+                x=data[:, 0],
+                y=data[:, 1],
+                mode="markers",
+                name="Retained" if churn_val == 0 else "Churned",
+                marker=dict(
+                    size=8,
+                    color=COLORS["success"] if churn_val == 0 else COLORS["danger"],
+                    opacity=0.6,
+                    line=dict(width=1, color="white")
+                )
+            ))
+        if stats.reservoir.seen > len(sample):
+            fig5.add_annotation(text=f"Random sample of {len(sample):,} / {stats.reservoir.seen:,} customers",
+                                xref="paper", yref="paper", x=0, y=1.08, showarrow=False)
     fig5.update_layout(
         plot_bgcolor=COLORS["bg"],
         paper_bgcolor=COLORS["card"],
@@ -392,20 +469,11 @@ def update_dashboard(state):
     )
 
     # Chart 6: Time-based Usage - Grouped Bar
+    period_means = stats.period_means()
     time_data = pd.DataFrame({
         "Period": ["Day", "Evening", "Night", "International"],
-        "Retained": [
-            filtered_df[filtered_df["Churn"] == 0]["Total day minutes"].mean(),
-            filtered_df[filtered_df["Churn"] == 0]["Total eve minutes"].mean(),
-            filtered_df[filtered_df["Churn"] == 0]["Total night minutes"].mean(),
-            filtered_df[filtered_df["Churn"] == 0]["Total intl minutes"].mean()
-        ],
-        "Churned": [
-            filtered_df[filtered_df["Churn"] == 1]["Total day minutes"].mean(),
-            filtered_df[filtered_df["Churn"] == 1]["Total eve minutes"].mean(),
-            filtered_df[filtered_df["Churn"] == 1]["Total night minutes"].mean(),
-            filtered_df[filtered_df["Churn"] == 1]["Total intl minutes"].mean()
-        ]
+        "Retained": period_means[0],
+        "Churned": period_means[1],
     })
 
     fig6 = go.Figure(data=[
@@ -427,18 +495,17 @@ def update_dashboard(state):
 
     # Chart 7: Charges - Box Plot
     fig7 = go.Figure()
-    charge_cols = [
-        ("Total day charge", "Day"),
-        ("Total eve charge", "Evening"),
-        ("Total night charge", "Night"),
-        ("Total intl charge", "International")
-    ]
+    charge_cols = list(zip(CHARGE_COLUMNS, ["Day", "Evening", "Night", "International"]))
 
     for col, name in charge_cols:
         for churn_val in [0, 1]:
-            data = filtered_df[filtered_df["Churn"] == churn_val][col]
+            box = stats.box[(col, churn_val)]
+            if box is None:
+                continue
             fig7.add_trace(go.Box(
-                y=data,
+                q1=[box["q1"]], median=[box["median"]], q3=[box["q3"]],
+                lowerfence=[box["lowerfence"]], upperfence=[box["upperfence"]],
+                mean=[box["mean"]],
                 name=f"{name} - {"Retained" if churn_val == 0 else "Churned"}",
                 marker_color=COLORS["success"] if churn_val == 0 else COLORS["danger"]
             ))
@@ -454,10 +521,7 @@ def update_dashboard(state):
     )
 
     # Chart 8: Correlation Heatmap
-    numeric_cols = ["Account length", "Total day minutes", "Total eve minutes",
-                    "Total night minutes", "Total intl minutes",
-                    "Customer service calls", "Churn"]
-    corr = filtered_df[numeric_cols].corr()
+    corr = stats.correlation()
 
     fig8 = go.Figure(data=go.Heatmap(
         z=corr.values,
@@ -481,5 +545,30 @@ def update_dashboard(state):
             fig1, fig2, fig3, fig4, fig5, fig6, fig7, fig8)
 
 
+@lru_cache(maxsize=1)
+def risk_index(model_fingerprint):
+    """The saved risk index, rebuilt when best.joblib has changed and reloaded when the API updates it."""
+    return SavedRiskIndex(InferenceEngine.load(compiled=True))
+
+
+@app.callback(
+    Output("risk-table", "data"),
+    Input("state-dropdown", "value"),
+    Input("risk-k", "value"),
+    Input("risk-tenure", "value"),
+    Input("risk-intl", "value"),
+    Input("risk-vmail", "value"),
+)
+def update_risk_table(state, k, tenure, international_plan, voice_mail_plan):
+    index = risk_index(file_fingerprint("models/best.joblib")).get()
+    return index.top(int(k or 10), state=state, tenure=tenure, international_plan=international_plan,
+                     voice_mail_plan=voice_mail_plan)
+
+
+def _counts_frame(counts, column):
+    frame = pd.Series(counts, dtype="int64").rename_axis([column, "Churn"]).reset_index(name="count")
+    return frame.sort_values([column, "Churn"]).reset_index(drop=True)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,74 @@
+"""Rebuild the processed data from the raw CSVs, rerunning only what is stale.
+
+    python prepare_data.py
+    python prepare_data.py --force rfe --workers 2
+
+Runs notebook 02's preparation (cleaning, feature engineering, RFE selection,
+train/test split, encoding and scaling) as cached stages; see
+churn/pipeline.py. Each stage's outputs are kept in data/cache/pipeline/ under
+a hash of its inputs, code and parameters, so a stage only reruns when one of
+them changed. The results are copied to data/processed/, results/rfe_ranking.csv,
+results/feature_importance.csv and models/preprocessor.joblib when they differ
+from what is there. While the preprocessor matches the deployed one, the RFE
+reports in results/ are kept (the ranks of the dropped columns vary between
+environments).
+
+The models in models/ were trained on the current splits and are not
+retrained here. When a changed parameter (``--n-features``, ``--iqr-factor``,
+``--test-size``, ...) gives a preprocessor with other columns or scaling, it is
+written to models/candidate/preprocessor.joblib, and the scaled splits and RFE
+reports to data/processed/candidate/ and results/candidate/; the live files are
+left in place. Retrain the models on the candidate splits, then move all of
+them into place.
+"""
+import argparse
+import os
+import time
+
+from churn.pipeline import CACHE_DIR, CANDIDATES, Pipeline, build_stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    stage_names = [stage.name for stage in build_stages()]
+    parser.add_argument("--force", nargs="*", choices=stage_names, metavar="STAGE",
+                        help=f"rerun these stages even if cached (all without names; {', '.join(stage_names)})")
+    parser.add_argument("--workers", type=int, default=min(2, os.cpu_count() or 1),
+                        help="stages run at once (rfe and split are independent)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--iqr-factor", type=float, default=1.5, help="outlier fence in interquartile ranges")
+    parser.add_argument("--n-features", type=int, default=22, help="numeric features kept by RFE")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--no-publish", action="store_true",
+                        help="only update the cache, leave data/processed/, results/ and models/ alone")
+    args = parser.parse_args()
+
+    force = stage_names if args.force == [] else (args.force or ())
+    pipeline = Pipeline(build_stages(args.iqr_factor, args.n_features, args.test_size, args.random_state),
+                        args.cache_dir)
+    start = time.perf_counter()
+    report = pipeline.run(args.workers, force)
+    elapsed = time.perf_counter() - start
+    for entry in report:
+        timing = f"{entry['seconds']:.2f}s" if entry["status"] == "ran" else ""
+        print(f"   {entry['stage']:<9} {entry['status']:<7} {timing:>7}  {entry['key'][:16]}")
+    ran = sum(entry["status"] == "ran" for entry in report)
+    print(f"✅ {ran} of {len(report)} stages ran in {elapsed:.2f}s")
+
+    if args.no_publish:
+        return
+    changed = pipeline.publish()
+    held_back = [path for path in changed if path in CANDIDATES.values()]
+    for path in changed:
+        if path not in held_back:
+            print(f"💾 Updated -> {path}")
+    if held_back:
+        print(f"⚠️ The preprocessor no longer matches the deployed models; it and the files fitted with it were "
+              f"written to {', '.join(held_back)}. Retrain the models on these splits before moving them into place")
+    if not changed:
+        print("📊 Processed data, RFE results and preprocessor are up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Fold a batch of newly labelled customers into the models without rerunning the notebooks.
+
+    python retrain.py data/new/labelled.csv
+    python retrain.py data/new/labelled.csv --output-dir models/candidate --freeze-scaler
+
+The input has the raw columns of data/raw/churn-bigml-80.csv plus ``Churn``.
+The scaler is updated with the batch, every artifact in ``--models-dir`` is
+re-expressed in the new scale and updated incrementally (see
+churn/training.py), and the results are written atomically to
+``--output-dir`` (default: in place, which the API picks up without a restart).
+When updating in place, the processed train/test matrices are brought to the
+new scale as well and the batch is appended to the training set, unless
+``--no-processed`` is given.
+A model type that cannot be re-expressed in the new scale (see
+churn/training.py) stops the run before anything is written; use
+``--freeze-scaler`` or move it out of ``--models-dir``.
+Accuracy and AUC on the test set are printed before and after.
+"""
+import argparse
+import os
+import time
+import warnings
+
+import joblib
+import pandas as pd
+from sklearn.metrics import accuracy_score, roc_auc_score
+
+from churn import data
+from churn.inference import predict_with_proba
+from churn.training import model_names, read_labelled, rebase_processed, rescale_points, update_models
+
+
+def evaluate(model, X, y):
+    y_pred, y_score = predict_with_proba(model, X)
+    if y_score.dtype == object:
+        y_score = model.decision_function(X)
+    return accuracy_score(y, y_pred), roc_auc_score(y, y_score)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="labelled customers (.csv or .parquet) with a Churn column")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--output-dir", default=None, help="defaults to --models-dir")
+    parser.add_argument("--rounds", type=int, default=10, help="XGBoost boosting rounds to add")
+    parser.add_argument("--learning-rate", type=float, default=None, help="XGBoost learning rate for the new rounds")
+    parser.add_argument("--epochs", type=int, default=5, help="SGD passes for Logistic Regression")
+    parser.add_argument("--eta0", type=float, default=0.001, help="SGD step size for Logistic Regression")
+    parser.add_argument("--freeze-scaler", action="store_true", help="keep the preprocessor as it is")
+    parser.add_argument("--no-processed", action="store_true", help="leave data/processed untouched")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    features, y = read_labelled(args.input)
+    X_test = data.load("X_test")
+    y_test = data.load("y_test").squeeze("columns")
+    names = model_names(args.models_dir)
+    before = {name: evaluate(joblib.load(f"{args.models_dir}/{name}.joblib"), X_test, y_test) for name in names}
+
+    start = time.perf_counter()
+    try:
+        report, A, B, X = update_models(
+            features, y, args.models_dir, args.output_dir, update_scaler=not args.freeze_scaler, names=names,
+            rounds=args.rounds, learning_rate=args.learning_rate, epochs=args.epochs, eta0=args.eta0,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+    elapsed = time.perf_counter() - start
+    print(f"✅ Folded {len(y):,} customers ({int(y.sum()):,} churned) into {len(names)} models "
+          f"in {elapsed:.2f}s -> {args.output_dir or args.models_dir}")
+
+    # A candidate written elsewhere must not change the data the live models are evaluated on
+    if not args.no_processed and (args.output_dir or args.models_dir) == args.models_dir:
+        start = time.perf_counter()
+        rebase_processed(A, B, X, y)
+        print(f"✅ data/processed rescaled and extended in {time.perf_counter() - start:.2f}s")
+
+    index_dir = os.path.join(args.output_dir or args.models_dir, "index", "KNN")
+    if os.path.isdir(index_dir):
+        print(f"⚠️ {index_dir} was built from the old KNN and is ignored until rebuilt with build_knn_index.py")
+
+    X_test_new = pd.DataFrame(rescale_points(X_test, A, B), columns=X_test.columns) if A is not None else X_test
+    rows = []
+    for entry in report:
+        model = joblib.load(f"{args.output_dir or args.models_dir}/{entry['model']}.joblib")
+        acc, auc = evaluate(model, X_test_new, y_test)
+        rows.append({**entry, "acc before": before[entry["model"]][0], "acc after": acc,
+                     "auc before": before[entry["model"]][1], "auc after": auc})
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.precision", 4):
+        print(pd.DataFrame(rows).set_index("model"))
+
+
+if __name__ == "__main__":
+    main()
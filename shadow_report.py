@@ -0,0 +1,108 @@
+"""Compare shadow-scored models (churn/shadow.py) with each other and with results/models_summary.csv.
+
+    python shadow_report.py results/shadow/predictions.jsonl
+
+For every model in the log: rows scored, mean scoring time per batch, label
+agreement and mean |probability difference| with the champion. For rows
+logged with true labels (``batch_score.py --shadow`` over a file with a
+``Churn`` column) it also prints acc/auc/f1/prec/rec, computed like
+results/models_summary.csv (weighted averages, AUC from probabilities or the
+decision function), next to the summary's numbers.
+"""
+import argparse
+import json
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+
+SUMMARY_NAMES = {"best": "XGBoost"}
+
+
+def read_log(path):
+    """``{batch_id: {model: entry}}`` plus the champion's name."""
+    batches, champion = defaultdict(dict), None
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            batches[entry["batch"]][entry["model"]] = entry
+            if entry["role"] == "champion":
+                champion = entry["model"]
+    return batches, champion
+
+
+def compare(batches, champion):
+    rows = defaultdict(lambda: defaultdict(list))
+    for models in batches.values():
+        if champion not in models:
+            continue
+        reference = models[champion]
+        for name, entry in models.items():
+            if "error" in entry:
+                rows[name]["errors"].append(1)
+                continue
+            out = rows[name]
+            out["ms"].append(entry["ms"])
+            out["pred"].extend(entry["pred"])
+            out["champion_pred"].extend(reference["pred"])
+            scores = entry.get("proba") or entry.get("score")
+            out["score"].extend(scores)
+            if entry.get("proba") and reference.get("proba"):
+                out["dp"].extend(np.abs(np.subtract(entry["proba"], reference["proba"])))
+            if "label" in entry:
+                out["label"].extend(entry["label"])
+                out["labelled_pred"].extend(entry["pred"])
+                out["labelled_score"].extend(scores)
+    return rows
+
+
+def report(rows, summary):
+    records = []
+    for name, out in sorted(rows.items(), key=lambda item: item[0]):
+        record = {
+            "model": name,
+            "rows": len(out["pred"]),
+            "ms/batch": np.mean(out["ms"]) if out["ms"] else np.nan,
+            "agree": np.mean(np.equal(out["pred"], out["champion_pred"])) if out["pred"] else np.nan,
+            "mean |dp|": np.mean(out["dp"]) if out["dp"] else np.nan,
+            "errors": len(out["errors"]),
+        }
+        y, pred, score = out["label"], out["labelled_pred"], out["labelled_score"]
+        if y:
+            record.update({
+                "acc": accuracy_score(y, pred),
+                "auc": roc_auc_score(y, score) if len(set(y)) > 1 else np.nan,
+                "f1": f1_score(y, pred, average="weighted"),
+                "prec": precision_score(y, pred, average="weighted", zero_division=0),
+                "rec": recall_score(y, pred, average="weighted"),
+            })
+        reference = SUMMARY_NAMES.get(name, name)
+        if reference in summary.index:
+            for metric in ("acc", "auc", "f1", "prec", "rec"):
+                record[f"{metric} (summary)"] = summary.loc[reference, metric]
+        records.append(record)
+    return pd.DataFrame(records).set_index("model")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", default="results/shadow/predictions.jsonl")
+    parser.add_argument("--summary", default="results/models_summary.csv")
+    parser.add_argument("--output", help="also write the table to this CSV")
+    args = parser.parse_args()
+
+    batches, champion = read_log(args.log)
+    if champion is None:
+        raise SystemExit(f"❌ No champion entries in {args.log}")
+    table = report(compare(batches, champion), pd.read_csv(args.summary).set_index("name"))
+    print(f"📊 {len(batches):,} batches, champion: {champion}")
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.precision", 4):
+        print(table)
+    if args.output:
+        table.to_csv(args.output)
+        print(f"✅ Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
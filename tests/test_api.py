@@ -0,0 +1,21 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(api.app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("path", [
+    "/risk/top?k=-1",
+    "/risk/range?limit=-1",
+    "/risk/range?min_proba=-0.1",
+    "/risk/range?max_proba=1.5",
+    "/risk/range?min_proba=0.8&max_proba=0.2",
+])
+def test_risk_queries_reject_bad_bounds(client, path):
+    assert client.get(path).status_code == 422
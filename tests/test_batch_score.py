@@ -0,0 +1,25 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+import batch_score
+from churn import data
+from churn.features import clean_raw
+from churn.inference import InferenceEngine
+
+
+def test_explained_parquet_with_an_unexplained_first_chunk(tmp_path):
+    raw = pd.read_csv(data.DATASETS["raw_test"][0])
+    _, proba = InferenceEngine.load("models/best.joblib", "models/preprocessor.joblib").predict(clean_raw(raw))
+    # First chunk entirely below the threshold, later ones with customers to explain
+    order = list((proba < 0.5).nonzero()[0][:3]) + list((proba >= 0.5).nonzero()[0][:3])
+    source = tmp_path / "customers.csv"
+    raw.iloc[order].to_csv(source, index=False)
+    output = tmp_path / "predictions.parquet"
+
+    rows = batch_score.score_file(str(source), str(output), chunk_size=3, workers=1, explain=1,
+                                  explain_min_proba=0.5)
+
+    scored = pq.read_table(output).to_pandas()
+    assert rows == len(scored) == 6
+    assert scored["reason_1"].iloc[:3].isna().all()
+    assert scored["reason_1"].iloc[3:].notna().all()
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from churn.batching import MicroBatcher
+
+
+def test_concurrent_items_share_a_batch_and_get_their_own_results():
+    batches = []
+
+    def predict_batch(items):
+        batches.append(len(items))
+        return [item * 10 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(predict_batch, max_batch_size=64, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(20)))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(main()) == [i * 10 for i in range(20)]
+    assert sum(batches) == 20 and len(batches) < 20
+
+
+def test_a_lone_item_is_not_held_for_max_wait():
+    async def main():
+        batcher = MicroBatcher(lambda items: items, max_wait_ms=5_000)
+        start = time.perf_counter()
+        assert await batcher.submit(1) == 1
+        await batcher.stop()
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) < 1.0
+
+
+def test_a_failing_batch_is_retried_item_by_item():
+    def predict_batch(items):
+        if "bad" in items:
+            raise ValueError("bad record")
+        return [item.upper() for item in items]
+
+    async def main():
+        batcher = MicroBatcher(predict_batch, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(item) for item in ["a", "bad", "c"]), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    a, bad, c = asyncio.run(main())
+    assert (a, c) == ("A", "C")
+    assert isinstance(bad, ValueError)
+
+
+def test_stop_fails_the_items_it_will_not_answer():
+    release = threading.Event()
+
+    def predict_batch(items):
+        release.wait(5)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(predict_batch, max_wait_ms=0)
+        pending = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        release.set()
+        with pytest.raises(RuntimeError):
+            await pending
+
+    asyncio.run(main())
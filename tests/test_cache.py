@@ -0,0 +1,59 @@
+from churn import cache as cache_module
+from churn.cache import PredictionCache, record_key
+
+
+def make_cache(tmp_path, **kwargs):
+    model = tmp_path / "model.joblib"
+    model.write_bytes(b"model v1")
+    return PredictionCache(str(model), check_interval=0, **kwargs), model
+
+
+def test_keys_ignore_field_naming_and_number_types():
+    fields = {"State": "Ohio ", "account_length": 100, "total_day_minutes": 120}
+    columns = {"State": "Ohio", "Account length": 100.0, "Total day minutes": 120.0}
+    assert record_key(fields, "f") == record_key(columns, "f")
+    assert record_key(fields, "f") != record_key(fields, "g")
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache, _ = make_cache(tmp_path, max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # b is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache, _ = make_cache(tmp_path, ttl=10)
+    cache.put("a", 1)
+    now[0] += 9.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a") is None
+
+
+def test_a_changed_model_file_empties_the_cache(tmp_path):
+    cache, model = make_cache(tmp_path)
+    key = cache.key({"State": "Ohio"})
+    cache.put(key, 1)
+    model.write_bytes(b"model version 2")
+    assert cache.key({"State": "Ohio"}) != key
+    assert cache.stats()["size"] == 0 and cache.stats()["invalidations"] == 1
+
+
+def test_get_or_compute_only_computes_the_misses(tmp_path):
+    cache, _ = make_cache(tmp_path)
+    calls = []
+
+    def compute(records):
+        calls.append(len(records))
+        return [record["x"] * 2 for record in records]
+
+    assert cache.get_or_compute([{"x": 1}, {"x": 2}], compute) == [2, 4]
+    assert cache.get_or_compute([{"x": 2}, {"x": 3}, {"x": 1}], compute) == [4, 6, 2]
+    assert calls == [2, 1]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from churn import campaign
+from churn.campaign import ChunkFile, knapsack, optimize
+
+
+def brute_force(costs, values, capacity):
+    """Best total value of any subset of items within ``capacity``, over all 2^n subsets."""
+    n = len(costs)
+    subsets = (np.arange(2 ** n)[:, None] >> np.arange(n)) & 1
+    total_cost, total_value = subsets @ np.asarray(costs), subsets @ np.asarray(values)
+    return total_value[total_cost <= capacity].max()
+
+
+def population(seed, n=14):
+    """Ids, churn probabilities and revenues; revenues are whole cents, so offer costs with a 0.5 discount are too."""
+    rng = np.random.default_rng(seed)
+    return np.arange(n) * 3 + 7, rng.uniform(0.05, 0.95, n), rng.integers(100, 4_000, n) * 0.02
+
+
+def chunks(ids, proba, revenue, size=4):
+    return [(ids[i:i + size], proba[i:i + size], revenue[i:i + size]) for i in range(0, len(ids), size)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_knapsack_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    costs, values = rng.integers(1, 30, 12), rng.uniform(0, 10, 12)
+    capacity = int(costs.sum() // 3)
+    chosen = knapsack(costs, values, capacity)
+    assert costs[chosen].sum() <= capacity
+    assert values[chosen].sum() == pytest.approx(brute_force(costs, values, capacity))
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("discount", [0.0, 0.5])
+def test_optimize_matches_brute_force(monkeypatch, seed, discount):
+    monkeypatch.setattr(campaign, "MIN_COMPACT_ROWS", 1)  # merge (and prune) the pool on every chunk
+    ids, proba, revenue = population(seed)
+    offer_cost, uplift = 1.0, 0.3
+    costs, values = offer_cost + discount * revenue, proba * revenue * uplift
+    budget = round(costs.sum() / 3, 2)
+
+    summary, selected = optimize(chunks(ids, proba, revenue), budget, offer_cost, uplift, discount)
+
+    cents = np.round(costs * 100).astype(np.int64)
+    assert summary["expected_retained_revenue"] == pytest.approx(brute_force(cents, values, round(budget * 100)))
+    assert summary["total_cost"] <= budget + 1e-9
+    assert summary["customers"] == len(ids)
+    if discount:
+        assert summary["refinement"] == "exact"
+    # The selected rows are the population's own, in decreasing worth order
+    position = {customer_id: i for i, customer_id in enumerate(ids)}
+    rows = [position[customer_id] for customer_id in selected["customer_id"]]
+    assert selected["offer_cost"].to_numpy() == pytest.approx(costs[rows])
+    assert selected["expected_retained_revenue"].to_numpy() == pytest.approx(values[rows])
+    assert selected["expected_retained_revenue"].is_monotonic_decreasing
+
+
+def test_spilled_chunks_give_the_same_result(tmp_path):
+    ids, proba, revenue = population(0, n=50)
+    expected = optimize(chunks(ids, proba, revenue), 150.0, 1.0, discount=0.5, spill_dir=tmp_path)
+    spill = ChunkFile.from_chunks(chunks(ids, proba, revenue), dir=tmp_path)
+    result = optimize(spill, 150.0, 1.0, discount=0.5)
+    assert result[0] == expected[0]
+    assert result[1].equals(expected[1])
+    spill.close()
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pytest
+
+from churn import data
+from churn.columnar import (
+    DECIMAL_COLUMNS, FLAG_COLUMNS, MAX_ROWS_REPORTED, ColumnarError, media_format, read_table, validate_table,
+    write_table,
+)
+from churn.features import FIELD_COLUMNS, RAW_COLUMNS, STATE_NAMES, clean_raw
+
+
+def customers(n=200):
+    """Cleaned raw-column customers; half of the columns use the CustomerData field names."""
+    frame = clean_raw(pd.read_csv(data.DATASETS["raw_test"][0]))[RAW_COLUMNS].head(n)
+    for column in DECIMAL_COLUMNS:
+        frame[column] = frame[column].astype(np.float64)
+    fields = {column: field for field, column in list(FIELD_COLUMNS.items())[::2]}
+    return frame.rename(columns=fields).reset_index(drop=True)
+
+
+def brute_force(frame):
+    """The expected errors, checking every value in Python: per column, the first check with failing rows."""
+    states = set(STATE_NAMES.values())
+    errors = []
+    for field, column in FIELD_COLUMNS.items():
+        values = frame[field if field in frame else column].tolist()
+        checks = [("null values", lambda v: v is None)]
+        if column == "State":
+            checks.append(("unknown state name", lambda v: v not in states))
+        else:
+            checks.append(("NaN or infinite values", lambda v: not math.isfinite(v)))
+            if column not in DECIMAL_COLUMNS:
+                checks.append(("expected whole numbers", lambda v: v != math.floor(v)))
+            if column in FLAG_COLUMNS:
+                checks.append(("expected 0 or 1", lambda v: v not in (0, 1)))
+            else:
+                checks.append(("negative values", lambda v: v < 0))
+        for message, fails in checks:
+            rows = [i for i, v in enumerate(values) if fails(v)]
+            if rows:
+                errors.append({"column": column, "error": message, "count": len(rows),
+                               "rows": rows[:MAX_ROWS_REPORTED]})
+                break
+    return errors
+
+
+def to_table(frame):
+    return pa.Table.from_pydict({name: pa.array(frame[name].tolist()) for name in frame.columns})
+
+
+def test_valid_table_gives_the_raw_columns():
+    frame = customers()
+    columns = validate_table(to_table(frame))
+    assert list(columns) == RAW_COLUMNS
+    for field, column in FIELD_COLUMNS.items():
+        expected = frame[field if field in frame else column].to_numpy()
+        np.testing.assert_array_equal(columns[column], expected)
+        if column != "State" and column not in DECIMAL_COLUMNS:
+            assert columns[column].dtype == np.int64
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_errors_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    frame = customers().astype(object)
+    bad_values = {
+        "State": [None, "Atlantis", "OH"],
+        "flag": [None, math.nan, 2, -1, 0.5],
+        "count": [None, math.nan, math.inf, 1.5, -3],
+        "decimal": [None, -math.inf, math.nan, -0.25],
+    }
+    # One bad value per corrupted column, so that every check is reached
+    for name in frame.columns:
+        column = FIELD_COLUMNS.get(name, name)
+        if rng.random() < 0.3:
+            continue
+        kind = "State" if column == "State" else "flag" if column in FLAG_COLUMNS else \
+            "decimal" if column in DECIMAL_COLUMNS else "count"
+        value = bad_values[kind][rng.integers(len(bad_values[kind]))]
+        for row in rng.choice(len(frame), size=rng.integers(1, 10), replace=False):
+            frame.at[row, name] = value
+        if kind != "State" and any(isinstance(v, float) for v in frame[name]):
+            frame[name] = [None if v is None else float(v) for v in frame[name]]
+
+    expected = brute_force(frame)
+    with pytest.raises(ColumnarError) as raised:
+        validate_table(to_table(frame))
+    assert raised.value.errors == expected
+
+
+def test_missing_columns_and_wrong_types():
+    frame = customers(5).drop(columns=["Customer service calls"])
+    table = to_table(frame)
+    table = table.set_column(table.column_names.index("State"), "State", pa.array(range(5)))
+    with pytest.raises(ColumnarError) as raised:
+        validate_table(table)
+    assert raised.value.errors == [
+        {"column": "State", "error": "expected strings, got int64"},
+        {"column": "Customer service calls", "error": "missing column"},
+    ]
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_tables_round_trip(fmt):
+    table = to_table(customers(20))
+    assert read_table(write_table(table, fmt), fmt).equals(table)
+
+
+def test_arrow_file_format_is_read():
+    table = to_table(customers(20))
+    sink = pa.BufferOutputStream()
+    with ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    assert read_table(sink.getvalue().to_pybytes(), "arrow").equals(table)
+
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("application/vnd.apache.arrow.stream", "arrow"),
+    ("application/vnd.apache.arrow.file; charset=binary", "arrow"),
+    ("Application/X-Parquet", "parquet"),
+    ("application/json", None),
+    (None, None),
+])
+def test_media_format(content_type, expected):
+    assert media_format(content_type) == expected
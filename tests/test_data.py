@@ -0,0 +1,22 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from churn import data
+
+
+def test_columnar_copy_round_trips_the_csv(tmp_path):
+    source = tmp_path / "churn-bigml-20.csv"
+    shutil.copyfile(data.DATASETS["raw_test"][0], source)
+    data.DATASETS["tmp_raw"] = (str(source), data.RAW_TYPES)
+    try:
+        loaded = data.load("tmp_raw")
+    finally:
+        del data.DATASETS["tmp_raw"]
+    expected = pd.read_csv(source)
+    numeric = expected.select_dtypes(include=[np.number]).columns
+    for column in numeric:
+        np.testing.assert_array_equal(loaded[column].to_numpy(dtype=np.float64),
+                                      expected[column].to_numpy(dtype=np.float64))
+    assert (tmp_path / "churn-bigml-20.feather").exists()
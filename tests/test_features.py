@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.features import sample_rows, scalar_features
+from churn import data
+from churn.features import FEATURE_COLUMNS, RAW_COLUMNS, clean_raw, derive_features
+
+
+def edge_cases(base):
+    edges = base.head(6).copy()
+    edges.loc[0, ["Total day calls", "Total eve calls", "Total night calls"]] = 0
+    edges.loc[1, ["Total intl calls", "Total intl minutes"]] = 0
+    edges.loc[2, ["Total day minutes", "Total eve minutes", "Total night minutes"]] = 0
+    edges.loc[3, "Account length"] = 74
+    edges.loc[4, "Account length"] = 127
+    edges.loc[5, ["International plan", "Voice mail plan", "Number vmail messages"]] = [1, 1, 0]
+    return edges
+
+
+def test_derive_features_matches_the_scalar_logic():
+    base = pd.read_csv("data/processed/churn_cleaned.csv")[RAW_COLUMNS]
+    raw = pd.concat([edge_cases(base), sample_rows(base, 2_000)], ignore_index=True)
+    expected = pd.DataFrame([scalar_features(row) for _, row in raw.iterrows()], columns=FEATURE_COLUMNS)
+    actual = derive_features(raw)
+    for col in FEATURE_COLUMNS:
+        if expected[col].dtype == object:
+            assert (expected[col].to_numpy() == actual[col].to_numpy()).all(), col
+        else:
+            np.testing.assert_allclose(actual[col].astype(float), expected[col].astype(float), err_msg=col)
+
+
+def test_clean_raw_names_unmapped_plan_values():
+    raw = pd.read_csv(data.DATASETS["raw_test"][0]).head(10)
+    raw.loc[3, "International plan"] = "maybe"
+    with pytest.raises(ValueError, match="'International plan'.*'maybe'"):
+        clean_raw(raw)
+
+
+def test_clean_raw_accepts_booleans_and_ints():
+    raw = pd.read_csv(data.DATASETS["raw_test"][0]).head(10)
+    expected = clean_raw(raw)
+    raw["Churn"] = raw["Churn"].astype(bool)
+    raw["Voice mail plan"] = expected["Voice mail plan"]
+    pd.testing.assert_frame_equal(clean_raw(raw), expected)
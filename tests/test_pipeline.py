@@ -0,0 +1,53 @@
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import StandardScaler
+
+from churn import pipeline
+from churn.registry import file_fingerprint
+
+
+def fitted(path, scale):
+    frame = pd.DataFrame({"a": np.arange(10.0) * scale, "b": np.arange(10.0)})
+    joblib.dump(ColumnTransformer([("num", StandardScaler(), ["a", "b"])]).fit(frame), path)
+
+
+def published(tmp_path, monkeypatch, new_scale):
+    """Publish a new preprocessor (scaled by ``new_scale``), a split and a report over deployed ones."""
+    deployed = {"preprocessor.joblib": tmp_path / "models" / "preprocessor.joblib",
+                "X_train_scaled.csv": tmp_path / "processed" / "X_train_scaled.csv",
+                "rfe_ranking.csv": tmp_path / "results" / "rfe_ranking.csv"}
+    for path in deployed.values():
+        path.parent.mkdir(exist_ok=True)
+    fitted(deployed["preprocessor.joblib"], 1)
+    deployed["X_train_scaled.csv"].write_text("old split\n")
+    deployed["rfe_ranking.csv"].write_text("old ranks\n")
+
+    stage = tmp_path / "stage"
+    stage.mkdir()
+    fitted(stage / "preprocessor.joblib", new_scale)
+    (stage / "X_train_scaled.csv").write_text("new split\n")
+    (stage / "rfe_ranking.csv").write_text("new ranks\n")
+
+    monkeypatch.setattr(pipeline, "PREPROCESSOR", str(deployed["preprocessor.joblib"]))
+    monkeypatch.setattr(pipeline, "REPORTS", {str(deployed["rfe_ranking.csv"])})
+    runner = pipeline.Pipeline([], cache_dir=str(tmp_path / "cache"))
+    runner.outputs = {"encode": {name: (str(stage / name), file_fingerprint(str(stage / name)))
+                                 for name in ("preprocessor.joblib", "X_train_scaled.csv", "rfe_ranking.csv")}}
+    targets = {("encode", name): str(path) for name, path in deployed.items()}
+    candidates = {str(path): str(path.parent / "candidate" / name) for name, path in deployed.items()}
+    return runner.publish(targets, candidates), deployed
+
+
+def test_publish_holds_back_a_different_preprocessor_with_its_files(tmp_path, monkeypatch):
+    changed, deployed = published(tmp_path, monkeypatch, new_scale=2)
+    assert sorted(changed) == sorted(str(path.parent / "candidate" / name) for name, path in deployed.items())
+    assert deployed["X_train_scaled.csv"].read_text() == "old split\n"
+    assert deployed["rfe_ranking.csv"].read_text() == "old ranks\n"
+
+
+def test_publish_keeps_reports_while_the_preprocessor_matches(tmp_path, monkeypatch):
+    changed, deployed = published(tmp_path, monkeypatch, new_scale=1)
+    assert changed == [str(deployed["X_train_scaled.csv"])]
+    assert deployed["rfe_ranking.csv"].read_text() == "old ranks\n"
@@ -0,0 +1,25 @@
+import shutil
+
+import numpy as np
+
+from churn import data
+from churn.knn import IndexedKNN, KNNIndex
+from churn.registry import ModelRegistry, file_fingerprint
+
+
+def test_scorer_serves_a_current_knn_index(tmp_path):
+    shutil.copyfile("models/KNN.joblib", tmp_path / "KNN.joblib")
+    registry = ModelRegistry(str(tmp_path), check_interval=0)
+    model = registry.get("KNN")
+    assert registry.scorer("KNN") is model
+
+    KNNIndex.from_model(model).save(registry.index_path("KNN"), file_fingerprint(registry.path("KNN")))
+    scorer = registry.scorer("KNN")
+    assert isinstance(scorer, IndexedKNN)
+    X = data.load("X_test").to_numpy()[:200]
+    np.testing.assert_array_equal(scorer.predict(X), model.predict(X))
+    np.testing.assert_allclose(scorer.predict_proba(X), model.predict_proba(X))
+
+    # An index built from another artifact is ignored
+    KNNIndex.from_model(model).save(registry.index_path("KNN"), "0" * 64)
+    assert registry.scorer("KNN") is registry.get("KNN")
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from churn.risk_index import RiskIndex
+
+STATES = ["Ohio", "Texas", "Utah"]
+TENURES = ["Low", "Medium", "High"]
+FILTERS = [{}, {"state": "Ohio"}, {"tenure": "High", "international_plan": 1}, {"state": "Utah", "voice_mail_plan": 0}]
+
+
+def random_keys(rng, n):
+    return [(STATES[rng.integers(3)], TENURES[rng.integers(3)], int(rng.integers(2)), int(rng.integers(2)))
+            for _ in range(n)]
+
+
+def matches(key, state=None, tenure=None, international_plan=None, voice_mail_plan=None):
+    return all(w is None or w == k for w, k in zip((state, tenure, international_plan, voice_mail_plan), key))
+
+
+@pytest.mark.parametrize("merge_min", [8, 10_000])
+def test_queries_match_brute_force_after_upserts_and_removes(merge_min):
+    rng = np.random.default_rng(0)
+    # Distinct probabilities, so the expected order has no ties
+    proba = iter(rng.permutation(100_000) / 100_000)
+    keys = random_keys(rng, 300)
+    ids = np.arange(300)
+    p = [next(proba) for _ in ids]
+    index = RiskIndex(keys, ids, p, merge_fraction=0.05, merge_min=merge_min)
+    customers = dict(zip(ids.tolist(), zip(keys, p)))
+
+    for _ in range(20):
+        changed = rng.choice(len(customers) + 20, size=15, replace=False)  # existing and new ids
+        changed_keys, changed_p = random_keys(rng, len(changed)), [next(proba) for _ in changed]
+        index.upsert(changed, changed_keys, changed_p)
+        customers.update(zip(changed.tolist(), zip(changed_keys, changed_p)))
+        removed = rng.choice(list(customers), size=5, replace=False)
+        index.remove(removed)
+        for customer_id in removed.tolist():
+            del customers[customer_id]
+
+        assert len(index) == len(customers)
+        for filters in FILTERS:
+            expected = sorted(((p, i) for i, (key, p) in customers.items() if matches(key, **filters)), reverse=True)
+            top = index.top(10, **filters)
+            assert [(row["churn_probability"], row["customer_id"]) for row in top] == expected[:10]
+            count, rows = index.range(0.25, 0.75, 7, **filters)
+            in_range = [(p, i) for p, i in expected if 0.25 <= p <= 0.75]
+            assert count == len(in_range)
+            assert [(row["churn_probability"], row["customer_id"]) for row in rows] == in_range[:7]
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from churn import data
+from churn.features import clean_raw
+from churn.inference import InferenceEngine, predict_with_proba
+from churn.registry import ModelRegistry
+from churn.shadow import ShadowLog, ShadowScorer
+
+CHALLENGERS = ["Logistic Regression", "SVC"]
+
+
+def customers(n=50):
+    return clean_raw(pd.read_csv(data.DATASETS["raw_test"][0]).head(n))
+
+
+def test_challengers_score_the_champion_matrix(tmp_path):
+    registry = ModelRegistry("models")
+    engine = InferenceEngine.load()
+    log = ShadowLog(str(tmp_path / "predictions.jsonl"))
+    scorer = ShadowScorer(lambda: engine, registry, challengers=CHALLENGERS, log=log)
+    raw = customers()
+    try:
+        preds, proba = scorer.score(raw, raw["Churn"].to_numpy())
+        scorer.flush()
+    finally:
+        scorer.close()
+
+    expected_preds, expected_proba = engine.predict(raw)
+    np.testing.assert_array_equal(preds, expected_preds)
+    np.testing.assert_allclose(proba, expected_proba)
+    entries = {entry["model"]: entry for entry in map(json.loads, open(log.path))}
+    assert set(entries) == {"best", *CHALLENGERS}
+    assert all(entry["label"] == raw["Churn"].tolist() for entry in entries.values())
+    X = engine.matrix(raw)
+    for name in CHALLENGERS:
+        model = registry.get(name)
+        challenger_preds, challenger_proba = predict_with_proba(model, X)
+        assert entries[name]["pred"] == challenger_preds.tolist()
+        if "proba" in entries[name]:
+            np.testing.assert_allclose(entries[name]["proba"], challenger_proba)
+        else:
+            np.testing.assert_allclose(entries[name]["score"], model.decision_function(X))
+    assert scorer.stats()["batches"] == 1 and scorer.stats()["errors"] == 0
+
+
+def test_batches_over_max_pending_are_dropped(tmp_path):
+    engine = InferenceEngine.load()
+    log = ShadowLog(str(tmp_path / "predictions.jsonl"))
+    scorer = ShadowScorer(lambda: engine, ModelRegistry("models"), challengers=CHALLENGERS, log=log, max_pending=0)
+    try:
+        preds, _ = scorer.score(customers(10))
+        scorer.flush()
+    finally:
+        scorer.close()
+    assert len(preds) == 10
+    assert scorer.stats()["dropped"] == 1 and scorer.stats()["batches"] == 0
@@ -0,0 +1,140 @@
+"""Tune every model of notebook 03 with cached folds and successive halving (see churn/tuning.py).
+
+    python tune.py --workers 4
+    python tune.py --models XGBoost SVC --compare-grid
+
+Trials are appended to ``--trials``; rerunning the same command after an
+interruption resumes where it stopped. The winner of each model is refitted
+on the whole training set and written like notebook 03 does:
+``models/<name>.joblib``, ``models/best.joblib`` (highest test accuracy),
+``results/models_summary.csv`` and ``results/model_results.json``.
+``--compare-grid`` also times the notebook's ``GridSearchCV`` on the same
+grids and prints both wall-clock times.
+"""
+import argparse
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from sklearn.model_selection import GridSearchCV
+
+from churn import data
+from churn.registry import file_fingerprint
+from churn.training import atomic_dump
+from churn.tuning import (ADASYN, ESTIMATORS, PARAM_GRIDS, TrialLog, candidates, fold_cache, refit, resample,
+                          successive_halving, test_metrics)
+
+
+def grid_search(names, X, y, method, seed, workers):
+    """Notebook 03: resample the training set once, then exhaustive 5-fold GridSearchCV per model."""
+    X_res, y_res = resample(X, y, method, seed)
+    times = {}
+    for name in names:
+        start = time.perf_counter()
+        grid = GridSearchCV(ESTIMATORS[name](), PARAM_GRIDS[name], cv=5, scoring="accuracy", n_jobs=workers or -1)
+        grid.fit(X_res, y_res)
+        times[name] = (time.perf_counter() - start, grid.best_score_, grid.best_params_)
+        print(f"   grid {name}: {times[name][0]:.1f}s, best CV acc {grid.best_score_:.4f}")
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=list(PARAM_GRIDS), choices=list(PARAM_GRIDS))
+    parser.add_argument("--eta", type=int, default=3, help="keep the best 1/eta candidates per rung")
+    parser.add_argument("--min-resource", type=int, default=100, help="training rows per fold in the first rung")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--resample", choices=["auto", "adasyn", "none"], default="auto",
+                        help="oversampling of each training fold (auto: ADASYN when imblearn is installed)")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--trials", default="results/tuning/trials.jsonl")
+    parser.add_argument("--models-dir", default="models")
+    parser.add_argument("--results-dir", default="results")
+    parser.add_argument("--no-write", action="store_true", help="only print the winners")
+    parser.add_argument("--compare-grid", action="store_true", help="also time the notebook's GridSearchCV")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    method = args.resample
+    if method == "auto":
+        method = "adasyn" if ADASYN is not None else "none"
+        if ADASYN is None:
+            print("⚠️ imblearn is not installed; tuning without ADASYN oversampling")
+    elif method == "adasyn" and ADASYN is None:
+        raise SystemExit("❌ --resample adasyn needs imblearn (pip install imbalanced-learn)")
+
+    X_train = data.load("X_train")
+    y_train = data.load("y_train").squeeze("columns").to_numpy()
+    X_test = data.load("X_test")
+    y_test = data.load("y_test").squeeze("columns")
+    source_key = [file_fingerprint(data.DATASETS[name][0]) for name in ("X_train", "y_train")]
+
+    start = time.perf_counter()
+    folds_path = fold_cache(X_train.to_numpy(), y_train, source_key, args.folds, args.seed, method)
+    print(f"✅ Folds cached in {folds_path} ({time.perf_counter() - start:.2f}s)")
+
+    log = TrialLog(args.trials)
+    start = time.perf_counter()
+    finals = successive_halving(args.models, folds_path, log, args.eta, args.min_resource, args.workers)
+    search_s = time.perf_counter() - start
+
+    winners = {name: finals[name][0]["params"] for name in args.models}
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = {name: pool.submit(refit, name, winners[name], X_train, y_train, method, args.seed)
+                   for name in args.models}
+        models = {name: future.result() for name, future in futures.items()}
+
+    summary_path = os.path.join(args.results_dir, "models_summary.csv")
+    results_path = os.path.join(args.results_dir, "model_results.json")
+    rows, results = [], {}
+    for name, model in models.items():
+        row, results[name] = test_metrics(name, model, X_test, y_test)
+        rows.append(row)
+    summary = pd.DataFrame(rows)
+    # Models left out with --models keep their existing rows
+    if os.path.exists(summary_path):
+        previous = pd.read_csv(summary_path)
+        summary = pd.concat([previous[~previous["name"].isin(models)], summary], ignore_index=True)
+    summary = summary.sort_values(by="acc", ascending=False).reset_index(drop=True)
+
+    key = os.path.basename(folds_path)
+    print(f"\n📊 Successive halving: {search_s:.1f}s wall clock")
+    for name in args.models:
+        trials = [t for t in log.done.values() if t["model"] == name and t.get("folds") == key]
+        fits = sum(len(t["fold_scores"]) for t in trials)
+        print(f"   {name}: {len(candidates(name))} candidates, {len(trials)} trials ({fits} fold fits), "
+              f"best CV acc {finals[name][0]['score']:.4f} {winners[name]}")
+    print(summary.to_string(index=False))
+
+    if args.compare_grid:
+        print("\n⏱️  Notebook GridSearchCV on the same grids:")
+        grid = grid_search(args.models, X_train, y_train, method, args.seed, args.workers)
+        grid_s = sum(t for t, _, _ in grid.values())
+        print(f"📊 GridSearchCV {grid_s:.1f}s vs successive halving {search_s:.1f}s ({grid_s / search_s:.1f}x)")
+
+    if args.no_write:
+        return
+    os.makedirs(args.models_dir, exist_ok=True)
+    for name, model in models.items():
+        atomic_dump(model, os.path.join(args.models_dir, f"{name}.joblib"))
+    best = summary.loc[0, "name"]
+    if best in models:
+        atomic_dump(models[best], os.path.join(args.models_dir, "best.joblib"))
+    os.makedirs(args.results_dir, exist_ok=True)
+    summary.to_csv(f"{summary_path}.tmp", index=False)
+    os.replace(f"{summary_path}.tmp", summary_path)
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            results = {**json.load(f), **results}
+    with open(f"{results_path}.tmp", "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(f"{results_path}.tmp", results_path)
+    print(f"✅ Saved {len(models)} models (best: {best}), {summary_path} and {results_path}")
+
+
+if __name__ == "__main__":
+    main()
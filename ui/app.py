@@ -1,105 +1,286 @@
+import contextlib
+import os
+import sys
+import tempfile
+import weakref
+
+import numpy as np
 import pandas as pd
+import plotly.express as px
 import streamlit as st
-import joblib
 
-used = pd.read_csv("data/processed/X_train_scaled.csv")
-input_ = pd.read_csv("data/processed/churn_cleaned.csv")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batch_score import score_chunk  # noqa: E402
+from churn import data  # noqa: E402
+from churn.cache import PredictionCache  # noqa: E402
+from churn.columnar import DECIMAL_COLUMNS, FLAG_COLUMNS  # noqa: E402
+from churn.features import RAW_COLUMNS  # noqa: E402
+from churn.inference import InferenceEngine  # noqa: E402
+from churn.registry import ModelRegistry  # noqa: E402
+from churn.sweep import sweep  # noqa: E402
+
+BULK_CHUNK_SIZE = 5_000
+BULK_PREVIEW_ROWS = 1_000
+BULK_DOWNLOAD_MAX_MB = 200  # larger results are not served through the browser
+SWEEP_COLUMNS = [col for col in RAW_COLUMNS if col != "State"]
+
+
+@st.cache_data
+def get_states():
+    # Read once per process; only the State column is loaded
+    return data.load_table("churn_cleaned", columns=["State"])["State"].unique().to_pylist()
+
+
+@st.cache_resource
+def get_registry():
+    return ModelRegistry("models")
+
+
+@st.cache_resource
+def get_engine_source():
+    # Rebuilt only when best.joblib or preprocessor.joblib change on disk
+    return get_registry().watch(
+        lambda model, preprocessor: InferenceEngine(model, preprocessor, compiled=True),
+        "best",
+        "preprocessor",
+    )
+
+
+@st.cache_resource
+def get_prediction_cache():
+    # One cache per process, shared by every session and rerun
+    return PredictionCache("models/best.joblib", max_size=10_000, preprocessor_path="models/preprocessor.joblib")
+
+
+def predict(record):
+    engine = get_engine_source()()
+    [(pred, prob)] = get_prediction_cache().get_or_compute(
+        [record], lambda records: [engine.predict_record(records[0])]
+    )
+    return pred, prob
+
+
+@st.cache_data(max_entries=64)
+def sweep_grid(record, axes, link_charges, fingerprints):
+    """:func:`churn.sweep.sweep` for the current model; ``fingerprints`` key the cache to the artifacts on disk."""
+    return sweep(get_engine_source()(), record, axes, link_charges)
+
+
+def remove_file(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+class BulkResults:
+    """A scored upload: the predictions CSV on disk, its counts and first rows.
+
+    The CSV is removed by :meth:`discard`, or when the object is garbage
+    collected (its session ended) or the process exits.
+    """
+
+    def __init__(self, path, rows, churners, head):
+        self.path = path
+        self.rows = rows
+        self.churners = churners
+        self.head = head
+        self.discard = weakref.finalize(self, remove_file, path)
+
+
+def show_bulk_results(rows, churners, head):
+    st.subheader(f"{rows:,} customers scored, {churners:,} likely to churn")
+    st.dataframe(head, hide_index=True)
 
-model = joblib.load("models/best.joblib")
-preprocessor = joblib.load("models/preprocessor.joblib")
 
-states = input_["State"].unique()
+def discard_bulk_results():
+    results = st.session_state.pop("bulk_results", None)
+    st.session_state.pop("bulk_file_id", None)
+    if results is not None:
+        results.discard()
+
+
+def score_upload(upload, progress, preview):
+    """Score an uploaded CSV chunk by chunk into a temporary CSV.
+
+    ``progress`` follows the bytes consumed and ``preview`` shows the counts
+    and first rows after every chunk. Returns :class:`BulkResults`.
+    """
+    engine = get_engine_source()()
+    fd, path = tempfile.mkstemp(prefix="churn-predictions-", suffix=".csv")
+    rows = churners = 0
+    head = pd.DataFrame()
+    upload.seek(0)
+    try:
+        with os.fdopen(fd, "w", newline="") as out:
+            for chunk in pd.read_csv(upload, chunksize=BULK_CHUNK_SIZE):
+                scored = score_chunk(chunk, rows, ["State"], engine=engine)
+                scored.to_csv(out, header=rows == 0, index=False)
+                rows += len(scored)
+                churners += int(scored["prediction"].sum())
+                if len(head) < BULK_PREVIEW_ROWS:
+                    head = pd.concat([head, scored.head(BULK_PREVIEW_ROWS - len(head))], ignore_index=True)
+                progress.progress(min(upload.tell() / max(upload.size, 1), 1.0), text=f"Scored {rows:,} customers")
+                with preview.container():
+                    show_bulk_results(rows, churners, head)
+    except BaseException:
+        remove_file(path)
+        raise
+    return BulkResults(path, rows, churners, head)
+
+
+def sweep_values(column, low, high, steps):
+    """Grid of ``steps`` values from ``low`` to ``high`` (0/1 for plans, whole numbers for counts)."""
+    if column in FLAG_COLUMNS:
+        return [0, 1]
+    values = np.linspace(low, high, steps)
+    return values.tolist() if column in DECIMAL_COLUMNS else np.unique(np.round(values)).astype(int).tolist()
+
+
+def sweep_axis(label, key, record, default):
+    column = st.selectbox(label, SWEEP_COLUMNS, index=SWEEP_COLUMNS.index(default), key=f"{key}_column")
+    if column in FLAG_COLUMNS:
+        return column, [0, 1]
+    current = float(record[column])
+    low, high, steps = st.columns(3)
+    low = low.number_input("From", 0.0, value=0.0, key=f"{key}_low")
+    high = high.number_input("To", 0.0, value=max(2 * current, 10.0), key=f"{key}_high")
+    steps = steps.number_input("Steps", 2, 500, 50, key=f"{key}_steps")
+    return column, sweep_values(column, low, high, steps)
+
 
 st.set_page_config(page_title="Customer Churn Predictor", layout="centered")
 st.title("📞 Customer Churn Predictor")
 st.write("This app predicts if a customer will churn or not.")
-st.sidebar.header("Customer features")
-
-state = st.sidebar.selectbox("State", states)
-account_length = st.sidebar.number_input("Account length (days)", 1, 300, 1)
-international_plan = st.sidebar.number_input("International plan", 0,1,0)
-voice_mail_plan = st.sidebar.number_input("Voice mail plan", 0,1,0)
-number_vmail_messages = st.sidebar.number_input("Number of vmail messages", 0, 100, 0)
-
-total_day_minutes = st.sidebar.number_input("Total day minutes", 0.0, 1000.0, 0.0)
-total_day_calls = st.sidebar.number_input("Total day calls", 0, 200, 0)
-total_day_charge = st.sidebar.number_input("Total day charge", 0.0, 100.0, 0.0)
-
-total_eve_minutes = st.sidebar.number_input("Total evening minutes", 0.0, 1000.0, 0.0)
-total_eve_calls = st.sidebar.number_input("Total evening calls", 0, 200, 0)
-total_eve_charge = st.sidebar.number_input("Total evening charge", 0.0, 100.0, 0.0)
-
-total_night_minutes = st.sidebar.number_input("Total night minutes", 0.0, 1000.0, 0.0)
-total_night_calls = st.sidebar.number_input("Total night calls", 0, 200, 0)
-total_night_charge = st.sidebar.number_input("Total night charge", 0.0, 100.0, 0.0)
-
-total_intl_minutes = st.sidebar.number_input("Total international minutes", 0.0, 100.0, 0.0)
-total_intl_calls = st.sidebar.number_input("Total international calls", 0, 30, 0)
-total_intl_charge = st.sidebar.number_input("Total international charge", 0.0, 20.0,0.0)
-
-customer_service_calls = st.sidebar.number_input("Customer service calls", 0, 20, 0)
-
-total_national_minutes = total_day_minutes + total_eve_minutes + total_night_minutes
-total_national_calls = total_day_calls + total_eve_calls + total_night_calls
-total_national_charge = total_day_charge + total_eve_charge + total_night_charge
-
-avg_minutes_per_call = (
-    total_national_minutes / total_national_calls if total_national_calls > 0 else 0
-)
-avg_int_minutes_per_call = (
-    total_intl_minutes / total_intl_calls if total_intl_calls > 0 else 0
-)
-cost_per_minute = (
-    total_national_charge / total_national_minutes if total_national_minutes > 0 else 0
-)
-cost_per_minute_intl = (
-    total_intl_charge / total_intl_minutes if total_intl_minutes > 0 else 0
-)
-
-high_service_calls = 1 if customer_service_calls > 3 else 0
-tenure_category = (
-    "Low" if account_length <= 74 else "Medium" if account_length <= 127 else "High"
-)
-has_all_plans = 1 if (international_plan == 1 and voice_mail_plan == 1) else 0
-zero_vmail_messages = 1 if number_vmail_messages == 0 else 0
-
-# Create DataFrame for prediction
-data = pd.DataFrame([{
+
+single, what_if, bulk = st.tabs(["Single customer", "What-if", "Bulk CSV"])
+
+# Widgets inside a form do not rerun the app; prediction runs on submit only
+with st.sidebar.form("customer"):
+    st.header("Customer features")
+    state = st.selectbox("State", get_states())
+    account_length = st.number_input("Account length (days)", 1, 300, 1)
+    international_plan = st.number_input("International plan", 0,1,0)
+    voice_mail_plan = st.number_input("Voice mail plan", 0,1,0)
+    number_vmail_messages = st.number_input("Number of vmail messages", 0, 100, 0)
+
+    total_day_minutes = st.number_input("Total day minutes", 0.0, 1000.0, 0.0)
+    total_day_calls = st.number_input("Total day calls", 0, 200, 0)
+    total_day_charge = st.number_input("Total day charge", 0.0, 100.0, 0.0)
+
+    total_eve_minutes = st.number_input("Total evening minutes", 0.0, 1000.0, 0.0)
+    total_eve_calls = st.number_input("Total evening calls", 0, 200, 0)
+    total_eve_charge = st.number_input("Total evening charge", 0.0, 100.0, 0.0)
+
+    total_night_minutes = st.number_input("Total night minutes", 0.0, 1000.0, 0.0)
+    total_night_calls = st.number_input("Total night calls", 0, 200, 0)
+    total_night_charge = st.number_input("Total night charge", 0.0, 100.0, 0.0)
+
+    total_intl_minutes = st.number_input("Total international minutes", 0.0, 100.0, 0.0)
+    total_intl_calls = st.number_input("Total international calls", 0, 30, 0)
+    total_intl_charge = st.number_input("Total international charge", 0.0, 20.0,0.0)
+
+    customer_service_calls = st.number_input("Customer service calls", 0, 20, 0)
+    submitted = st.form_submit_button("Predict Churn")
+
+# Raw customer record for prediction
+record = {
     "State": state,
-    "Tenure category": tenure_category,
+    "Account length": account_length,
     "International plan": international_plan,
     "Voice mail plan": voice_mail_plan,
+    "Number vmail messages": number_vmail_messages,
     "Total day minutes": total_day_minutes,
+    "Total day calls": total_day_calls,
     "Total day charge": total_day_charge,
     "Total eve minutes": total_eve_minutes,
+    "Total eve calls": total_eve_calls,
     "Total eve charge": total_eve_charge,
     "Total night minutes": total_night_minutes,
+    "Total night calls": total_night_calls,
     "Total night charge": total_night_charge,
     "Total intl minutes": total_intl_minutes,
     "Total intl calls": total_intl_calls,
     "Total intl charge": total_intl_charge,
     "Customer service calls": customer_service_calls,
-    "Total national minutes": total_national_minutes,
-    "Total national calls": total_national_calls,
-    "Total national charge": total_national_charge,
-    "Avg minutes per call": avg_minutes_per_call,
-    "Avg int minutes per call": avg_int_minutes_per_call,
-    "Cost per minute": cost_per_minute,
-    "Cost per minute intl": cost_per_minute_intl,
-    "High service calls": high_service_calls,
-    "Has All Plans": has_all_plans,
-    "zero_vmail_messages": zero_vmail_messages
-}])
-
-if st.button("Predict Churn"):
-    X = preprocessor.transform(data)
-    pred = model.predict(X)[0]
-
-    churn_text = "🚨 Likely to Churn" if pred == 1 else "✅ Not Likely to Churn"
-    st.subheader(f"Prediction: {churn_text}")
-
-    if hasattr(model, "predict_proba"):
-        prob = model.predict_proba(X)[0][1]
-        st.write(f"Churn Probability: **{prob:.2f}**")
+}
+
+with single:
+    # Only a submitted form with changed inputs triggers a prediction
+    if submitted and st.session_state.get("record") != record:
+        st.session_state["record"] = record
+        st.session_state["prediction"] = predict(record)
+
+    if "prediction" in st.session_state:
+        pred, prob = st.session_state["prediction"]
+        churn_text = "🚨 Likely to Churn" if pred == 1 else "✅ Not Likely to Churn"
+        st.subheader(f"Prediction: {churn_text}")
+
+        if prob is not None:
+            st.write(f"Churn Probability: **{prob:.2f}**")
+    else:
+        st.write("Fill in the customer features in the sidebar and press **Predict Churn**.")
+
+with what_if:
+    st.write("How the churn probability of the customer in the sidebar changes with one or two features. "
+             "The whole grid is scored in one call.")
+    axes = [sweep_axis("Feature", "sweep_x", record, "Customer service calls")]
+    if st.checkbox("Sweep a second feature"):
+        axes.append(sweep_axis("Second feature", "sweep_y", record, "International plan"))
+    link_charges = st.checkbox("Scale charges with swept minutes", value=True)
+    registry = get_registry()
+    fingerprints = (registry.fingerprint("best"), registry.fingerprint("preprocessor"))
+    try:
+        _, proba, (_, base_prob) = sweep_grid(record, axes, link_charges, fingerprints)
+    except ValueError as exc:
+        st.error(str(exc))
+        proba = None
+    if proba is not None:
+        st.write(f"Churn probability as entered: **{base_prob:.2f}**")
+        (x_column, x_values), *rest = axes
+        if rest:
+            [(y_column, y_values)] = rest
+            fig = px.imshow(proba.T, x=x_values, y=y_values, origin="lower", aspect="auto", zmin=0, zmax=1,
+                            color_continuous_scale="RdYlGn_r",
+                            labels={"x": x_column, "y": y_column, "color": "Churn probability"})
+            st.plotly_chart(fig, width="stretch")
+        else:
+            st.line_chart(pd.DataFrame({x_column: x_values, "Churn probability": proba}), x=x_column)
+
+with bulk:
+    st.write("Upload customers with the columns of `data/raw/churn-bigml-80.csv` "
+             "(raw or cleaned values) to score them all at once.")
+    upload = st.file_uploader("Customers CSV", type="csv")
+    if upload is None:
+        discard_bulk_results()
+    else:
+        header = pd.read_csv(upload, nrows=0).columns
+        missing = [col for col in RAW_COLUMNS if col not in header]
+        if missing:
+            st.error(f"Missing columns: {', '.join(missing)}")
+        else:
+            # Scored once per uploaded file into a temporary CSV; reruns reuse it
+            if st.session_state.get("bulk_file_id") != upload.file_id:
+                discard_bulk_results()
+                progress, preview = st.progress(0.0, text="Scoring..."), st.empty()
+                st.session_state["bulk_results"] = score_upload(upload, progress, preview)
+                st.session_state["bulk_file_id"] = upload.file_id
+                progress.empty()
+                preview.empty()
+
+            results = st.session_state["bulk_results"]
+            show_bulk_results(results.rows, results.churners, results.head)
+            size_mb = os.path.getsize(results.path) / 1e6
+            if size_mb > BULK_DOWNLOAD_MAX_MB:
+                st.info(f"The predictions take {size_mb:,.0f} MB, more than the {BULK_DOWNLOAD_MAX_MB} MB this app "
+                        "serves. Score the file with `python batch_score.py` instead.")
+            # The file is read only on the run the user asks for it, not on every rerun
+            elif st.button("Prepare download", key="bulk_prepare"):
+                with open(results.path, "rb") as predictions:
+                    st.download_button(
+                        "Download predictions",
+                        predictions.read(),
+                        file_name=f"{os.path.splitext(upload.name)[0]}_predictions.csv",
+                        mime="text/csv",
+                        on_click="ignore",
+                    )
 
 st.markdown("---")